@@ -0,0 +1,3 @@
+"""
+Benchmarks of the probe. Run them from the src directory as modules, for example `python3 -m bench.cycle`.
+"""
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the probe cycle. Generates synthetic service executables with given runtime, number of readings in the
+output and failure rate, and runs the probe against stand-in server that answers /probe, /services and /readings
+calls in memory. Reports duration of the cycles, how late the cycles start against their schedule (the probe sleeps
+for the interval after each cycle, so the lag grows by the cycle duration), overhead of each fetch (duration of the
+fetch above the service runtime) and bytes uploaded to the server.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from datetime import datetime
+from time import perf_counter, sleep
+
+from lib.server import Server
+from service import Service
+
+
+SERVICE_TEMPLATE = """#!/bin/bash
+
+# Synthetic service generated by bench.cycle.
+
+case "$1" in
+    config)
+        cat <<EOF
+description=Synthetic benchmark service %(index)d.
+
+[thresholds]
+*.error.min=0
+*.error.max=900
+
+[options]
+hostname=Host name
+hostname.required=1
+EOF
+        ;;
+
+    *)
+        %(sleep)s
+        if [ $((RANDOM %% 10000)) -lt %(failure)d ]; then
+            echo "Synthetic failure."
+            exit 1
+        fi
+        for i in $(seq 0 %(last_reading)d); do
+            echo "reading_$i=$((RANDOM %% 1000))"
+        done
+        ;;
+esac
+"""
+
+
+def generate_services(path: str, count: int, runtime: float, readings: int, failure_rate: float) -> None:
+    """
+    Write synthetic service executables to directory.
+    :param path: Directory to write the services to.
+    :param count: Number of services.
+    :param runtime: Seconds each fetch takes.
+    :param readings: Number of readings returned by each fetch.
+    :param failure_rate: Probability (0-1) that fetch fails.
+    """
+    for index in range(count):
+        file_path = os.path.join(path, "synthetic_%03d.sh" % (index, ))
+
+        with open(file_path, "w") as f:
+            f.write(SERVICE_TEMPLATE % {
+                "index": index,
+                "sleep": "sleep %g" % (runtime, ) if runtime > 0 else "",
+                "failure": int(failure_rate * 10000),
+                "last_reading": readings - 1,
+            })
+
+        os.chmod(file_path, 0o755)
+
+
+class StandInServer:
+    """
+    In-memory replacement of the API client, with the same interface as lib.client.Client. Every registered service
+    is mapped once, and the requests are counted.
+    """
+    def __init__(self):
+        self.mappings = []
+        self.readings = 0
+        self.requests = {}
+        self.bytes = {}
+
+    def _record(self, method: str, payload: any) -> None:
+        """
+        Count the request and size of its JSON payload.
+        """
+        name = method.strip("/").split("/")[0]
+        self.requests[name] = self.requests.get(name, 0) + 1
+        self.bytes[name] = self.bytes.get(name, 0) + len(json.dumps(payload).encode("utf-8"))
+
+    def get(self, method: str, params: dict=None) -> any:
+        self._record(method, params)
+
+        if method.strip("/").startswith("services/"):
+            return self.mappings
+
+        raise ValueError("Unknown method GET %s." % (method, ))
+
+    def put(self, method: str, json: any=None) -> any:
+        self._record(method, json)
+
+        if method.strip("/") == "probe":
+            self.mappings = [
+                {
+                    "id": index + 1,
+                    "name": "mapped-%s" % (service["name"], ),
+                    "service": service["name"],
+                    "options": [
+                        {"identifier": option["identifier"], "value": "host-%d.example.com" % (index + 1, )}
+                        for option in service["options"]
+                    ]
+                }
+                for index, service in enumerate(json["services"])
+            ]
+        elif method.strip("/").startswith("readings/"):
+            self.readings += len(json)
+        else:
+            raise ValueError("Unknown method PUT %s." % (method, ))
+
+        return {"status": "OK"}
+
+
+def summary(values: list) -> dict:
+    """
+    Mean, median, 95th percentile and maximum of values, in milliseconds.
+    """
+    values = sorted(values)
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    return {
+        "mean": round(sum(values) / len(values) * 1000, 3),
+        "p50": round(values[len(values) // 2] * 1000, 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3),
+        "max": round(values[-1] * 1000, 3),
+    }
+
+
+def run(services_path: str, cycles: int, interval: float, runtime: float) -> dict:
+    """
+    Register the probe and run its cycles the same way as probe.py does.
+    :param services_path: Directory with services.
+    :param cycles: Number of cycles.
+    :param interval: Seconds to sleep after each cycle.
+    :param runtime: Runtime of the services, subtracted from fetch durations to get the overhead.
+    """
+    stand_in = StandInServer()
+    server = Server("http://localhost/api/v1/")
+    server.client = stand_in
+
+    start = perf_counter()
+    services = Service.scan(services_path)
+    server.register_probe(services)
+    registration = perf_counter() - start
+
+    cycle_durations = []
+    lags = []
+    fetch_durations = []
+    failures = 0
+
+    schedule_start = perf_counter()
+    for cycle in range(cycles):
+        cycle_start = perf_counter()
+        lags.append(cycle_start - (schedule_start + cycle * interval))
+
+        mapped = server.get_mapped_services()
+        responses = {}
+
+        time_point = datetime.now()
+
+        for service in mapped:
+            fetch_start = perf_counter()
+            result = service.fetch()
+            fetch_durations.append(perf_counter() - fetch_start)
+
+            if result is None:
+                failures += 1
+            else:
+                responses[service.id] = result
+
+        server.update(responses, time_point)
+        cycle_durations.append(perf_counter() - cycle_start)
+
+        if cycle < cycles - 1:
+            sleep(interval)
+
+    return {
+        "services": len(services),
+        "registration_ms": round(registration * 1000, 3),
+        "cycle_ms": summary(cycle_durations),
+        "schedule_lag_ms": summary(lags),
+        "fetch_ms": summary(fetch_durations),
+        "fetch_overhead_ms": summary([duration - runtime for duration in fetch_durations]),
+        "fetches": len(fetch_durations),
+        "failed_fetches": failures,
+        "readings": stand_in.readings,
+        "requests": stand_in.requests,
+        "bytes": stand_in.bytes,
+        "upload_bytes_per_cycle": round(stand_in.bytes.get("readings", 0) / cycles),
+    }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--services", type=int, default=20, help="Number of synthetic services.")
+    parser.add_argument("--runtime", type=float, default=0.05, help="Seconds each fetch takes.")
+    parser.add_argument("--readings", type=int, default=5, help="Number of readings returned by each fetch.")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Probability (0-1) that fetch fails.")
+    parser.add_argument("--cycles", type=int, default=5, help="Number of probe cycles.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds the probe sleeps after each cycle.")
+    parser.add_argument("--output", help="File to store results as JSON.")
+    parser.add_argument("--verbose", action="store_true", help="Show log of the probe.")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+
+    services_path = tempfile.mkdtemp(prefix="mon-bench-")
+    try:
+        generate_services(services_path, args.services, args.runtime, args.readings, args.failure_rate)
+        result = run(services_path, args.cycles, args.interval, args.runtime)
+    finally:
+        shutil.rmtree(services_path)
+
+    result["parameters"] = vars(args)
+
+    print("services: %d, registration %.1f ms" % (result["services"], result["registration_ms"]))
+    for name in ("cycle_ms", "schedule_lag_ms", "fetch_ms", "fetch_overhead_ms"):
+        print("%-21s mean %9.1f, p50 %9.1f, p95 %9.1f, max %9.1f" % (
+            name[:-3].replace("_", " ") + " [ms]:", result[name]["mean"], result[name]["p50"], result[name]["p95"],
+            result[name]["max"]
+        ))
+    print("fetches: %d, failed %d, readings uploaded %d" % (result["fetches"], result["failed_fetches"],
+                                                              result["readings"]))
+    print("upload: %d B per cycle, requests %s, bytes %s" % (result["upload_bytes_per_cycle"], result["requests"],
+                                                            result["bytes"]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print("Results saved to %s." % (args.output, ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Load generator simulating a fleet of probes against a running server. Each simulated probe uses the probe's Server
+class: it registers its services by PUT /probe, and then in every cycle polls /services/<probe> and uploads readings
+of its mapped services. Cycles are scheduled every --interval seconds with random jitter, and the probes start at random
+offset within the first interval. The schedules run in asyncio, and the blocking HTTP calls of Client run in a pool of
+--connections threads, so one machine can simulate thousands of probes.
+
+The fleet grows in steps (--fleet 500,1000,2000,5000). Each step runs one interval to let new probes register and
+settle, and then measures for --duration seconds: throughput achieved against throughput offered by the schedules,
+latency percentiles of each endpoint, and how late the cycles start. Throughput saturates at the first step where the
+server does not keep up with the schedules.
+
+Latency percentiles are measured by the server: the request duration histograms of its /metrics endpoint are scraped
+before and after each step, and the percentiles are interpolated within the histogram buckets (the server must
+export metrics of all its workers, see [metrics] MultiprocessDir).
+Durations measured by the client are reported too, they include the client overhead. When the calls wait for a free
+connection of the pool longer than --queue-threshold, the step is client-limited: the load generator, not the server,
+is the bottleneck, and the ramp stops there without reporting saturation. Use more --connections, or more machines.
+
+The server accepts only probes that exist in its database. Create them first, for example:
+
+    python3 -m bench.fleet --fleet 5000 --print-sql | mysql mon
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+from typing import Dict
+from urllib.parse import urljoin
+
+import requests
+
+from lib.client import Client
+from lib.server import Server
+
+
+# Histogram of request durations exported by the server on /metrics.
+LATENCY_HISTOGRAM = "mon_api_request_duration_seconds"
+
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+class Recorder:
+    """
+    Thread-safe collection of measurements of current step.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.latencies = {}
+            self.errors = {}
+            self.lags = []
+            self.waits = []
+            self.readings = 0
+
+    def request(self, endpoint: str, latency: float, ok: bool) -> None:
+        with self.lock:
+            if ok:
+                self.latencies.setdefault(endpoint, []).append(latency)
+            else:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def wait(self, wait: float) -> None:
+        """
+        Record time the call waited for free connection of the pool.
+        """
+        with self.lock:
+            self.waits.append(wait)
+
+    def cycle(self, lag: float, readings: int) -> None:
+        with self.lock:
+            self.lags.append(lag)
+            self.readings += readings
+
+
+class TimedClient(Client):
+    """
+    API client recording duration and result of each call.
+    """
+    def __init__(self, api_root: str, recorder: Recorder):
+        super(TimedClient, self).__init__(api_root)
+        self.recorder = recorder
+
+    def _timed(self, http_method: str, call, method: str, *args):
+        endpoint = "%s %s" % (http_method, method.strip("/").split("/")[0])
+        start = perf_counter()
+        ok = False
+        try:
+            result = call(method, *args)
+            ok = True
+            return result
+        finally:
+            self.recorder.request(endpoint, perf_counter() - start, ok)
+
+    def get(self, method: str, params: dict=None) -> any:
+        return self._timed("GET", super(TimedClient, self).get, method, params)
+
+    def put(self, method: str, json: any=None) -> any:
+        return self._timed("PUT", super(TimedClient, self).put, method, json)
+
+
+class SyntheticService:
+    """
+    Service definition of simulated probe, with the attributes of service.Service used by Server.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.description = "Synthetic fleet service %s." % (name, )
+        self.options = {"hostname": {"name": "Host name", "type": "string", "required": False}}
+        self.thresholds = {"*": {"error": {"min": 0, "max": 900}}}
+        self.readings = {}
+
+
+class SimulatedProbe:
+    """
+    One probe of the fleet.
+    """
+    def __init__(self, fleet: "Fleet", name: str):
+        self.fleet = fleet
+        self.server = Server(fleet.url)
+        self.server.client = TimedClient(fleet.url, fleet.recorder)
+        self.server.probe_name = name
+        self.services = {
+            "fleet-service-%d" % (index, ): SyntheticService("fleet-service-%d" % (index, ))
+            for index in range(fleet.services)
+        }
+
+    async def call(self, function, *args):
+        """
+        Run blocking API call in the connection pool. Failed call is recorded by the client and returns None.
+        """
+        submitted = perf_counter()
+
+        def run():
+            self.fleet.recorder.wait(perf_counter() - submitted)
+            return function(*args)
+
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self.fleet.executor, run)
+        except Exception as e:
+            logging.debug("Probe %s: %s" % (self.server.probe_name, e))
+            return None
+
+    async def run(self) -> None:
+        loop = asyncio.get_event_loop()
+        interval = self.fleet.interval
+
+        scheduled = loop.time() + random.uniform(0, interval)
+        await asyncio.sleep(scheduled - loop.time())
+
+        await self.call(self.server.register_probe, self.services)
+
+        # Map each service once, the way an administrator would.
+        if not await self.call(self.server.get_mapped_services):
+            await self.call(self.server.client.put, "services/%s" % (self.server.probe_name, ), [
+                {
+                    "name": "%s-%s" % (self.server.probe_name, name),
+                    "service": name,
+                    "options": {"hostname": "localhost"}
+                }
+                for name in self.services
+            ])
+
+        while True:
+            scheduled += interval * random.uniform(1 - self.fleet.jitter, 1 + self.fleet.jitter)
+            await asyncio.sleep(max(0.0, scheduled - loop.time()))
+
+            lag = loop.time() - scheduled
+            time_point = datetime.now()
+
+            mapped = await self.call(self.server.get_mapped_services) or []
+            responses = {
+                mapping.id: {
+                    "reading_%d" % (index, ): random.randint(0, 1000)
+                    for index in range(self.fleet.readings)
+                }
+                for mapping in mapped
+            }
+
+            await self.call(self.server.update, responses, time_point)
+            self.fleet.recorder.cycle(lag, len(responses) * self.fleet.readings)
+
+
+class Fleet:
+    """
+    Fleet of simulated probes.
+    """
+    def __init__(self, url: str, prefix: str, services: int, readings: int, interval: float, jitter: float,
+                 connections: int, metrics_url: str=None):
+        self.url = url
+        self.metrics_url = metrics_url or urljoin(url, "/metrics")
+        self.prefix = prefix
+        self.services = services
+        self.readings = readings
+        self.interval = interval
+        self.jitter = jitter
+        self.executor = ThreadPoolExecutor(max_workers=connections)
+        self.recorder = Recorder()
+        self.tasks = []
+
+    def probe_name(self, index: int) -> str:
+        return "%s-%05d" % (self.prefix, index)
+
+    def grow(self, size: int) -> None:
+        """
+        Start probes up to given fleet size.
+        """
+        for index in range(len(self.tasks), size):
+            probe = SimulatedProbe(self, self.probe_name(index))
+            self.tasks.append(asyncio.ensure_future(probe.run()))
+
+    async def step(self, size: int, duration: float) -> dict:
+        """
+        Grow the fleet and measure it.
+        """
+        loop = asyncio.get_event_loop()
+
+        self.grow(size)
+        await asyncio.sleep(self.interval)
+
+        before = await loop.run_in_executor(None, self.scrape)
+        self.recorder.reset()
+        await asyncio.sleep(duration)
+
+        with self.recorder.lock:
+            latencies = {endpoint: sorted(values) for endpoint, values in self.recorder.latencies.items()}
+            errors = dict(self.recorder.errors)
+            lags = sorted(self.recorder.lags)
+            waits = sorted(self.recorder.waits)
+            readings = self.recorder.readings
+
+        after = await loop.run_in_executor(None, self.scrape)
+
+        server_latencies = {}
+        if before is not None and after is not None:
+            for endpoint, buckets in after.items():
+                delta = {bound: count - before.get(endpoint, {}).get(bound, 0.0) for bound, count in buckets.items()}
+                if delta.get(float("inf"), 0.0) > 0:
+                    server_latencies[endpoint] = delta
+
+        # Every cycle polls mapped services and uploads readings.
+        offered = size * 2 / self.interval
+        completed = sum(len(values) for values in latencies.values())
+
+        return {
+            "fleet": size,
+            "offered_rps": round(offered, 2),
+            "achieved_rps": round(completed / duration, 2),
+            "readings_per_second": round(readings / duration, 2),
+            "errors": errors,
+            "server_latency_ms": {
+                endpoint: {
+                    "p50": round(histogram_percentile(buckets, 0.5) * 1000, 3),
+                    "p95": round(histogram_percentile(buckets, 0.95) * 1000, 3),
+                    "p99": round(histogram_percentile(buckets, 0.99) * 1000, 3),
+                    "count": int(buckets[float("inf")]),
+                }
+                for endpoint, buckets in sorted(server_latencies.items())
+            },
+            "client_latency_ms": {
+                endpoint: {
+                    "p50": round(percentile(values, 0.5) * 1000, 3),
+                    "p95": round(percentile(values, 0.95) * 1000, 3),
+                    "p99": round(percentile(values, 0.99) * 1000, 3),
+                    "max": round(values[-1] * 1000, 3),
+                }
+                for endpoint, values in sorted(latencies.items())
+            },
+            "schedule_lag_ms": {
+                "p50": round(percentile(lags, 0.5) * 1000, 3),
+                "p95": round(percentile(lags, 0.95) * 1000, 3),
+            },
+            "pool_wait_ms": {
+                "p50": round(percentile(waits, 0.5) * 1000, 3),
+                "p95": round(percentile(waits, 0.95) * 1000, 3),
+            }
+        }
+
+    def scrape(self) -> Dict[str, Dict[float, float]]:
+        """
+        Scrape request duration histograms of the server.
+        :return: Cumulative bucket counts by endpoint (Resource.method) and upper bound, None when the metrics are not
+            available.
+        """
+        try:
+            response = requests.get(self.metrics_url, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.warning("Cannot scrape server metrics from %s: %s" % (self.metrics_url, e))
+            return None
+
+        histograms = {}
+        for line in response.text.splitlines():
+            if not line.startswith(LATENCY_HISTOGRAM + "_bucket{"):
+                continue
+
+            labels, _, value = line[len(LATENCY_HISTOGRAM) + 8:].rpartition("}")
+            labels = dict(LABEL.findall(labels))
+
+            # Buckets of all statuses are added up.
+            buckets = histograms.setdefault("%s.%s" % (labels.get("resource"), labels.get("method")), {})
+            bound = float(labels["le"])
+            buckets[bound] = buckets.get(bound, 0.0) + float(value.split()[0])
+
+        return histograms
+
+    def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.executor.shutdown(wait=False)
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def histogram_percentile(buckets: Dict[float, float], fraction: float) -> float:
+    """
+    Percentile estimated from cumulative histogram buckets, interpolated linearly within the bucket (same as
+    histogram_quantile of Prometheus).
+    :param buckets: Upper bound -> number of values up to the bound, including +Inf bound.
+    :param fraction: Percentile (0-1).
+    """
+    total = buckets.get(float("inf"), 0.0)
+    if total <= 0:
+        return 0.0
+
+    rank = fraction * total
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in sorted(buckets):
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+
+    return previous_bound
+
+
+async def ramp(fleet: Fleet, sizes: list, duration: float, threshold: float, queue_threshold: float) -> dict:
+    """
+    Run the steps and find where the throughput saturates.
+    """
+    steps = []
+    saturated = None
+    client_limited = None
+
+    print("%7s %10s %10s %10s %8s %13s %13s %10s %10s" % (
+        "fleet", "offered/s", "achieved/s", "readings/s", "errors", "server p95 ms", "client p95 ms", "lag p95 ms",
+        "wait p95 ms"))
+
+    for size in sizes:
+        result = await fleet.step(size, duration)
+        result["client_limited"] = result["pool_wait_ms"]["p95"] > queue_threshold
+        steps.append(result)
+
+        server_p95 = max([latency["p95"] for latency in result["server_latency_ms"].values()], default=0.0)
+        client_p95 = max([latency["p95"] for latency in result["client_latency_ms"].values()], default=0.0)
+        print("%7d %10.1f %10.1f %10.1f %8d %13.1f %13.1f %10.1f %10.1f%s" % (
+            size, result["offered_rps"], result["achieved_rps"], result["readings_per_second"],
+            sum(result["errors"].values()), server_p95, client_p95, result["schedule_lag_ms"]["p95"],
+            result["pool_wait_ms"]["p95"], "  client-limited" if result["client_limited"] else ""
+        ))
+
+        if result["client_limited"]:
+            client_limited = size
+            break
+
+        if result["achieved_rps"] < result["offered_rps"] * threshold or result["errors"]:
+            saturated = size
+            break
+
+    return {"steps": steps, "saturated_at": saturated, "client_limited_at": client_limited}
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:5000/api/v1/", help="API root URL.")
+    parser.add_argument("--prefix", default="fleet", help="Prefix of names of simulated probes.")
+    parser.add_argument("--fleet", default="100,500,1000,2000,5000", help="Comma separated fleet sizes of the steps.")
+    parser.add_argument("--services", type=int, default=5, help="Number of mapped services of each probe.")
+    parser.add_argument("--readings", type=int, default=3, help="Number of readings of each service.")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between cycles of each probe.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random variation of the interval (0-1).")
+    parser.add_argument("--duration", type=float, default=120, help="Seconds each step is measured.")
+    parser.add_argument("--connections", type=int, default=64, help="Number of concurrent HTTP calls.")
+    parser.add_argument("--metrics-url", help="URL of server metrics. Default is /metrics on the host of --url.")
+    parser.add_argument("--queue-threshold", type=float, default=50,
+                        help="Step is client-limited when 95th percentile of wait for free connection exceeds this "
+                             "number of milliseconds.")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="Throughput saturates when the achieved throughput is below this fraction of offered.")
+    parser.add_argument("--output", help="File to store results as JSON.")
+    parser.add_argument("--print-sql", action="store_true", help="Print SQL creating the probes and exit.")
+
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.fleet.split(",")]
+
+    fleet = Fleet(args.url, args.prefix, args.services, args.readings, args.interval, args.jitter, args.connections,
+                  args.metrics_url)
+
+    if args.print_sql:
+        for index in range(max(sizes)):
+            print("INSERT INTO probes (name) VALUES ('%s');" % (fleet.probe_name(index), ))
+        return
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    loop = asyncio.get_event_loop()
+    try:
+        result = loop.run_until_complete(ramp(fleet, sizes, args.duration, args.threshold, args.queue_threshold))
+    finally:
+        fleet.stop()
+
+    if result["client_limited_at"] is not None:
+        print("Load generator is the bottleneck at %d probes, server saturation is not known." % (
+            result["client_limited_at"], ))
+    elif result["saturated_at"] is None:
+        print("Throughput did not saturate up to %d probes." % (sizes[-1], ))
+    else:
+        print("Throughput saturates at %d probes." % (result["saturated_at"], ))
+
+    if args.output:
+        result["parameters"] = vars(args)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print("Results saved to %s." % (args.output, ))
+
+
+if __name__ == "__main__":
+    main()
@@ -17,12 +17,16 @@ class Server:
         self.probe_name = socket.gethostname()
         self.services = None
 
+        # (mapping_id, reading name) -> reading ID returned by the server. Values of known readings are sent by ID.
+        self.reading_ids = {}
+
     def register_probe(self, services: Dict[str, Service]) -> None:
         """
         Register the probe on startup or reconfiguration.
         :param services: List of services that this probe is able to provide.
         """
         self.services = services
+        self.reading_ids = {}
         self.client.put("probe", json={
             "name": self.probe_name,
             "services": [
@@ -39,12 +43,16 @@ class Server:
                         } for option_identifier, option in service.options.items()
                     ],
                     "thresholds": {
-                        reading: {
+                        reading: dict({
                             "status": status,
                             "min": values.get("min"),
                             "max": values.get("max")
-                        } for reading, statuses in service.thresholds.items() for status, values in statuses.items()
-                    }
+                        }, **{
+                            key: value for key, value in values.items()
+                            if key in ("recovery_min", "recovery_max", "sigma", "season")
+                        }) for reading, statuses in service.thresholds.items() for status, values in statuses.items()
+                    },
+                    "readings": service.readings
                 } for service in services.values()
             ]
         })
@@ -85,14 +93,31 @@ class Server:
         # Build up readings to post to server.
         readings = []
 
+        timestamp = time_point.isoformat()
+
         for mapping, values in fetch_result.items():
             for key, val in values.items():
-                readings.append({
-                    "service": mapping,
-                    "reading": key,
-                    "value": int(val),
-                    "timestamp": time_point.isoformat()
-                })
+                reading_id = self.reading_ids.get((mapping, key))
+                if reading_id is not None:
+                    readings.append([reading_id, timestamp, int(val)])
+                else:
+                    readings.append({
+                        "service": mapping,
+                        "reading": key,
+                        "value": int(val),
+                        "timestamp": timestamp
+                    })
                 logging.debug("    Service %d %s=%s" % (mapping, key, val))
 
-        self.client.put("/readings/%s" % (self.probe_name, ), json=readings)
+        result = self.client.put("/readings/%s" % (self.probe_name, ), json=readings) or {}
+
+        # Remember IDs of new readings, forget readings the server no longer knows, they are sent by name again.
+        for mapping, reading_ids in result.get("readings", {}).items():
+            for key, reading_id in reading_ids.items():
+                self.reading_ids[(int(mapping), key)] = reading_id
+
+        unknown = set(result.get("unknown", []))
+        if unknown:
+            self.reading_ids = {
+                key: reading_id for key, reading_id in self.reading_ids.items() if reading_id not in unknown
+            }
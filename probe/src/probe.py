@@ -107,7 +107,11 @@ def main():
             time_point = datetime.now()
 
             for service in mapped:
-                responses[service.id] = service.fetch()
+                result = service.fetch()
+
+                # Failed fetch is already logged, do not send anything for the service.
+                if result is not None:
+                    responses[service.id] = result
 
             server.update(responses, time_point)
 
@@ -26,12 +26,21 @@ class Service:
         hostnames.description               # Option description that is shown when configuring the option.
         timeout = Ping timeout              # Another option.
 
+        [thresholds]                        # Limits of readings, see populate_thresholds().
+        *.warning.max = 100
+
+        [readings]                          # Types of readings (name or pattern). Default type is gauge.
+        rx_bytes.type = counter             # counter or derive readings get also per-second rate.
+        rx_bytes.max = 4294967295           # Value after which counter wraps to 0.
+        rx_bytes.scale = 8                  # Multiplier of the rate before it is stored as integer.
+
     Calling `service.exe fetch` should return current service metrics.
     """
     def __init__(self, binary: str):
         self.binary = binary
         self.options = {}
         self.thresholds = {}
+        self.readings = {}
         self.name = os.path.splitext(os.path.basename(self.binary))[0]
         self.description = ""
 
@@ -102,6 +111,9 @@ class Service:
             if parser.has_section("thresholds"):
                 self.populate_thresholds(parser)
 
+            if parser.has_section("readings"):
+                self.populate_readings(parser)
+
         except DuplicateSectionError as e:
             self.logger.error("Duplicate section '%s' in service config. Service skipped." % (e.section, ))
             return
@@ -144,22 +156,58 @@ class Service:
         """
         Fill in self.thresholds from service configuration:
             self.thresholds[reading][status] = {"min": None or value, "max": None or value}
+        Optional {reading}.{status}.recovery_min and recovery_max are limits the value must get within to leave the
+        status again, they are added to the dict only when set. So are {reading}.{status}.sigma, which makes the
+        threshold adaptive (status is issued when value deviates from average by more than sigma standard deviations),
+        and {reading}.{status}.season, length of season of the average in seconds.
         :param parser: ConfigParser with service options.
         """
         for full_option in parser.options("thresholds"):
             split = full_option.split(".")
-            if len(split) < 3 or split[-1] not in ("min", "max"):
-                self.logger.error("Threshold item '%s' has invalid name. "
-                                  "It must be in form {reading}.{status}.(min|max)." % (full_option, ))
+            if len(split) < 3 or split[-1] not in ("min", "max", "recovery_min", "recovery_max", "sigma", "season"):
+                self.logger.error("Threshold item '%s' has invalid name. It must be in form "
+                                  "{reading}.{status}.(min|max|recovery_min|recovery_max|sigma|season)."
+                                  % (full_option, ))
                 continue
 
             min_max = split[-1]
             status = split[-2]
             reading = ".".join(split[:-2])
 
+            value = parser.getfloat("thresholds", full_option) if min_max == "sigma" \
+                else parser.getint("thresholds", full_option)
+
             self.thresholds\
                 .setdefault(reading, {})\
-                .setdefault(status, {"min": None, "max": None})[min_max] = parser.getint("thresholds", full_option)
+                .setdefault(status, {"min": None, "max": None})[min_max] = value
+
+    def populate_readings(self, parser: ConfigParser) -> None:
+        """
+        Fill in self.readings from service configuration:
+            self.readings[reading] = {"type": "gauge", "counter" or "derive"}
+        Optional {reading}.max and {reading}.scale are added to the dict only when set.
+        :param parser: ConfigParser with service options.
+        """
+        for full_option in parser.options("readings"):
+            split = full_option.split(".")
+            if len(split) < 2 or split[-1] not in ("type", "max", "scale"):
+                self.logger.error("Reading item '%s' has invalid name. It must be in form "
+                                  "{reading}.(type|max|scale)." % (full_option, ))
+                continue
+
+            key = split[-1]
+            reading = ".".join(split[:-1])
+
+            if key == "type":
+                value = parser.get("readings", full_option)
+                if value not in ("gauge", "counter", "derive"):
+                    self.logger.error("Reading '%s' has invalid type '%s'. It must be gauge, counter or derive."
+                                      % (reading, value))
+                    continue
+            else:
+                value = parser.getint("readings", full_option)
+
+            self.readings.setdefault(reading, {"type": "gauge"})[key] = value
 
 
 class ServiceMapping:
@@ -1,14 +1,27 @@
 from flask import Flask
 from flask_restful import Api
-from api.probe import Probe, Probes
+from config import config
+from lib.jobs import jobs
+from lib.metrics import export as export_metrics
+from api.db import reconcile_status_counters, sketch_rollup, staleness_sweeper
+from api.backfill import Import
+from api.export import Export
+from api.probe import Probe, Probes, StatusSummary
 from api.services import Services
-from api.readings import Readings
+from api.readings import Readings, LatestReadings, ReadingPercentiles
+from api.stats import Stats
 
 api = Api(prefix="/api/v1")
 api.add_resource(Probes, "/probe/")
 api.add_resource(Probe, "/probe/<string:name>/")
+api.add_resource(StatusSummary, "/status/")
 api.add_resource(Services, "/services/<string:probe_name>/")
 api.add_resource(Readings, "/readings/<string:probe_name>/")
+api.add_resource(LatestReadings, "/readings/<string:probe_name>/latest/")
+api.add_resource(ReadingPercentiles, "/readings/<string:probe_name>/percentiles/")
+api.add_resource(Stats, "/stats/")
+api.add_resource(Export, "/export/")
+api.add_resource(Import, "/import/")
 
 
 def register_api(app: Flask):
@@ -17,3 +30,14 @@ def register_api(app: Flask):
     """
     # noinspection PyTypeChecker
     api.init_app(app)
+
+    app.add_url_rule("/metrics", "metrics", export_metrics)
+
+    # Each API call (also the local ones made by the website) gets its own session, released when the call ends.
+    app.teardown_request(config.remove_session)
+
+    jobs.add("reconcile_status_counters", config.cfg.getfloat("jobs", "StatusReconcileInterval", fallback=300),
+             reconcile_status_counters)
+    jobs.add("staleness_sweep", config.cfg.getfloat("jobs", "StalenessSweepInterval", fallback=30),
+             staleness_sweeper.sweep)
+    jobs.add("sketch_rollup", config.cfg.getfloat("jobs", "SketchRollupInterval", fallback=60), sketch_rollup.run)
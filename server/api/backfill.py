@@ -0,0 +1,226 @@
+"""
+API for bulk import of historical reading values.
+"""
+
+import csv
+import json
+import logging
+from datetime import datetime
+from itertools import islice
+from time import perf_counter
+from typing import Iterable, Iterator, Tuple
+
+from flask import request
+from sqlalchemy import and_, bindparam, or_
+from werkzeug.exceptions import BadRequest
+
+from api.db import MappedService, Reading, ReadingValue, latest_values
+from config import config
+from lib.export import IMPORT_COLUMNS, IMPORT_FORMATS
+from lib.metrics import READINGS_IMPORTED, READINGS_REJECTED
+from lib.schema import ExplicitObject, Integer, Number
+from lib.util import SafeResource, validate_response, parse_datetime
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parse timestamp of imported value. Plain ISO 8601 timestamps as written by the export ("2020-01-01T12:00:00")
+    are parsed by strptime() directly, anything else goes to parse_datetime().
+    :raise ValueError: When the value is not valid datetime.
+    """
+    if len(value) == 19 and value[10] == "T":
+        try:
+            return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+        except ValueError:
+            pass
+
+    return parse_datetime(value)
+
+
+def parse_rows(lines: Iterable[str], import_format: str) -> Iterator[Tuple[int, str, datetime, int]]:
+    """
+    Parse imported values.
+    :param lines: Lines of the input.
+    :param import_format: One of IMPORT_FORMATS.
+    :return: Iterator of (service, reading, timestamp, value) tuples.
+    :raise ValueError: When the input is not valid, with number of the bad line.
+    """
+    if import_format == "csv":
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        try:
+            service, reading, timestamp, value = [header.index(column) for column in IMPORT_COLUMNS]
+        except ValueError:
+            raise ValueError("CSV header must contain columns %s." % (",".join(IMPORT_COLUMNS), ))
+
+        for row in reader:
+            if not row:
+                continue
+
+            try:
+                yield int(row[service]), row[reading], parse_timestamp(row[timestamp]), int(row[value])
+            except (ValueError, IndexError) as e:
+                raise ValueError("Line %d: %s" % (reader.line_num, e))
+    else:
+        for line_num, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                row = json.loads(line)
+                yield int(row["service"]), str(row["reading"]), parse_timestamp(row["timestamp"]), int(row["value"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError("Line %d: %s" % (line_num, e))
+
+
+class Import(SafeResource):
+    """
+    Loads historical reading values in bulk.
+    """
+
+    # Number of values resolved and inserted at once. The whole request is committed at the end.
+    BATCH_SIZE = 10000
+
+    # Number of rows inserted by one multi-row INSERT statement.
+    INSERT_SIZE = 1000
+
+    @validate_response(ExplicitObject({
+        "imported": Integer(title="Number of stored values."),
+        "rejected": Integer(title="Number of values of unknown mapped services."),
+        "created": Integer(title="Number of created readings."),
+        "seconds": Number(title="Duration of the import."),
+        "rows_per_second": Number(title="Imported values per second.")
+    }))
+    def post(self):
+        """
+        Import reading values streamed in request body. Accepts following query params:
+            format - Format of the body, csv (with header line) or ndjson, see lib/export.py. Default is csv.
+        Each value has columns service (mapped service ID), reading (name), timestamp and value. Unlike readings
+        sent by probes, imported values are not evaluated against thresholds and do not change status of services.
+        Readings are created when they do not exist yet, and their last value is updated when the imported one is
+        newer. The request is imported in one transaction, so when the import fails on bad input, nothing from the
+        request is stored, and the whole request can be sent again.
+        """
+        import_format = request.args.get("format", "csv")
+        if import_format not in IMPORT_FORMATS:
+            raise BadRequest("Bad format value: '%s'. Must be one of %s." % (import_format, ",".join(IMPORT_FORMATS)))
+
+        start = perf_counter()
+        session = config.db
+
+        service_ids = set(service_id for service_id, in session.query(MappedService.id).all())
+
+        # (mapped_service_id, name) -> [reading_id, last_timestamp] of readings used by the import.
+        readings = {}
+
+        imported = 0
+        rejected = 0
+        created = 0
+        updated_last = False
+
+        rows = parse_rows((line.decode("utf-8") for line in request.stream), import_format)
+
+        try:
+            while True:
+                try:
+                    batch = list(islice(rows, self.BATCH_SIZE))
+                except ValueError as e:
+                    raise BadRequest("%s Nothing from the request was imported." % (e, ))
+
+                if not batch:
+                    break
+
+                accepted = [row for row in batch if row[0] in service_ids]
+                rejected += len(batch) - len(accepted)
+
+                missing = set((row[0], row[1]) for row in accepted if (row[0], row[1]) not in readings)
+                if missing:
+                    created += self.resolve_readings(session, missing, readings)
+
+                values = [
+                    {"reading": readings[(service_id, name)][0], "datetime": timestamp, "value": value}
+                    for service_id, name, timestamp, value in accepted
+                ]
+
+                table = ReadingValue.__table__
+                for offset in range(0, len(values), self.INSERT_SIZE):
+                    session.execute(table.insert().values(values[offset:offset + self.INSERT_SIZE]))
+
+                # Keep last value index of readings, for values newer than the current last value.
+                newest = {}
+                for service_id, name, timestamp, value in accepted:
+                    key = service_id, name
+                    last_timestamp = newest[key]["b_timestamp"] if key in newest else readings[key][1]
+                    if last_timestamp is None or timestamp >= last_timestamp:
+                        newest[key] = {"b_id": readings[key][0], "b_timestamp": timestamp, "b_value": value}
+
+                if newest:
+                    reading_table = Reading.__table__
+                    session.execute(
+                        reading_table.update()
+                        .where(and_(reading_table.c.id == bindparam("b_id"),
+                                    or_(reading_table.c.last_timestamp.is_(None),
+                                        reading_table.c.last_timestamp <= bindparam("b_timestamp"))))
+                        .values(last_timestamp=bindparam("b_timestamp"), last_value=bindparam("b_value")),
+                        list(newest.values())
+                    )
+                    for key, row in newest.items():
+                        readings[key][1] = row["b_timestamp"]
+                    updated_last = True
+
+                imported += len(accepted)
+
+            session.commit()
+        except:
+            session.rollback()
+            raise
+        finally:
+            if updated_last:
+                latest_values.invalidate()
+
+        READINGS_IMPORTED.inc(imported)
+        READINGS_REJECTED.labels("unknown_service").inc(rejected)
+
+        seconds = perf_counter() - start
+        logging.info("Imported %d reading values in %.1f s (%.0f values/s), %d rejected, %d readings created." %
+                     (imported, seconds, imported / seconds if seconds else 0, rejected, created))
+
+        return {
+            "imported": imported,
+            "rejected": rejected,
+            "created": created,
+            "seconds": seconds,
+            "rows_per_second": imported / seconds if seconds else 0.0
+        }
+
+    def resolve_readings(self, session, keys: set, readings: dict) -> int:
+        """
+        Find IDs of readings, create the readings that do not exist.
+        :param session: Database session.
+        :param keys: Set of (mapped_service_id, name) of readings to resolve.
+        :param readings: Resolved readings, (mapped_service_id, name) -> [reading_id, last_timestamp].
+        :return: Number of created readings.
+        """
+        def load():
+            for reading_id, service_id, name, last_timestamp in session.query(
+                    Reading.id, Reading.mapped_service_id, Reading.name, Reading.last_timestamp)\
+                    .filter(Reading.mapped_service_id.in_(set(key[0] for key in keys)))\
+                    .filter(Reading.name.in_(set(key[1] for key in keys)))\
+                    .order_by(Reading.id.desc()):
+                # The oldest reading wins, when there are duplicates.
+                if (service_id, name) in keys:
+                    readings[(service_id, name)] = [reading_id, last_timestamp]
+
+        load()
+
+        new = [{"mapped_service_id": key[0], "name": key[1]} for key in keys if key not in readings]
+        if new:
+            table = Reading.__table__
+            for offset in range(0, len(new), self.INSERT_SIZE):
+                session.execute(table.insert().values(new[offset:offset + self.INSERT_SIZE]))
+            load()
+
+        return len(new)
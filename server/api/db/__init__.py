@@ -4,16 +4,27 @@ Module specifying database-related stuff and classes.
 
 from .const import const, OptionDataType
 from .entities.error_cause import ErrorCause
+from .entities.job_watermark import JobWatermark
 from .entities.mapped_service import MappedService
 from .entities.mapped_service_option import MappedServiceOption
 from .entities.probe import Probe
+from .entities.probe_status_counter import ProbeStatusCounter
 from .entities.reading import Reading
+from .entities.reading_baseline import ReadingBaseline
+from .entities.reading_sketch import ReadingSketch
 from .entities.reading_value import ReadingValue
 from .entities.service import Service
 from .entities.service_option import ServiceOption
+from .entities.service_reading import ServiceReading
 from .entities.service_status import ServiceStatus
 from .entities.service_status_history import ServiceStatusHistory
 from .entities.service_threshold import ServiceThreshold
 from .entities.status import Status
 from .select_builder import select
+from .latest import latest_values
 
+from .status_counters import StatusCounterChanges, status_totals, reconcile_status_counters
+from .status_evaluation import StatusEvaluation
+from .baselines import baselines
+from .staleness import staleness_sweeper
+from .sketch_rollup import sketch_rollup
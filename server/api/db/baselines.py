@@ -0,0 +1,185 @@
+"""
+Baselines of reading values for adaptive thresholds.
+"""
+
+from datetime import datetime
+from time import monotonic
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import and_, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.db.entities.reading_baseline import ReadingBaseline
+from config import config
+
+
+class Baseline:
+    """
+    Exponentially weighted mean and variance of reading values, updated in constant time by each value.
+    """
+    __slots__ = ("mean", "variance", "count", "stored", "dirty", "checkpointed")
+
+    def __init__(self, mean: float=0.0, variance: float=0.0, count: int=0, stored: bool=False):
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+
+        # Whether the baseline has row in database, was updated since last checkpoint, and when it was checkpointed.
+        self.stored = stored
+        self.dirty = False
+        self.checkpointed = monotonic()
+
+    def update(self, value: float, alpha: float) -> None:
+        """
+        Add value to the baseline.
+        :param value: Value of reading.
+        :param alpha: Weight of the value (0-1).
+        """
+        if self.count == 0:
+            self.mean = float(value)
+            self.variance = 0.0
+        else:
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+
+        self.count += 1
+        self.dirty = True
+
+    def bounds(self, sigma: float) -> Tuple[float, float]:
+        """
+        Range of values deviating from the mean by at most sigma standard deviations.
+        """
+        deviation = sigma * self.variance ** 0.5
+        return self.mean - deviation, self.mean + deviation
+
+
+class Baselines:
+    """
+    Baselines of readings cached in memory of the process, with checkpoints in reading_baselines.
+
+    Each server process updates the baselines of readings it receives. Baselines of a reading are reloaded from the
+    checkpoint when they were loaded more than [baselines] MaxAge seconds ago, so the processes pick up values
+    received by the others. Changed baselines are written back after [baselines] CheckpointInterval seconds. With the
+    defaults, baselines of probes sending readings every minute are reloaded and checkpointed with every batch, while
+    faster probes are served from memory. Values missed because of the caching only make the average a bit less
+    smooth.
+    """
+    def __init__(self):
+        self.alpha = config.cfg.getfloat("baselines", "Alpha", fallback=0.05)
+        self.min_samples = config.cfg.getint("baselines", "MinSamples", fallback=30)
+        self.slots = config.cfg.getint("baselines", "SeasonSlots", fallback=24)
+        self.max_age = config.cfg.getfloat("baselines", "MaxAge", fallback=30.0)
+        self.checkpoint_interval = config.cfg.getfloat("baselines", "CheckpointInterval", fallback=0.0)
+
+        # (reading_id, season, slot) -> baseline, and reading_id -> time its baselines were loaded.
+        self.baselines = {}  # type: Dict[Tuple[int, int, int], Baseline]
+        self.loaded = {}  # type: Dict[int, float]
+
+    def key(self, reading_id: int, season: int, timestamp: datetime) -> Tuple[int, int, int]:
+        """
+        Key of baseline of the reading at given time.
+        :param reading_id: ID of reading.
+        :param season: Length of season in seconds, 0 or None for baseline without season.
+        :param timestamp: Time of value.
+        """
+        if not season:
+            return reading_id, 0, 0
+
+        seconds = (timestamp - datetime(1970, 1, 1)).total_seconds()
+        return reading_id, season, int(seconds % season * self.slots // season)
+
+    def load(self, session: Session, reading_ids: Iterable[int]) -> None:
+        """
+        Load baselines of the readings from checkpoints, unless they were loaded recently.
+        :param session: Database session.
+        :param reading_ids: IDs of readings.
+        """
+        now = monotonic()
+        expired = [
+            reading_id for reading_id in reading_ids
+            if now - self.loaded.get(reading_id, -self.max_age) >= self.max_age
+        ]
+        if not expired:
+            return
+
+        for row in session.query(ReadingBaseline).filter(ReadingBaseline.reading.in_(expired)).all():
+            key = row.reading, row.season, row.slot
+            baseline = self.baselines.get(key)
+
+            # Keep own changes that were not checkpointed yet.
+            if baseline is not None and baseline.dirty:
+                continue
+
+            self.baselines[key] = Baseline(row.mean, row.variance, row.count, stored=True)
+
+        for reading_id in expired:
+            self.loaded[reading_id] = now
+
+    def get(self, key: Tuple[int, int, int]) -> Baseline:
+        """
+        Return baseline with given key, create it if it does not exist.
+        """
+        baseline = self.baselines.get(key)
+        if baseline is None:
+            baseline = Baseline()
+            self.baselines[key] = baseline
+        return baseline
+
+    def ready(self, baseline: Baseline) -> bool:
+        """
+        Whether the baseline has enough values to be used for evaluation.
+        """
+        return baseline.count >= self.min_samples
+
+    def checkpoint(self, session: Session, keys: Iterable[Tuple[int, int, int]]) -> None:
+        """
+        Write changed baselines with given keys to database, if their checkpoint is due.
+        :param session: Database session, committed by the caller.
+        :param keys: Keys of baselines updated by current request.
+        """
+        now = monotonic()
+        updates = []
+        inserts = []
+
+        for key in keys:
+            baseline = self.baselines[key]
+            if not baseline.dirty or now - baseline.checkpointed < self.checkpoint_interval:
+                continue
+
+            row = {
+                "b_reading": key[0], "b_season": key[1], "b_slot": key[2],
+                "mean": baseline.mean, "variance": baseline.variance, "count": baseline.count
+            }
+            (updates if baseline.stored else inserts).append(row)
+
+            baseline.dirty = False
+            baseline.checkpointed = now
+
+        table = ReadingBaseline.__table__
+
+        if updates:
+            session.execute(
+                table.update()
+                .where(and_(table.c.reading == bindparam("b_reading"), table.c.season == bindparam("b_season"),
+                            table.c.slot == bindparam("b_slot"))),
+                updates
+            )
+
+        for row in inserts:
+            # Other process could create the same baseline in the meantime, then its checkpoint is kept.
+            try:
+                with session.begin_nested():
+                    session.execute(table.insert().values(
+                        reading=row["b_reading"], season=row["b_season"], slot=row["b_slot"], mean=row["mean"],
+                        variance=row["variance"], count=row["count"]
+                    ))
+            except IntegrityError:
+                pass
+
+            self.baselines[(row["b_reading"], row["b_season"], row["b_slot"])].stored = True
+
+
+baselines = Baselines()
@@ -0,0 +1,15 @@
+from sqlalchemy import BigInteger, Column, String
+
+from api.db.base import Base
+
+
+class JobWatermark(Base):
+    """
+    Progress of periodic job processing rows in order of their ID, shared by all processes running the job.
+    """
+    __tablename__ = "job_watermarks"
+
+    name = Column(String, primary_key=True)
+
+    # Rows with ID up to the value are processed.
+    value = Column(BigInteger)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
 from api.db.base import Base
@@ -19,6 +19,14 @@ class MappedService(Base):
     current_status = Column(Integer, ForeignKey('service_status.id'), nullable=True)
     current_status_from = Column(DateTime, nullable=True)
 
+    # Status evaluated from recent readings that is waiting for enough consecutive samples to become current.
+    pending_status = Column(Integer, ForeignKey('service_status.id'), nullable=True)
+    pending_count = Column(Integer, default=0)
+
+    # Time of last batch of readings received for the service, and whether no readings came for too long since then.
+    last_seen = Column(DateTime, nullable=True)
+    stale = Column(Boolean, default=False)
+
     options = relationship("MappedServiceOption", passive_deletes=True, passive_updates=True)
     status = relationship("Status", uselist=False)
     error_cause = relationship("ErrorCause", uselist=False, innerjoin=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Integer, String
 from sqlalchemy.orm import relationship
 
 from api.db.base import Base
@@ -10,6 +10,7 @@ class Probe(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
+    last_seen = Column(DateTime, nullable=True)
 
     services = relationship(Service)
     mappings = relationship("MappedService", secondary=Service.__table__)
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, ForeignKey, Integer
+
+from api.db.base import Base
+
+
+class ProbeStatusCounter(Base):
+    """
+    Number of mapped services of a probe in given service status. Maintained incrementally when current status of
+    a mapped service changes, so the counts do not need to be aggregated from mapped_services.
+    """
+    __tablename__ = "probe_status_counters"
+
+    probe_id = Column(Integer, ForeignKey("probes.id"), primary_key=True)
+    service_status_id = Column(Integer, ForeignKey("service_status.id"), primary_key=True)
+    count = Column(Integer)
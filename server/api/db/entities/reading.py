@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, String
 from sqlalchemy.orm import relationship
 
 from api.db import MappedService
@@ -15,4 +15,9 @@ class Reading(Base):
     mapped_service_id = Column(Integer, ForeignKey(MappedService.id))
     name = Column(String)
 
-    values = relationship("ReadingValue")
+    # Last received value, maintained on ingest so the current state does not need to be searched in reading_values.
+    last_timestamp = Column(DateTime, nullable=True)
+    last_value = Column(BigInteger, nullable=True)
+
+    # Dynamic, so appending a value does not load all values of the reading.
+    values = relationship("ReadingValue", lazy="dynamic")
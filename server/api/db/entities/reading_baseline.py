@@ -0,0 +1,19 @@
+from sqlalchemy import BigInteger, Column, Float, ForeignKey, Integer
+
+from api.db.base import Base
+from api.db.entities.reading import Reading
+
+
+class ReadingBaseline(Base):
+    """
+    Checkpoint of exponentially weighted mean and variance of reading values, used by adaptive thresholds. Seasonal
+    baseline has one row per slot of the season (for example per hour of day), non-seasonal has season 0 and slot 0.
+    """
+    __tablename__ = "reading_baselines"
+
+    reading = Column(Integer, ForeignKey(Reading.id), primary_key=True)
+    season = Column(Integer, primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    mean = Column(Float)
+    variance = Column(Float)
+    count = Column(BigInteger)
@@ -0,0 +1,19 @@
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Integer, LargeBinary
+
+from api.db.base import Base
+from api.db.entities.reading import Reading
+
+
+class ReadingSketch(Base):
+    """
+    Quantile sketch of values of one reading in one hour, serialized by lib.sketch.DDSketch.
+    """
+    __tablename__ = "reading_sketches"
+
+    reading = Column(Integer, ForeignKey(Reading.id), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    count = Column(BigInteger)
+    sketch = Column(LargeBinary)
+
+    # ID of last reading value included in the sketches of the rollup run that last updated this sketch.
+    last_value_id = Column(BigInteger)
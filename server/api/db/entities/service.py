@@ -15,3 +15,4 @@ class Service(Base):
 
     options = relationship("ServiceOption")
     thresholds = relationship("ServiceThreshold")
+    reading_types = relationship("ServiceReading")
@@ -0,0 +1,22 @@
+from sqlalchemy import BigInteger, Column, Enum, ForeignKey, Integer, String
+
+from api.db.base import Base
+from api.db.entities.service import Service
+
+
+class ServiceReading(Base):
+    """
+    Type of readings of a service, declared by the service in its configuration. Reading can be name or pattern
+    (fnmatch-like), like in thresholds.
+    """
+    __tablename__ = "service_readings"
+
+    id = Column(Integer, primary_key=True)
+    probe_service_id = Column(Integer, ForeignKey(Service.id))
+    reading = Column(String)
+    type = Column(Enum("gauge", "counter", "derive"))
+
+    # Value after which counter wraps to 0, and multiplier of the derived per-second rate before it is stored as
+    # integer.
+    counter_max = Column(BigInteger, nullable=True)
+    scale = Column(Integer, default=1)
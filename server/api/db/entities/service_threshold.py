@@ -1,5 +1,5 @@
 from sqlalchemy import BigInteger
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, Float, ForeignKey, Integer, String
 from sqlalchemy import Enum
 from sqlalchemy.orm import relationship
 
@@ -17,6 +17,15 @@ class ServiceThreshold(Base):
     reading = Column(String)
     min = Column(BigInteger, nullable=True)
     max = Column(BigInteger, nullable=True)
+
+    # Limits the value must get within to leave the status, when they differ from min and max (hysteresis).
+    recovery_min = Column(BigInteger, nullable=True)
+    recovery_max = Column(BigInteger, nullable=True)
+
+    # Adaptive threshold: the status is raised when value deviates from baseline of the reading by more than sigma
+    # standard deviations. Baseline is seasonal when season (in seconds) is set. Min and max are not used then.
+    sigma = Column(Float, nullable=True)
+    season = Column(Integer, nullable=True)
     source = Column(Enum("service", "configuration"))
 
     service_status = relationship("ServiceStatus", uselist=False)
@@ -0,0 +1,102 @@
+"""
+In-memory mirror of last values of readings.
+"""
+
+from time import monotonic
+from typing import Dict, List
+
+from api.db.entities.mapped_service import MappedService
+from api.db.entities.probe import Probe
+from api.db.entities.reading import Reading
+from api.db.entities.service import Service
+from config import config
+
+
+class LatestValues:
+    """
+    Mirror of readings.last_timestamp and readings.last_value per probe. Values written by this process are updated in
+    place, values written by other processes are picked up when the probe's entry gets older than
+    [readings] LatestMaxAge seconds.
+    """
+    def __init__(self):
+        # probe_name -> (loaded_at, {reading_id: value_dict})
+        self._probes = {}
+
+    @property
+    def max_age(self) -> float:
+        """
+        Maximum age of probe entry, after which it is reloaded from the database.
+        """
+        return config.cfg.getfloat("readings", "LatestMaxAge", fallback=10.0)
+
+    def load(self, probe_name: str) -> Dict[int, dict]:
+        """
+        Load last values of all readings of a probe from database.
+        :param probe_name: Name of probe.
+        :return: reading_id -> value dict mapping.
+        """
+        session = config.session()
+        try:
+            values = {
+                reading.id: {
+                    "service": reading.mapped_service_id,
+                    "reading": reading.name,
+                    "timestamp": reading.last_timestamp,
+                    "value": reading.last_value
+                }
+                for reading in session.query(Reading)
+                .join(MappedService, MappedService.id == Reading.mapped_service_id)
+                .join(Service, Service.id == MappedService.probe_service_id)
+                .join(Probe, Probe.id == Service.probe_id)
+                .filter(Probe.name == probe_name)
+                .filter(Reading.last_timestamp.isnot(None))
+                .all()
+            }
+        finally:
+            session.close()
+
+        self._probes[probe_name] = monotonic(), values
+        return values
+
+    def get(self, probe_name: str) -> List[dict]:
+        """
+        Return last values of all readings of a probe.
+        :param probe_name: Name of probe.
+        :return: List of dicts with keys service, reading, timestamp and value, ordered by service and reading name.
+        """
+        entry = self._probes.get(probe_name)
+
+        if entry is None or monotonic() - entry[0] > self.max_age:
+            values = self.load(probe_name)
+        else:
+            values = entry[1]
+
+        return sorted(values.values(), key=lambda value: (value["service"], value["reading"]))
+
+    def update(self, probe_name: str, values: Dict[int, dict]) -> None:
+        """
+        Update mirror with values that were just committed to the database.
+        :param probe_name: Name of probe the readings belong to.
+        :param values: reading_id -> value dict mapping, the dicts have the same form as returned by get().
+        """
+        entry = self._probes.get(probe_name)
+        if entry is None:
+            return
+
+        updated = entry[1].copy()
+        updated.update(values)
+
+        self._probes[probe_name] = entry[0], updated
+
+    def invalidate(self, probe_name: str=None) -> None:
+        """
+        Drop mirror of one probe, or of all probes.
+        :param probe_name: Name of probe to drop, None to drop all.
+        """
+        if probe_name is None:
+            self._probes = {}
+        else:
+            self._probes.pop(probe_name, None)
+
+
+latest_values = LatestValues()
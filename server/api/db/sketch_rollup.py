@@ -0,0 +1,156 @@
+"""
+Rollup of reading values to hourly quantile sketches.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Tuple
+
+import numpy as np
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from api.db.entities.job_watermark import JobWatermark
+from api.db.entities.reading_sketch import ReadingSketch
+from api.db.entities.reading_value import ReadingValue
+from config import config
+from lib.sketch import DDSketch
+
+
+class SketchRollup:
+    """
+    Periodic job adding new reading values to sketches of their reading and hour.
+
+    Values are processed in order of their ID, so each run reads only values inserted since the previous run, by range
+    of the primary key. A run processes values up to the highest ID seen by the previous run, as values with lower IDs
+    could still be uncommitted when the ID was seen. Values arriving late for older hours are merged to the existing
+    sketch of that hour.
+
+    The watermark (ID of the last processed value) is stored in job_watermarks, so the job can run in more processes.
+    Each run claims its range of IDs by moving the watermark with compare-and-set in the same transaction as the
+    sketches are updated: the UPDATE locks the row until commit, and a concurrent run that read the same watermark
+    updates no row and gives up, so no value is added twice.
+    """
+
+    NAME = "sketch_rollup"
+
+    def __init__(self, relative_accuracy: float, max_rows: int):
+        """
+        :param relative_accuracy: Relative accuracy of the sketches.
+        :param max_rows: Maximum number of values processed by one run.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.max_rows = max_rows
+
+        # Values up to pending are processed by next run of this process.
+        self.pending = None
+
+    def load_watermark(self, session) -> int:
+        """
+        Load the watermark, create it when it does not exist yet.
+        """
+        watermark = session.query(JobWatermark.value).filter(JobWatermark.name == self.NAME).scalar()
+        if watermark is not None:
+            return watermark
+
+        try:
+            with session.begin_nested():
+                session.execute(JobWatermark.__table__.insert().values(
+                    name=self.NAME,
+                    value=session.query(func.coalesce(func.max(ReadingSketch.last_value_id), 0)).scalar()
+                ))
+        except IntegrityError:
+            pass
+        session.commit()
+
+        return session.query(JobWatermark.value).filter(JobWatermark.name == self.NAME).scalar()
+
+    def run(self) -> None:
+        """
+        Periodic job: process next chunk of values.
+        """
+        session = config.session()
+        try:
+            watermark = self.load_watermark(session)
+
+            current = session.query(func.max(ReadingValue.id)).scalar() or 0
+            if self.pending is None:
+                self.pending = current
+                return
+
+            upper = min(self.pending, watermark + self.max_rows)
+            if upper > watermark:
+                claimed = session.query(JobWatermark)\
+                    .filter(JobWatermark.name == self.NAME)\
+                    .filter(JobWatermark.value == watermark)\
+                    .update({JobWatermark.value: upper}, synchronize_session=False)
+
+                if not claimed:
+                    session.rollback()
+                    logging.debug("Reading values after %d were rolled up by another process." % (watermark, ))
+                    return
+
+                self.rollup(session, watermark, upper)
+                session.commit()
+                logging.debug("Rolled up reading values %d - %d to sketches." % (watermark + 1, upper))
+                watermark = upper
+
+            if watermark >= self.pending:
+                self.pending = current
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def rollup(self, session, watermark: int, upper: int) -> None:
+        """
+        Add values with ID in (watermark, upper> to the sketches.
+        """
+        rows = session.query(ReadingValue.reading, ReadingValue.datetime, ReadingValue.value)\
+            .filter(ReadingValue.id > watermark)\
+            .filter(ReadingValue.id <= upper)\
+            .all()
+
+        if not rows:
+            return
+
+        readings = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        hours = np.array([row[1] for row in rows], dtype="datetime64[h]").astype(np.int64)
+        values = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+
+        # Group values by (reading, hour).
+        order = np.lexsort((hours, readings))
+        readings, hours, values = readings[order], hours[order], values[order]
+        boundaries = np.flatnonzero((np.diff(readings) != 0) | (np.diff(hours) != 0)) + 1
+
+        groups = {}  # type: Dict[Tuple[int, datetime], np.ndarray]
+        for start, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(values)]))):
+            hour = np.datetime64(int(hours[start]), "h").astype(datetime)
+            groups[(int(readings[start]), hour)] = values[start:end]
+
+        # Add to sketches stored by previous runs. They keep their accuracy, if it was configured differently.
+        keys = list(groups.keys())
+        for offset in range(0, len(keys), 1000):
+            chunk = keys[offset:offset + 1000]
+            for db_sketch in session.query(ReadingSketch)\
+                    .filter(or_(*[and_(ReadingSketch.reading == reading, ReadingSketch.hour == hour)
+                                  for reading, hour in chunk]))\
+                    .all():
+                sketch = DDSketch.from_bytes(db_sketch.sketch)
+                sketch.add(groups.pop((db_sketch.reading, db_sketch.hour)))
+                db_sketch.count = sketch.count
+                db_sketch.sketch = sketch.to_bytes()
+                db_sketch.last_value_id = upper
+
+        for (reading, hour), group in groups.items():
+            sketch = DDSketch(self.relative_accuracy)
+            sketch.add(group)
+            session.add(ReadingSketch(reading=reading, hour=hour, count=sketch.count, sketch=sketch.to_bytes(),
+                                      last_value_id=upper))
+
+
+sketch_rollup = SketchRollup(
+    config.cfg.getfloat("sketches", "RelativeAccuracy", fallback=0.01),
+    config.cfg.getint("sketches", "MaxRows", fallback=200000),
+)
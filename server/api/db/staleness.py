@@ -0,0 +1,148 @@
+"""
+Detection of mapped services that stopped receiving readings.
+"""
+
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import and_, bindparam, func
+
+from api.db.entities.mapped_service import MappedService
+from api.db.const import const
+from config import config
+
+
+class StalenessSweeper:
+    """
+    Flags mapped services as stale when no readings arrived for `multiplier` times their expected interval.
+
+    Ingest stores time of each batch to last_seen of the mapped service (and clears its stale flag). The sweeper keeps
+    an in-memory index of services ordered by the time they become stale (a heap with lazy deletion: entries whose
+    deadline no longer matches the service are skipped). Each sweep loads only services whose last_seen changed since
+    the previous sweep, which uses the last_seen index, so neither mapped_services nor reading_values are scanned,
+    except for the first sweep, which loads all services with last_seen.
+
+    Expected interval of a service is learned as moving average of differences of its last_seen values observed by
+    the sweeps, so it is accurate only when the sweep runs more often than the probes send readings. Until learned,
+    default interval is used. Once learned, gaps of outages (the service was stale, or the gap is longer than
+    `multiplier` intervals) are not averaged in, the deadline is only set again from the new last_seen.
+    """
+
+    # Weight of new observation in moving average of interval.
+    ALPHA = 0.2
+
+    def __init__(self, multiplier: float, default_interval: float, overlap: float):
+        """
+        :param multiplier: Number of expected intervals without readings after which the service is stale.
+        :param default_interval: Expected interval in seconds of services whose interval is not learned yet.
+        :param overlap: Seconds by which consecutive sweeps overlap, so last_seen of transactions committed during
+            the sweep are not missed.
+        """
+        self.multiplier = multiplier
+        self.default_interval = default_interval
+        self.overlap = timedelta(seconds=overlap)
+
+        self.heap = []  # type: List[Tuple[datetime, int]]
+        self.deadlines = {}  # type: Dict[int, datetime]
+        self.last_seen = {}  # type: Dict[int, datetime]
+        self.intervals = {}  # type: Dict[int, float]
+
+        # Services that were stale when last observed, or were flagged as stale by the sweeper since then.
+        self.stale = set()  # type: Set[int]
+
+        # Services changed at or after this time are loaded by next sweep. None loads all services.
+        self.watermark = None
+
+    def observe(self, service_id: int, last_seen: datetime, stale: bool) -> None:
+        """
+        Update index with last_seen of one mapped service.
+        """
+        previous = self.last_seen.get(service_id)
+        if previous is not None and last_seen <= previous:
+            return
+
+        if previous is not None:
+            gap = (last_seen - previous).total_seconds()
+            interval = self.intervals.get(service_id)
+            if interval is None:
+                self.intervals[service_id] = gap
+            elif service_id not in self.stale and gap <= self.multiplier * interval:
+                self.intervals[service_id] = self.ALPHA * gap + (1 - self.ALPHA) * interval
+
+        self.last_seen[service_id] = last_seen
+
+        if stale:
+            self.stale.add(service_id)
+            self.deadlines.pop(service_id, None)
+            return
+
+        self.stale.discard(service_id)
+
+        deadline = last_seen + timedelta(
+            seconds=self.multiplier * self.intervals.get(service_id, self.default_interval))
+        self.deadlines[service_id] = deadline
+        heapq.heappush(self.heap, (deadline, service_id))
+
+    def expired(self, now: datetime) -> List[int]:
+        """
+        Remove services whose deadline passed from the index.
+        :return: IDs of the services.
+        """
+        result = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, service_id = heapq.heappop(self.heap)
+            if self.deadlines.get(service_id) == deadline:
+                del self.deadlines[service_id]
+                result.append(service_id)
+        return result
+
+    def sweep(self) -> None:
+        """
+        Periodic job: load recently seen services and flag the ones whose deadline passed.
+        """
+        session = config.session()
+        try:
+            now = session.query(func.now()).scalar()
+
+            query = session.query(MappedService.id, MappedService.last_seen, MappedService.stale)\
+                .filter(MappedService.last_seen.isnot(None))\
+                .filter(MappedService.status_id == const.status["active"])
+
+            if self.watermark is not None:
+                query = query.filter(MappedService.last_seen >= self.watermark)
+
+            for service_id, last_seen, stale in query.all():
+                self.observe(service_id, last_seen, stale)
+
+            self.watermark = now - self.overlap
+
+            expired = self.expired(now)
+            if expired:
+                # Readings could arrive after the services were loaded, flag only services not seen since then.
+                table = MappedService.__table__
+                session.execute(
+                    table.update()
+                    .where(and_(table.c.id == bindparam("service_id"), table.c.last_seen <= bindparam("seen"),
+                                table.c.status_id == const.status["active"]))
+                    .values(stale=True),
+                    [{"service_id": service_id, "seen": self.last_seen[service_id]} for service_id in expired]
+                )
+                self.stale.update(expired)
+                logging.warning("Services %s did not receive readings for too long, flagged as stale."
+                                % (", ".join(str(service_id) for service_id in expired), ))
+
+            session.commit()
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+staleness_sweeper = StalenessSweeper(
+    config.cfg.getfloat("staleness", "Multiplier", fallback=3.0),
+    config.cfg.getfloat("staleness", "DefaultInterval", fallback=60.0),
+    config.cfg.getfloat("staleness", "Overlap", fallback=60.0),
+)
@@ -0,0 +1,128 @@
+"""
+Incrementally maintained counters of mapped services per probe and service status.
+"""
+
+import logging
+from typing import Dict
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.db.entities.mapped_service import MappedService
+from api.db.entities.probe_status_counter import ProbeStatusCounter
+from api.db.entities.service import Service
+from api.db.const import const
+from config import config
+
+
+class StatusCounterChanges:
+    """
+    Collects status transitions of mapped services during one transaction, and applies them to the counters as one
+    UPDATE per (probe, status) pair.
+    """
+    def __init__(self):
+        self.deltas = {}
+
+    def transition(self, probe_id: int, old_status: int=None, new_status: int=None) -> None:
+        """
+        Record change of current status of one mapped service. None status means the service is not counted (has no
+        thresholds, or is being created or removed).
+        :param probe_id: ID of probe the mapped service belongs to.
+        :param old_status: Previous service status ID.
+        :param new_status: New service status ID.
+        """
+        if old_status == new_status:
+            return
+
+        if old_status is not None:
+            self.deltas[probe_id, old_status] = self.deltas.get((probe_id, old_status), 0) - 1
+
+        if new_status is not None:
+            self.deltas[probe_id, new_status] = self.deltas.get((probe_id, new_status), 0) + 1
+
+    def apply(self, session: Session) -> bool:
+        """
+        Write recorded changes to the counters. Must be called in the same transaction as the status change itself.
+        :param session: Session to use.
+        :return: True if any counter was changed.
+        """
+        table = ProbeStatusCounter.__table__
+        changed = False
+
+        for (probe_id, status_id), delta in sorted(self.deltas.items()):
+            if delta == 0:
+                continue
+
+            changed = True
+            update = table.update()\
+                .where(table.c.probe_id == probe_id)\
+                .where(table.c.service_status_id == status_id)\
+                .values(count=table.c.count + delta)
+
+            if session.execute(update).rowcount == 0:
+                # Other transaction could create the same counter in the meantime, then it is incremented instead.
+                try:
+                    with session.begin_nested():
+                        session.execute(table.insert().values(probe_id=probe_id, service_status_id=status_id,
+                                                              count=delta))
+                except IntegrityError:
+                    session.execute(update)
+
+        self.deltas = {}
+        return changed
+
+
+def status_totals(session: Session) -> Dict[int, int]:
+    """
+    Return global number of mapped services in each service status.
+    :param session: Session to use.
+    :return: service_status_id -> count mapping.
+    """
+    return {
+        status_id: int(count)
+        for status_id, count in session.query(ProbeStatusCounter.service_status_id, func.sum(ProbeStatusCounter.count))
+        .group_by(ProbeStatusCounter.service_status_id)
+        .all()
+    }
+
+
+def reconcile_status_counters() -> None:
+    """
+    Recompute all counters from current status of mapped services, to fix drift caused for example by services
+    removed by cascade delete.
+    """
+    session = config.session()
+    try:
+        # Lock counters first, so increments done by ingest in the meantime wait for the reconciliation.
+        counters = session.query(ProbeStatusCounter).with_for_update().all()
+
+        actual = {
+            (probe_id, status_id): count
+            for probe_id, status_id, count in session.query(Service.probe_id, MappedService.current_status,
+                                                            func.count(MappedService.id))
+            .join(MappedService, MappedService.probe_service_id == Service.id)
+            .filter(MappedService.current_status.isnot(None))
+            .group_by(Service.probe_id, MappedService.current_status)
+            .all()
+        }
+
+        for counter in counters:
+            count = actual.pop((counter.probe_id, counter.service_status_id), 0)
+            if counter.count != count:
+                logging.warning("Status counter of probe %d, status %s is %d, but should be %d. Fixing." %
+                                (counter.probe_id, const.service_status.get(counter.service_status_id),
+                                 counter.count, count))
+                counter.count = count
+
+        for (probe_id, status_id), count in actual.items():
+            logging.warning("Status counter of probe %d, status %s is missing. Fixing." %
+                            (probe_id, const.service_status.get(status_id)))
+            session.add(ProbeStatusCounter(probe_id=probe_id, service_status_id=status_id, count=count))
+
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.close()
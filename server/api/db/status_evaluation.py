@@ -0,0 +1,155 @@
+"""
+Evaluation of service status from readings, with hysteresis against flapping.
+"""
+
+from fnmatch import fnmatch
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from api.db.baselines import Baseline
+from api.db.entities.mapped_service import MappedService
+from api.db.entities.service_threshold import ServiceThreshold
+from api.db.const import const
+
+
+class StatusEvaluation:
+    """
+    Status of mapped services evaluated from one batch of readings. Each value is compared with thresholds of its
+    reading, and the service gets the worst status of all its values in the batch, so readings of one batch cannot flip
+    the status back and forth.
+
+    Two kinds of hysteresis are applied. Thresholds of statuses the service is already in (its current status and
+    better ones) use their recovery limits instead of min/max, when the limits are set. And the new status is applied
+    only after consecutive_samples values in a row evaluated to it, counted in pending_status and pending_count of the
+    mapped service. Values of one batch that evaluated to the status of the batch are all counted, so a service sending
+    several values per batch changes the status after fewer batches.
+
+    Adaptive thresholds (with sigma set) compare the value with baseline of the reading instead of min and max. The
+    caller provides the baseline, see api.db.baselines.
+    """
+    def __init__(self, thresholds: Dict[int, Dict[str, List[ServiceThreshold]]], consecutive_samples: int=1):
+        """
+        :param thresholds: Thresholds of each mapped service by reading name (pattern).
+        :param consecutive_samples: Number of values in a row that must evaluate to new status to change it.
+        """
+        self.thresholds = thresholds
+        self.consecutive_samples = consecutive_samples
+
+        # Evaluated status of each mapped service. None for services without thresholds.
+        self.statuses = {}
+
+        # Number of values of each mapped service that evaluated to its status.
+        self.samples = {}
+
+    def add(self, service: MappedService, reading: str, value: int,
+            baseline: Callable[[int], Baseline]=None) -> None:
+        """
+        Add one value to the evaluation.
+        :param service: Mapped service the value belongs to.
+        :param reading: Name of reading.
+        :param value: Value.
+        :param baseline: Function returning baseline of the reading for given season, or None when the baseline is
+            not known yet.
+        """
+        if service.id not in self.thresholds:
+            self.statuses[service.id] = None
+            return
+
+        status = self.evaluate(self.thresholds[service.id], service.current_status, reading, value, baseline)
+        if self.statuses.get(service.id) is None or status > self.statuses[service.id]:
+            self.statuses[service.id] = status
+            self.samples[service.id] = 1
+        elif status == self.statuses[service.id]:
+            self.samples[service.id] += 1
+
+    def seasons(self, service_id: int, reading: str) -> Set[int]:
+        """
+        Seasons of baselines needed by adaptive thresholds of the reading (0 for baseline without season).
+        :param service_id: ID of mapped service.
+        :param reading: Name of reading.
+        """
+        return set(
+            threshold.season or 0
+            for pattern, status_thresholds in self.thresholds.get(service_id, {}).items() if fnmatch(reading, pattern)
+            for threshold in status_thresholds if threshold.sigma is not None
+        )
+
+    @staticmethod
+    def evaluate(thresholds: Dict[str, List[ServiceThreshold]], current_status: int, reading: str, value: int,
+                 baseline: Callable[[int], Baseline]=None) -> int:
+        """
+        Status of one value. Service statuses are ordered by severity, worse status has higher ID.
+        :param thresholds: Thresholds of the service by reading name (pattern).
+        :param current_status: Current status of the service.
+        :param reading: Name of reading.
+        :param value: Value.
+        :param baseline: Function returning baseline of the reading for given season, see add().
+        :return: Service status ID.
+        """
+        combined_thresholds = {}
+
+        # Determine possible keys and sort them by priority.
+        for pattern, status_thresholds in thresholds.items():
+            if fnmatch(reading, pattern):
+                # Determine match priority. Be dummy here and think, that longer pattern is more accurate.
+                priority = len(pattern)
+                for threshold in status_thresholds:
+                    if threshold.service_status_id not in combined_thresholds or \
+                            combined_thresholds[threshold.service_status_id][0] < priority:
+                        combined_thresholds[threshold.service_status_id] = priority, threshold
+
+        # OK is default status.
+        status = const.service_status["ok"]
+        for key in sorted(combined_thresholds.keys()):
+            threshold = combined_thresholds[key][1]
+            minimum, maximum = threshold.min, threshold.max
+
+            if threshold.sigma is not None:
+                # Adaptive threshold is not evaluated until the baseline has enough values.
+                reading_baseline = baseline(threshold.season or 0) if baseline is not None else None
+                if reading_baseline is None:
+                    continue
+                minimum, maximum = reading_baseline.bounds(threshold.sigma)
+
+            # Leaving status the service is in requires the value to get within recovery limits.
+            elif current_status is not None and threshold.service_status_id <= current_status:
+                if threshold.recovery_min is not None:
+                    minimum = threshold.recovery_min
+                if threshold.recovery_max is not None:
+                    maximum = threshold.recovery_max
+
+            if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                status = threshold.service_status_id
+
+        return status
+
+    def changes(self, services: Dict[int, MappedService]) -> Iterator[Tuple[MappedService, int]]:
+        """
+        Decide which services change status, and update pending status of the others.
+        :param services: Mapped services by ID.
+        :return: Iterator of (mapped service, new status) pairs. The caller is responsible for applying the change.
+        """
+        for service_id, status in self.statuses.items():
+            service = services[service_id]
+
+            if status == service.current_status:
+                if service.pending_status is not None:
+                    service.pending_status = None
+                    service.pending_count = 0
+                continue
+
+            # Wait for consecutive samples, except for services getting or losing thresholds, which change immediately.
+            if status is not None and service.current_status is not None and self.consecutive_samples > 1:
+                if service.pending_status == status:
+                    service.pending_count += self.samples[service_id]
+                else:
+                    service.pending_status = status
+                    service.pending_count = self.samples[service_id]
+
+                if service.pending_count < self.consecutive_samples:
+                    continue
+
+            if service.pending_status is not None:
+                service.pending_status = None
+                service.pending_count = 0
+
+            yield service, status
@@ -0,0 +1,143 @@
+"""
+API for bulk export of reading history.
+"""
+
+from datetime import datetime
+from fnmatch import fnmatch
+from itertools import islice
+
+from flask import request, Response, stream_with_context
+from werkzeug.exceptions import BadRequest
+
+from api.db import Probe, MappedService, Service, Reading, ReadingValue
+from config import config
+from lib.export import EXPORT_FORMATS, MIMETYPES, ExportWriter, decode_cursor
+from lib.util import SafeResource, parse_datetime
+
+
+class Export(SafeResource):
+    """
+    Streams reading values in bulk.
+    """
+
+    # Number of values read from database by one query. Values are read page by page by range of (reading, id), so
+    # memory of the server does not grow with size of the export, whatever the database driver does with results.
+    PAGE_SIZE = 10000
+
+    # Number of values converted to the export format at once.
+    CHUNK_SIZE = 1000
+
+    def get(self):
+        """
+        Export reading values. Accepts following query params:
+            probe - Probe name, can be specified multiple times. Default is all probes.
+            service - Mapped service ID, can be specified multiple times. Default is all services of the probes.
+            reading - Reading name pattern (fnmatch-like), can be specified multiple times. Default is all readings.
+            from - Start of time range. Default is the oldest value.
+            to - End of time range (exclusive). Default is now.
+            format - One of csv, ndjson, columnar (see lib/export.py). Default is csv.
+            cursor - Resume export after value identified by the cursor ("<reading_id>-<id>" of the last received
+                value).
+            limit - Maximum number of exported values. Export of the rest can be resumed by cursor of the last one.
+        Values are streamed ordered by reading ID and value ID.
+        """
+        try:
+            time_to = parse_datetime(request.args["to"]) if "to" in request.args else datetime.now()
+            time_from = parse_datetime(request.args["from"]) if "from" in request.args else None
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        try:
+            service_ids = [int(service_id) for service_id in request.args.getlist("service")]
+            limit = int(request.args["limit"]) if "limit" in request.args else None
+        except ValueError:
+            raise BadRequest("Parameters 'service' and 'limit' must be integers.")
+
+        if limit is not None and limit <= 0:
+            raise BadRequest("Parameter 'limit' must be positive.")
+
+        try:
+            cursor = decode_cursor(request.args["cursor"]) if "cursor" in request.args else (0, 0)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        export_format = request.args.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            raise BadRequest("Bad format value: '%s'. Must be one of %s." % (export_format, ",".join(EXPORT_FORMATS)))
+
+        probe_names = request.args.getlist("probe")
+        patterns = request.args.getlist("reading") or ["*"]
+
+        # Own session, as the response is streamed and the session is closed when the stream ends.
+        session = config.read_session()
+        try:
+            query = session.query(Reading.id, Reading.name, Reading.mapped_service_id, Probe.name)\
+                .join(MappedService, MappedService.id == Reading.mapped_service_id)\
+                .join(Service, Service.id == MappedService.probe_service_id)\
+                .join(Probe, Probe.id == Service.probe_id)\
+                .filter(Reading.id >= cursor[0])\
+                .order_by(Reading.id)
+
+            if probe_names:
+                query = query.filter(Probe.name.in_(probe_names))
+
+            if service_ids:
+                query = query.filter(Reading.mapped_service_id.in_(service_ids))
+
+            readings = {
+                reading_id: (probe_name, service_id, name)
+                for reading_id, name, service_id, probe_name in query.all()
+                if any(fnmatch(name, pattern) for pattern in patterns)
+            }
+        except:
+            session.close()
+            raise
+
+        def values():
+            """
+            Generate (reading_id, id, datetime, value) of exported values, one page of one reading at a time.
+            """
+            for reading_id in readings:
+                last_id = cursor[1] if reading_id == cursor[0] else 0
+
+                while True:
+                    query = session.query(ReadingValue.reading, ReadingValue.id, ReadingValue.datetime,
+                                          ReadingValue.value)\
+                        .filter(ReadingValue.reading == reading_id)\
+                        .filter(ReadingValue.id > last_id)\
+                        .filter(ReadingValue.datetime < time_to)
+
+                    if time_from is not None:
+                        query = query.filter(ReadingValue.datetime >= time_from)
+
+                    page = query.order_by(ReadingValue.id).limit(self.PAGE_SIZE).all()
+                    yield from page
+
+                    if len(page) < self.PAGE_SIZE:
+                        break
+
+                    last_id = page[-1][1]
+
+        writer = ExportWriter(export_format, readings)
+
+        def generate():
+            """
+            Generate the response as a stream of chunks of values in the requested format.
+            """
+            try:
+                yield writer.header()
+
+                rows = values()
+                if limit is not None:
+                    rows = islice(rows, limit)
+
+                while True:
+                    chunk = list(islice(rows, self.CHUNK_SIZE))
+                    if not chunk:
+                        break
+
+                    yield writer.chunk(chunk)
+            finally:
+                session.close()
+
+        return Response(stream_with_context(generate()), mimetype=MIMETYPES[export_format])
@@ -1,7 +1,9 @@
 from flask import request
 from config import config
+from lib.cache import TTLCache
+from lib.derive import READING_TYPES
 from lib.util import SafeResource, validate_input, validate_response
-from lib.schema import ExplicitObject, ExplicitArray, String, Boolean, Integer, Object, Null, OneOf
+from lib.schema import ExplicitObject, ExplicitArray, String, Boolean, Integer, Number, Object, Null, OneOf
 
 import sqlalchemy
 import logging
@@ -10,6 +12,11 @@ import api.db as entity
 from api.db import select, const, OptionDataType
 
 
+# Cache of probe listings, shown for example in the website sidebar. Invalidated when probe configuration or service
+# status changes.
+probes_cache = TTLCache("probes", config.cfg.getfloat("cache", "ProbesTTL", fallback=10.0))
+
+
 class Probe(SafeResource):
     """
     One specific probe.
@@ -37,26 +44,50 @@ class Probe(SafeResource):
         """
         Return probe configuration.
         """
-        session = config.session()
-        try:
-            probe = session.query(entity.Probe).filter_by(name=name).one()
-            return {
-                "name": probe.name,
-                "services": [{
-                    "name": service.name,
-                    "description": service.description,
-                    "deleted": service.deleted,
-                    "options": [{
-                        "identifier": option.identifier,
-                        "name": option.name,
-                        "type": option.data_type,
-                        "description": option.description,
-                        "required": option.required
-                    } for option in service.options]
-                } for service in probe.services]
-            }
-        finally:
-            session.commit()
+        session = config.read_db
+        probe = session.query(entity.Probe).filter_by(name=name).one()
+        return {
+            "name": probe.name,
+            "services": [{
+                "name": service.name,
+                "description": service.description,
+                "deleted": service.deleted,
+                "options": [{
+                    "identifier": option.identifier,
+                    "name": option.name,
+                    "type": option.data_type,
+                    "description": option.description,
+                    "required": option.required
+                } for option in service.options]
+            } for service in probe.services]
+        }
+
+
+def status_count(label: str, *statuses: str):
+    """
+    Correlated subquery returning number of probe's mapped services, that are in one of given service statuses.
+    :param label: Label of the resulting column.
+    :param statuses: Names of service statuses to count.
+    """
+    return sqlalchemy.select([sqlalchemy.func.coalesce(sqlalchemy.func.sum(entity.ProbeStatusCounter.count), 0)])\
+        .select_from(sqlalchemy.join(entity.ProbeStatusCounter, entity.ServiceStatus))\
+        .where(entity.ProbeStatusCounter.probe_id == entity.Probe.id)\
+        .where(entity.ServiceStatus.name.in_(statuses))\
+        .as_scalar().label(label)
+
+
+def stale_count(label: str):
+    """
+    Correlated subquery returning number of probe's mapped services flagged as stale.
+    :param label: Label of the resulting column.
+    """
+    return sqlalchemy.select([sqlalchemy.func.count(entity.MappedService.id)])\
+        .select_from(sqlalchemy.join(entity.MappedService, entity.Service,
+                                     entity.MappedService.probe_service_id == entity.Service.id))\
+        .where(entity.Service.probe_id == entity.Probe.id)\
+        .where(entity.MappedService.stale.is_(True))\
+        .correlate(entity.Probe)\
+        .as_scalar().label(label)
 
 
 class Probes(SafeResource):
@@ -66,8 +97,10 @@ class Probes(SafeResource):
 
     SELECT_COLUMN_MAPPING = {
         "name": entity.Probe.name,
-        "warnings": sqlalchemy.sql.expression.bindparam("warnings", 0),
-        "errors": sqlalchemy.sql.expression.bindparam("errors", 0),
+        "warnings": status_count("warnings", "warning"),
+        "errors": status_count("errors", "error", "critical"),
+        "stale": stale_count("stale"),
+        "last_seen": entity.Probe.last_seen,
         "num_services": sqlalchemy.func.count(sqlalchemy.distinct(entity.Service.id)).label("num_services"),
         "num_mapped": sqlalchemy.func.count(sqlalchemy.distinct(entity.MappedService.id)).label("num_mapped")
     }
@@ -86,6 +119,8 @@ class Probes(SafeResource):
         "name": String(),
         "warnings": Integer(),
         "errors": Integer(),
+        "stale": Integer(),
+        "last_seen": OneOf(String(format="date-time"), Null()),
         "num_services": Integer(),
         "num_mapped": Integer()
     })))
@@ -93,16 +128,16 @@ class Probes(SafeResource):
         """
         List of probes.
         """
-        session = config.session()
-        try:
-            query = select(session, request.args.getlist("show"), self.SELECT_COLUMN_MAPPING, self.SELECT_JOIN_MAPPING,
-                           self.TABLE_JOINS).order_by(entity.Probe.name)
+        session = config.read_db
+        query = select(session, request.args.getlist("show"), self.SELECT_COLUMN_MAPPING, self.SELECT_JOIN_MAPPING,
+                       self.TABLE_JOINS).group_by(entity.Probe.id).order_by(entity.Probe.name)
 
-            result = [probe._asdict() for probe in query.all()]
-            logging.info(result)
-            return result
-        finally:
-            session.commit()
+        result = [probe._asdict() for probe in query.all()]
+        for probe in result:
+            if probe.get("last_seen") is not None:
+                probe["last_seen"] = probe["last_seen"].isoformat()
+        logging.info(result)
+        return result
 
     @validate_input(ExplicitObject({
         "name": String(),
@@ -117,15 +152,37 @@ class Probes(SafeResource):
                         if isinstance(status, str)
                     ]),
                     "min": OneOf(Null(), Integer()),
-                    "max": OneOf(Null(), Integer())
+                    "max": OneOf(Null(), Integer()),
+                    "recovery_min": OneOf(Null(), Integer()),
+                    "recovery_max": OneOf(Null(), Integer()),
+                    "sigma": OneOf(Null(), Number()),
+                    "season": OneOf(Null(), Integer(minimum=1))
                 },
                 required=["status", "min", "max"],
                 title="Thresholds for various service states.",
                 description="The specified min-max interval is the range, where this state is NOT valid. If you for "
                             "example specify status=warning, min=0, max=10, then anything that is <0 and >10 will "
-                            "issue a warning.\n"
+                            "issue a warning. Optional recovery_min and recovery_max is the range the value must get "
+                            "within to leave the state again (hysteresis), default is min and max.\n"
+                            "When sigma is set, the threshold is adaptive: the state is issued when the value deviates "
+                            "from exponentially weighted mean of the reading by more than sigma standard deviations, "
+                            "min and max are not used. Optional season (in seconds, for example 86400) keeps separate "
+                            "mean for each part of the season.\n"
                             "The key in this object is name of reading or '*' for all readings."
             )),
+            "readings": Object(additional_properties=ExplicitObject(
+                {
+                    "type": String(enum=list(READING_TYPES)),
+                    "max": OneOf(Null(), Integer()),
+                    "scale": Integer()
+                },
+                required=["type"],
+                title="Types of readings.",
+                description="Counter and derive readings get also per-second rate, stored as reading named "
+                            "'<reading>.rate', multiplied by scale (default 1). Counter wraps to 0 after max (default "
+                            "2^32 - 1), derive can also decrease.\n"
+                            "The key in this object is name of reading or pattern, like in thresholds."
+            )),
             "options": ExplicitArray(ExplicitObject({
                 "name": String(min_length=1),
                 "identifier": String(pattern="^[a-zA-Z_][a-zA-Z0-9_.-]*$"),
@@ -144,7 +201,7 @@ class Probes(SafeResource):
         """
         data = request.json
 
-        session = config.session()
+        session = config.db
         try:
             probe = session.query(entity.Probe).filter_by(name=data["name"]).one()
 
@@ -245,6 +302,10 @@ class Probes(SafeResource):
                             if db_threshold.source == "service":
                                 db_threshold.min = limits.get("min", None)
                                 db_threshold.max = limits.get("max", None)
+                                db_threshold.recovery_min = limits.get("recovery_min", None)
+                                db_threshold.recovery_max = limits.get("recovery_max", None)
+                                db_threshold.sigma = limits.get("sigma", None)
+                                db_threshold.season = limits.get("season", None)
                             break
 
                     if not found:
@@ -253,19 +314,60 @@ class Probes(SafeResource):
                             reading=name,
                             min=limits.get("min", None),
                             max=limits.get("max", None),
+                            recovery_min=limits.get("recovery_min", None),
+                            recovery_max=limits.get("recovery_max", None),
+                            sigma=limits.get("sigma", None),
+                            season=limits.get("season", None),
                             source="service"
                         ))
 
+                # Update / create reading types, delete no longer declared ones.
+                reading_types = {db_type.reading: db_type for db_type in db_service.reading_types}
+
+                for name, reading_type in service.get("readings", {}).items():
+                    db_type = reading_types.pop(name, None)
+                    if db_type is None:
+                        db_type = entity.ServiceReading(reading=name)
+                        db_service.reading_types.append(db_type)
+
+                    db_type.type = reading_type["type"]
+                    db_type.counter_max = reading_type.get("max", None)
+                    db_type.scale = reading_type.get("scale", 1)
+
+                for db_type in reading_types.values():
+                    session.delete(db_type)
+
             # Delete no longer known services
             for service_name, service in services_by_name.items():
                 if service_name not in reported_services_names:
                     service.deleted = True
 
             session.add(probe)
+            session.commit()
         except Exception:
             session.rollback()
             raise
-        finally:
-            session.commit()
+
+        probes_cache.invalidate()
 
         return {"status": "OK"}
+
+
+class StatusSummary(SafeResource):
+    """
+    Global number of mapped services in each service status.
+    """
+
+    @validate_response(Object(additional_properties=Integer()))
+    def get(self):
+        """
+        Return number of mapped services in each service status, summed over all probes.
+        """
+        session = config.read_db
+        totals = entity.status_totals(session)
+
+        return {
+            name: totals.get(status_id, 0)
+            for name, status_id in const.service_status.items()
+            if isinstance(name, str)
+        }
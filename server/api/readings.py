@@ -1,16 +1,29 @@
 """
 API for accessing and uploading probe readings.
 """
+import json
 import logging
+import numpy as np
+from datetime import datetime, timedelta
 from fnmatch import fnmatch
+from time import perf_counter
 
-from flask import request
+from flask import request, Response, stream_with_context
 from sqlalchemy.sql.functions import now
+from werkzeug.exceptions import BadRequest
 
-from api.db import Probe, MappedService, Service, const, ReadingValue, Reading, ServiceThreshold, ServiceStatusHistory
+from api.db import baselines, Probe, MappedService, Service, const, ReadingValue, Reading, ServiceThreshold, ServiceStatusHistory, \
+    ServiceReading, StatusCounterChanges, StatusEvaluation, ReadingSketch, latest_values
+from api.probe import probes_cache
 from config import config
-from lib.schema import ExplicitObject, String, Integer, ExplicitArray
-from lib.util import SafeResource, validate_input, validate_response
+from lib.derive import rate
+from lib.metrics import READINGS_ACCEPTED, READINGS_DERIVED, READINGS_REJECTED, STATUS_TRANSITIONS, \
+    THRESHOLD_EVALUATION
+from lib.notifications import notifier
+from lib.schema import ExplicitObject, String, Integer, ExplicitArray, Number, Null, Object, OneOf
+from lib.sketch import DDSketch
+from lib.timeseries import AGGREGATE_FUNCTIONS, DOWNSAMPLE_METHODS, aggregate, downsample, split_series, to_list
+from lib.util import SafeResource, validate_input, validate_response, parse_datetime
 
 
 class Readings(SafeResource):
@@ -18,19 +31,199 @@ class Readings(SafeResource):
     Stores and retrieves probe readings.
     """
 
-    @validate_input(ExplicitArray(ExplicitObject({
-        "service": Integer(title="Mapped service ID"),
-        "reading": String(title="Value name"),
-        "timestamp": String(format="date-time", title="Timestamp when the reading was taken."),
-        "value": Integer(title="Value")
-    })))
-    @validate_response(ExplicitObject({"status": String(enum=["OK"])}, required=["status"]))
+    # Maximum number of buckets per series that can be requested by one query.
+    MAX_BUCKETS = 10000
+
+    # Number of rows converted to arrays at once when reading values from database.
+    CHUNK_SIZE = 10000
+
+    def get(self, probe_name):
+        """
+        Query reading history. Accepts following query params:
+            service - Mapped service ID, can be specified multiple times. Default is all services of the probe.
+            reading - Reading name pattern (fnmatch-like), can be specified multiple times. Default is all readings.
+            from - Start of time range. Default is one day before `to`.
+            to - End of time range (exclusive). Default is now.
+            step - Bucket width in seconds. Default is 60.
+            aggregate - Aggregation function, one of avg, min, max, last, sum, count. Default is avg.
+            downsample - Instead of aggregating, return raw points selected by downsampling method, one of lttb, minmax.
+            points - Maximum number of points per series returned when downsampling. Default is 1000.
+        The response is streamed. When aggregating, bucket i of each series covers <from + i * step,
+        from + (i + 1) * step) and buckets without values are null. When downsampling, each series contains its own
+        list of timestamps.
+        :param probe_name: Name of probe which readings should be returned.
+        """
+        try:
+            time_to = parse_datetime(request.args["to"]) if "to" in request.args else datetime.now()
+            time_from = parse_datetime(request.args["from"]) if "from" in request.args \
+                else time_to - timedelta(days=1)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        try:
+            step = int(request.args.get("step", 60))
+            points = int(request.args.get("points", 1000))
+            service_ids = [int(service_id) for service_id in request.args.getlist("service")]
+        except ValueError:
+            raise BadRequest("Parameters 'step', 'points' and 'service' must be integers.")
+
+        patterns = request.args.getlist("reading") or ["*"]
+
+        method = request.args.get("downsample")
+        function = request.args.get("aggregate", "avg")
+
+        if method is not None:
+            if method not in DOWNSAMPLE_METHODS:
+                raise BadRequest("Bad downsample value: '%s'. Must be one of %s." %
+                                 (method, ",".join(DOWNSAMPLE_METHODS)))
+
+            if points < 3:
+                raise BadRequest("Parameter 'points' must be at least 3.")
+
+            range_from = time_from
+            range_to = time_to
+
+            header = {
+                "from": range_from.isoformat(),
+                "to": range_to.isoformat(),
+                "downsample": method,
+                "points": points
+            }
+
+            def process(timestamps, values):
+                """
+                Select points to display.
+                """
+                selected = downsample(timestamps, values, points, method)
+                return {
+                    "timestamps": np.datetime_as_string(timestamps[selected].astype("datetime64[s]")).tolist(),
+                    "values": values[selected].tolist()
+                }
+        else:
+            if step <= 0:
+                raise BadRequest("Parameter 'step' must be positive.")
+
+            if function not in AGGREGATE_FUNCTIONS:
+                raise BadRequest("Bad aggregate value: '%s'. Must be one of %s." %
+                                 (function, ",".join(AGGREGATE_FUNCTIONS)))
+
+            # Align range to whole steps, so buckets of different queries with the same step match.
+            start = int((time_from - datetime(1970, 1, 1)).total_seconds()) // step * step
+            end = int((time_to - datetime(1970, 1, 1)).total_seconds())
+            count = max(0, -(-(end - start) // step))
+
+            if count > self.MAX_BUCKETS:
+                raise BadRequest("Requested range contains %d buckets, maximum is %d. Use larger step." %
+                                 (count, self.MAX_BUCKETS))
+
+            range_from = datetime.utcfromtimestamp(start)
+            range_to = datetime.utcfromtimestamp(start + count * step)
+
+            header = {
+                "from": range_from.isoformat(),
+                "to": range_to.isoformat(),
+                "step": step,
+                "aggregate": function
+            }
+
+            def process(timestamps, values):
+                """
+                Aggregate values to buckets.
+                """
+                result, present = aggregate(timestamps, values, start, step, count, function)
+                return {
+                    "values": to_list(result, present if function != "count" else None)
+                }
+
+        # Own session, as the response is streamed and the session is closed when the stream ends.
+        session = config.read_session()
+        try:
+            probe = session.query(Probe).filter(Probe.name == probe_name).one()
+
+            query = session.query(Reading)\
+                .join(MappedService, MappedService.id == Reading.mapped_service_id)\
+                .join(Service, Service.id == MappedService.probe_service_id)\
+                .filter(Service.probe_id == probe.id)\
+                .order_by(Reading.id)
+
+            if service_ids:
+                query = query.filter(Reading.mapped_service_id.in_(service_ids))
+
+            readings = [
+                reading for reading in query.all()
+                if any(fnmatch(reading.name, pattern) for pattern in patterns)
+            ]
+        except:
+            session.close()
+            raise
+
+        def generate():
+            """
+            Generate the response as a stream of JSON chunks, one chunk per series.
+            """
+            try:
+                yield json.dumps(header)[:-1] + ', "series": ['
+
+                values = []
+                if readings:
+                    values = session.query(ReadingValue.reading, ReadingValue.datetime, ReadingValue.value)\
+                        .filter(ReadingValue.reading.in_([reading.id for reading in readings]))\
+                        .filter(ReadingValue.datetime >= range_from)\
+                        .filter(ReadingValue.datetime < range_to)\
+                        .order_by(ReadingValue.reading, ReadingValue.datetime)\
+                        .yield_per(self.CHUNK_SIZE)
+
+                series = split_series(values, self.CHUNK_SIZE)
+                current = next(series, None)
+
+                for i, reading in enumerate(readings):
+                    data = {
+                        "service": reading.mapped_service_id,
+                        "reading": reading.name,
+                    }
+
+                    if current is not None and current[0] == reading.id:
+                        data.update(process(current[1], current[2]))
+                        current = next(series, None)
+                    else:
+                        data.update(process(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)))
+
+                    yield (", " if i > 0 else "") + json.dumps(data)
+
+                yield "]}"
+            finally:
+                session.close()
+
+        return Response(stream_with_context(generate()), mimetype="application/json")
+
+    @validate_input(ExplicitArray(OneOf(
+        ExplicitObject({
+            "service": Integer(title="Mapped service ID"),
+            "reading": String(title="Value name"),
+            "timestamp": String(format="date-time", title="Timestamp when the reading was taken."),
+            "value": Integer(title="Value")
+        }),
+        ExplicitArray([
+            Integer(title="Reading ID"),
+            String(format="date-time", title="Timestamp when the reading was taken."),
+            Integer(title="Value")
+        ], min_items=3)
+    )))
+    @validate_response(ExplicitObject({
+        "status": String(enum=["OK"]),
+        "readings": Object(additional_properties=Object(additional_properties=Integer()),
+                           description="Reading IDs of values sent by name: {mapped_service_id: {name: id}}."),
+        "unknown": ExplicitArray(Integer(), description="Reading IDs that do not belong to active services.")
+    }, required=["status"]))
     def put(self, probe_name):
         """
-        Put new reading to database.
+        Put new reading to database. Each value is either an object with mapped service ID and name of the reading,
+        or [reading_id, timestamp, value] array with ID of the reading returned by previous call. The response
+        contains IDs of readings of values sent by name, and reading IDs that were rejected, because the reading or
+        its service no longer exists or is not active (the probe should send them by name again).
         :param probe_name: Name of probe which sent the reading.
         """
-        session = config.session()
+        session = config.db
         try:
             probe = session.query(Probe).filter(Probe.name == probe_name).one()
 
@@ -48,8 +241,47 @@ class Readings(SafeResource):
                 active_services[service.id] = service
 
             readings_by_service = {}
+            readings_by_id = {}
+            updated_readings = {}
+            status_changes = StatusCounterChanges()
+
+            # Metrics are recorded and notifications sent after commit.
+            accepted = 0
+            derived = 0
+            rejected = 0
+            transitions = []
+            threshold_time = 0.0
+
+            for reading in session.query(Reading)\
+                    .filter(Reading.mapped_service_id.in_(active_service_ids))\
+                    .all():
+                readings_by_service.setdefault(reading.mapped_service_id, {})[reading.name] = reading
+                readings_by_id[reading.id] = reading
+
+            # Values sent by reading ID are resolved to the reading directly.
+            values = []
+            unknown_ids = []
+            named = set()
+            for value in request.json:
+                if isinstance(value, list):
+                    db_reading = readings_by_id.get(value[0])
+                    if db_reading is None:
+                        logging.warning("Received value of unknown reading %s. Maybe its service was removed or "
+                                        "deactivated. Ignoring." % (value[0], ))
+                        unknown_ids.append(value[0])
+                        continue
+
+                    values.append({
+                        "service": db_reading.mapped_service_id,
+                        "reading": db_reading.name,
+                        "timestamp": value[1],
+                        "value": value[2]
+                    })
+                else:
+                    values.append(value)
+                    named.add((value["service"], value["reading"]))
 
-            valid_service_ids = [value["service"] for value in request.json if value["service"] in active_service_ids]
+            valid_service_ids = [value["service"] for value in values if value["service"] in active_service_ids]
 
             # Construct thresholds[mapping_id][reading_name] = [threshold1, threshold2, ...].
             thresholds_for_mapping = {}
@@ -64,85 +296,342 @@ class Readings(SafeResource):
                     .setdefault(threshold.reading, [])\
                     .append(threshold)
 
-            for reading in session.query(Reading)\
-                    .filter(Reading.mapped_service_id.in_(active_service_ids))\
-                    .all():
-                readings_by_service.setdefault(reading.mapped_service_id, {})[reading.name] = reading
+            evaluation = StatusEvaluation(thresholds_for_mapping,
+                                          config.cfg.getint("status", "ConsecutiveSamples", fallback=1))
 
-            for value in request.json:
+            # Construct reading_types[mapping_id] = [type1, type2, ...].
+            reading_types = {}
+            for reading_type, mapped_service_id in session.query(ServiceReading, MappedService.id)\
+                    .select_from(MappedService)\
+                    .join(ServiceReading, ServiceReading.probe_service_id == MappedService.probe_service_id)\
+                    .filter(MappedService.id.in_(valid_service_ids)).all():
+                reading_types.setdefault(mapped_service_id, []).append(reading_type)
+
+            def get_reading(service_id: int, name: str) -> Reading:
+                """
+                Return reading of the service, create it if it does not exist yet.
+                """
+                db_reading = readings_by_service.setdefault(service_id, {}).get(name)
+                if db_reading is None:
+                    db_reading = Reading(mapped_service_id=service_id, name=name)
+                    readings_by_service[service_id][name] = db_reading
+                    session.add(db_reading)
+                    logging.debug("Create new reading %s." % (name, ))
+                return db_reading
+
+            def store(db_reading: Reading, timestamp: datetime, reading_value: int) -> None:
+                """
+                Store one value of the reading.
+                """
+                db_reading.values.append(ReadingValue(datetime=timestamp, value=reading_value))
+                logging.debug("Store value %s=%s." % (db_reading.name, reading_value))
+
+                # Maintain last value index. Values can arrive out of order, so keep the newest one.
+                if db_reading.last_timestamp is None or timestamp >= db_reading.last_timestamp:
+                    db_reading.last_timestamp = timestamp
+                    db_reading.last_value = reading_value
+                    updated_readings[id(db_reading)] = db_reading
+
+            def get_type(service_id: int, name: str) -> ServiceReading:
+                """
+                Return type of the reading, declared by the most specific pattern matching its name.
+                """
+                matching = [
+                    reading_type for reading_type in reading_types.get(service_id, [])
+                    if fnmatch(name, reading_type.reading)
+                ]
+                return max(matching, key=lambda reading_type: len(reading_type.reading)) if matching else None
+
+            # Seasons of baselines needed by adaptive thresholds, by (mapping_id, reading_name).
+            seasons = {}
+            updated_baselines = set()
+
+            def get_seasons(service_id: int, name: str) -> set:
+                if (service_id, name) not in seasons:
+                    seasons[(service_id, name)] = evaluation.seasons(service_id, name)
+                return seasons[(service_id, name)]
+
+            baselines.load(session, [
+                db_reading.id
+                for service_id in set(valid_service_ids)
+                for name, db_reading in readings_by_service.get(service_id, {}).items()
+                if get_seasons(service_id, name)
+            ])
+
+            def evaluate(service_id: int, db_reading: Reading, timestamp: datetime, reading_value: int) -> None:
+                """
+                Add value to status evaluation, and update baselines of the reading with it.
+                """
+                nonlocal threshold_time
+                evaluation_start = perf_counter()
+
+                # New readings get baselines from the next batch on, when they have ID.
+                reading_baselines = {}
+                if db_reading.id is not None:
+                    for season in get_seasons(service_id, db_reading.name):
+                        key = baselines.key(db_reading.id, season, timestamp)
+                        reading_baselines[season] = baselines.get(key)
+                        updated_baselines.add(key)
+
+                evaluation.add(active_services[service_id], db_reading.name, reading_value,
+                               lambda season: reading_baselines[season]
+                               if season in reading_baselines and baselines.ready(reading_baselines[season]) else None)
+
+                for baseline in reading_baselines.values():
+                    baseline.update(reading_value, baselines.alpha)
+
+                threshold_time += perf_counter() - evaluation_start
+
+            for value in values:
                 if value["service"] not in active_service_ids:
                     logging.warning("Received reading for unknown service %s. Maybe it was removed or deactivated. "
-                                    "Ignoring.")
+                                    "Ignoring." % (value["service"], ))
+                    rejected += 1
                     continue
 
-                # Test if reading value already exists
-                db_reading = readings_by_service.setdefault(value["service"], {}).get(value["reading"])
-                if db_reading is None:
-                    db_reading = Reading(mapped_service_id=value["service"], name=value["reading"])
-                    readings_by_service[value["service"]][value["reading"]] = db_reading
-                    logging.debug("Create new reading %s." % (value["reading"], ))
-
-                db_reading.values.append(ReadingValue(datetime=value["timestamp"], value=value["value"]))
-                logging.debug("Store value %s=%s." % (db_reading.name, value["value"]))
-
-                # TDetermine whether service changes status and write that to database.
-                db_service = active_services[value["service"]]
-                if value["service"] in thresholds_for_mapping:
-                    # Determine what is current status of service.
-
-                    thresholds = thresholds_for_mapping[value["service"]]
-
-                    combined_thresholds = {}
-
-                    # Determine possible keys and sort them by priority.
-                    for reading, status_thresholds in thresholds.items():
-                        if fnmatch(value["reading"], reading):
-                            # Determine match priority. Be dummy here and think, that longer pattern is more accurate.
-                            priority = len(reading)
-                            for threshold in status_thresholds:
-                                if threshold.service_status_id not in combined_thresholds or \
-                                        combined_thresholds[threshold.service_status_id][0] < priority:
-                                    combined_thresholds[threshold.service_status_id] = priority, threshold
-
-                    # OK is default status.
-                    current_status = const.service_status["ok"]
-                    for key in sorted(combined_thresholds.keys()):
-                        threshold = combined_thresholds[key][1]
-
-                        if (threshold.min is not None and value["value"] < threshold.min) or (threshold.max is not None and value["value"] > threshold.max):
-                            current_status = threshold.service_status_id
-
-                    if db_service.current_status != current_status:
-                        db_service.current_status = current_status
-                        db_service.current_status_from = now()
-
-                        # Create history entry.
-                        session.add(ServiceStatusHistory(
-                            mapped_service_id=db_service.id,
-                            service_status_id=current_status,
-                            timestamp=now()
-                        ))
-                        session.add(db_service)
-                else:
-                    if db_service.current_status is not None:
-                        db_service.current_status = None
-                        db_service.current_status_from = None
+                try:
+                    timestamp = parse_datetime(value["timestamp"])
+                except ValueError as e:
+                    raise BadRequest(str(e))
+
+                # Last value of the reading is the previous sample of derived rate.
+                db_reading = get_reading(value["service"], value["reading"])
+                previous_timestamp, previous_value = db_reading.last_timestamp, db_reading.last_value
+
+                store(db_reading, timestamp, value["value"])
+                accepted += 1
+
+                evaluate(value["service"], db_reading, timestamp, value["value"])
+
+                reading_type = get_type(value["service"], value["reading"])
+                if reading_type is None:
+                    continue
+
+                value_rate = rate(reading_type.type, previous_timestamp, previous_value, timestamp, value["value"],
+                                  reading_type.counter_max)
+                if value_rate is not None:
+                    rate_value = int(round(value_rate * reading_type.scale))
+                    rate_reading = get_reading(value["service"], "%s.rate" % (value["reading"], ))
+                    store(rate_reading, timestamp, rate_value)
+                    derived += 1
+
+                    evaluate(value["service"], rate_reading, timestamp, rate_value)
+
+            # Status is changed once per service and batch, after all its values are evaluated.
+            evaluation_start = perf_counter()
+            for db_service, current_status in evaluation.changes(active_services):
+                status_changes.transition(probe.id, db_service.current_status, current_status)
+                transitions.append((db_service.id, db_service.name, db_service.current_status, current_status))
+                db_service.current_status = current_status
+                db_service.current_status_from = now() if current_status is not None else None
 
-                        # Create history entry.
-                        session.add(ServiceStatusHistory(
-                            mapped_service_id=db_service.id,
-                            service_status_id=None,
-                            timestamp=now()
-                        ))
-                        session.add(db_service)
+                # Create history entry.
+                session.add(ServiceStatusHistory(
+                    mapped_service_id=db_service.id,
+                    service_status_id=current_status,
+                    timestamp=now()
+                ))
+            threshold_time += perf_counter() - evaluation_start
 
-                session.add(db_reading)
+            status_changed = status_changes.apply(session)
+            baselines.checkpoint(session, updated_baselines)
+
+            # Last seen time is stored by one UPDATE per table, without loading anything.
+            seen_service_ids = set(value["service"] for value in values if value["service"] in active_services)
+            if seen_service_ids:
+                session.query(MappedService)\
+                    .filter(MappedService.id.in_(seen_service_ids))\
+                    .update({MappedService.last_seen: now(), MappedService.stale: False}, synchronize_session=False)
+            session.query(Probe).filter(Probe.id == probe.id)\
+                .update({Probe.last_seen: now()}, synchronize_session=False)
+
+            # Flush to assign IDs to new readings before they are expired by commit.
+            session.flush()
+            latest = {
+                reading.id: {
+                    "service": reading.mapped_service_id,
+                    "reading": reading.name,
+                    "timestamp": reading.last_timestamp,
+                    "value": reading.last_value
+                }
+                for reading in updated_readings.values()
+            }
+
+            # IDs of readings sent by name, so the probe can send them by ID next time.
+            reading_ids = {}
+            for service_id, name in named:
+                db_reading = readings_by_service.get(service_id, {}).get(name)
+                if db_reading is not None:
+                    reading_ids.setdefault(str(service_id), {})[name] = db_reading.id
 
             session.commit()
 
-            return {"status": "OK"}
+            READINGS_ACCEPTED.inc(accepted)
+            READINGS_DERIVED.inc(derived)
+            READINGS_REJECTED.labels("unknown_service").inc(rejected)
+            READINGS_REJECTED.labels("unknown_reading").inc(len(unknown_ids))
+            for service_id, service_name, old_status, new_status in transitions:
+                STATUS_TRANSITIONS.labels(const.service_status.get(old_status, "none"),
+                                          const.service_status.get(new_status, "none")).inc()
+                notifier.notify({
+                    "probe": probe_name,
+                    "service_id": service_id,
+                    "service": service_name,
+                    "from": const.service_status.get(old_status),
+                    "to": const.service_status.get(new_status),
+                    "timestamp": datetime.now().isoformat(),
+                })
+            if accepted:
+                THRESHOLD_EVALUATION.observe(threshold_time)
+
+            latest_values.update(probe_name, latest)
+
+            if status_changed:
+                probes_cache.invalidate()
+
+            response = {"status": "OK", "readings": reading_ids}
+            if unknown_ids:
+                response["unknown"] = unknown_ids
+            return response
         except:
             session.rollback()
             raise
-        finally:
-            session.close()
+
+
+class LatestReadings(SafeResource):
+    """
+    Last received values of probe readings.
+    """
+
+    @validate_response(ExplicitArray(ExplicitObject({
+        "service": Integer(title="Mapped service ID"),
+        "reading": String(title="Value name"),
+        "timestamp": String(format="date-time", title="Timestamp when the reading was taken."),
+        "value": Integer(title="Value")
+    })))
+    def get(self, probe_name):
+        """
+        Return last value of each reading of the probe. Optional query param `service` (can be specified multiple
+        times) limits the output to given mapped service IDs.
+        :param probe_name: Name of probe.
+        """
+        try:
+            service_ids = [int(service_id) for service_id in request.args.getlist("service")]
+        except ValueError:
+            raise BadRequest("Parameter 'service' must be integer.")
+
+        return [
+            {
+                "service": value["service"],
+                "reading": value["reading"],
+                "timestamp": value["timestamp"].isoformat(),
+                "value": value["value"]
+            }
+            for value in latest_values.get(probe_name)
+            if not service_ids or value["service"] in service_ids
+        ]
+
+
+class ReadingPercentiles(SafeResource):
+    """
+    Percentiles of reading values, estimated from hourly sketches.
+    """
+
+    DEFAULT_PERCENTILES = ["50", "90", "95", "99"]
+
+    @validate_response(ExplicitObject({
+        "from": String(format="date-time"),
+        "to": String(format="date-time"),
+        "series": ExplicitArray(ExplicitObject({
+            "service": Integer(title="Mapped service ID"),
+            "reading": String(title="Value name"),
+            "count": Integer(title="Number of values in the range."),
+            "min": OneOf(Number(), Null()),
+            "max": OneOf(Number(), Null()),
+            "percentiles": Object(additional_properties=OneOf(Number(), Null()))
+        }))
+    }))
+    def get(self, probe_name):
+        """
+        Estimate percentiles of reading values in time range. Accepts following query params:
+            service - Mapped service ID, can be specified multiple times. Default is all services of the probe.
+            reading - Reading name pattern (fnmatch-like), can be specified multiple times. Default is all readings.
+            from - Start of time range, rounded down to whole hour. Default is one day before `to`.
+            to - End of time range (exclusive), rounded up to whole hour. Default is now.
+            percentile - Percentile to estimate (0-100), can be specified multiple times. Default is 50, 90, 95, 99.
+        Values are included in the sketches by periodic rollup job, so the most recent values may be missing.
+        Percentiles are estimated within relative accuracy of the sketches ([sketches] RelativeAccuracy).
+        :param probe_name: Name of probe.
+        """
+        try:
+            time_to = parse_datetime(request.args["to"]) if "to" in request.args else datetime.now()
+            time_from = parse_datetime(request.args["from"]) if "from" in request.args \
+                else time_to - timedelta(days=1)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        try:
+            service_ids = [int(service_id) for service_id in request.args.getlist("service")]
+            percentiles = request.args.getlist("percentile") or self.DEFAULT_PERCENTILES
+            fractions = [float(percentile) / 100 for percentile in percentiles]
+        except ValueError:
+            raise BadRequest("Parameter 'service' must be integer and 'percentile' must be number.")
+
+        if any(not 0 <= fraction <= 1 for fraction in fractions):
+            raise BadRequest("Parameter 'percentile' must be between 0 and 100.")
+
+        patterns = request.args.getlist("reading") or ["*"]
+
+        range_from = time_from.replace(minute=0, second=0, microsecond=0)
+        range_to = time_to.replace(minute=0, second=0, microsecond=0)
+        if range_to < time_to:
+            range_to += timedelta(hours=1)
+
+        session = config.read_db
+        probe = session.query(Probe).filter(Probe.name == probe_name).one()
+
+        query = session.query(Reading)\
+            .join(MappedService, MappedService.id == Reading.mapped_service_id)\
+            .join(Service, Service.id == MappedService.probe_service_id)\
+            .filter(Service.probe_id == probe.id)\
+            .order_by(Reading.id)
+
+        if service_ids:
+            query = query.filter(Reading.mapped_service_id.in_(service_ids))
+
+        readings = [
+            reading for reading in query.all()
+            if any(fnmatch(reading.name, pattern) for pattern in patterns)
+        ]
+
+        sketches = {}
+        if readings:
+            for reading_id, data in session.query(ReadingSketch.reading, ReadingSketch.sketch)\
+                    .filter(ReadingSketch.reading.in_([reading.id for reading in readings]))\
+                    .filter(ReadingSketch.hour >= range_from)\
+                    .filter(ReadingSketch.hour < range_to):
+                sketch = DDSketch.from_bytes(data)
+                if reading_id in sketches:
+                    sketches[reading_id].merge(sketch)
+                else:
+                    sketches[reading_id] = sketch
+
+        series = []
+        for reading in readings:
+            sketch = sketches.get(reading.id) or DDSketch()
+            series.append({
+                "service": reading.mapped_service_id,
+                "reading": reading.name,
+                "count": sketch.count,
+                "min": sketch.min,
+                "max": sketch.max,
+                "percentiles": {
+                    percentile: value for percentile, value in zip(percentiles, sketch.quantiles(fractions))
+                }
+            })
+
+        return {
+            "from": range_from.isoformat(),
+            "to": range_to.isoformat(),
+            "series": series
+        }
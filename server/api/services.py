@@ -6,11 +6,13 @@ from flask import request, abort
 from config import config
 from sqlalchemy import and_
 from sqlalchemy.orm import joinedload
-from .db import select, Probe, Service, ServiceOption, MappedService, MappedServiceOption, Status, ErrorCause
+from .db import select, Probe, Service, ServiceOption, MappedService, MappedServiceOption, Status, ErrorCause, \
+    StatusCounterChanges
 from lib.util import SafeResource, validate_input, validate_response
 from lib.schema import ExplicitArray, ExplicitObject, String, Object, OneOf, Boolean, Integer, Null
 from werkzeug.exceptions import BadRequest
 from .db import const
+from .probe import probes_cache
 
 import logging
 
@@ -27,6 +29,7 @@ class Services(SafeResource):
         "service": Service.name.label("service"),
         "status": Status.name.label("status"),
         "error_cause": ErrorCause.description.label("error_cause"),
+        "stale": MappedService.stale,
     }
 
     OPTIONS_COLUMNS = {
@@ -47,6 +50,7 @@ class Services(SafeResource):
         "service": String(),
         "status": String(),
         "error_cause": OneOf(String(), Null()),
+        "stale": Boolean(),
         "options": ExplicitArray(ExplicitObject({
             "identifier": String(),
             "value": OneOf(String(), Null()),
@@ -61,113 +65,110 @@ class Services(SafeResource):
         List mapped services of probe.
         :param probe_name: Probe name
         """
-        session = config.session()
+        session = config.read_db
 
-        try:
-            probe = session.query(Probe).filter_by(name=probe_name).one()
+        probe = session.query(Probe).filter_by(name=probe_name).one()
 
-            allowed_statuses = []
-            for status in request.args.getlist("status"):
-                if status == "all":
-                    allowed_statuses = None
-                    break
+        allowed_statuses = []
+        for status in request.args.getlist("status"):
+            if status == "all":
+                allowed_statuses = None
+                break
 
-                if status in const.status.keys():
-                    allowed_statuses.append(const.status[status])
-                else:
-                    raise BadRequest("Bad status value: '%s'. Must be one of %s."
-                                     % (status, ",".join(const.status.keys())))
+            if status in const.status.keys():
+                allowed_statuses.append(const.status[status])
+            else:
+                raise BadRequest("Bad status value: '%s'. Must be one of %s."
+                                 % (status, ",".join(const.status.keys())))
 
-            if not allowed_statuses and allowed_statuses is not None:
-                allowed_statuses.append(const.status["active"])
+        if not allowed_statuses and allowed_statuses is not None:
+            allowed_statuses.append(const.status["active"])
 
-            show = request.args.getlist("show")
+        show = request.args.getlist("show")
 
-            show_options = []
+        show_options = []
 
-            for column in show:
-                if column.startswith("options."):
-                    show_options.append(column[len("options."):])
+        for column in show:
+            if column.startswith("options."):
+                show_options.append(column[len("options."):])
 
-            for column in show_options:
-                show.remove("options.%s" % (column, ))
+        for column in show_options:
+            show.remove("options.%s" % (column, ))
 
-            mapped_services = select(session, show, self.SHOW_COLUMNS)\
-                .select_from(MappedService)\
-                .add_column(MappedService.id.label("id"))\
-                .add_column(MappedService.probe_service_id.label("probe_service_id"))\
-                .join(Service, MappedService.probe_service_id == Service.id)\
-                .join(Status, MappedService.status_id == Status.id)\
-                .outerjoin(ErrorCause, MappedService.error_cause_id == ErrorCause.id)\
-                .filter((Service.probe_id == probe.id))\
-                .order_by(MappedService.name)
+        mapped_services = select(session, show, self.SHOW_COLUMNS)\
+            .select_from(MappedService)\
+            .add_column(MappedService.id.label("id"))\
+            .add_column(MappedService.probe_service_id.label("probe_service_id"))\
+            .join(Service, MappedService.probe_service_id == Service.id)\
+            .join(Status, MappedService.status_id == Status.id)\
+            .outerjoin(ErrorCause, MappedService.error_cause_id == ErrorCause.id)\
+            .filter((Service.probe_id == probe.id))\
+            .order_by(MappedService.name)
 
-            if allowed_statuses:
-                mapped_services = mapped_services.filter(MappedService.status_id.in_(allowed_statuses))
+        if allowed_statuses:
+            mapped_services = mapped_services.filter(MappedService.status_id.in_(allowed_statuses))
 
-            ids = request.args.getlist("id")
-            if ids:
-                mapped_services = mapped_services.filter(MappedService.id.in_(ids))
+        ids = request.args.getlist("id")
+        if ids:
+            mapped_services = mapped_services.filter(MappedService.id.in_(ids))
 
-            services = []
-            service_ids = set()
-            mapped_ids = set()
+        services = []
+        service_ids = set()
+        mapped_ids = set()
 
-            for row in mapped_services.all():
-                service = row._asdict()
-                services.append(service)
-                service_ids.add(service["probe_service_id"])
-                mapped_ids.add(service["id"])
+        for row in mapped_services.all():
+            service = row._asdict()
+            services.append(service)
+            service_ids.add(service["probe_service_id"])
+            mapped_ids.add(service["id"])
 
-            if show_options:
-                load_value = False
+        if show_options:
+            load_value = False
 
-                if "value" in show_options:
-                    load_value = True
-                    show_options.remove("value")
+            if "value" in show_options:
+                load_value = True
+                show_options.remove("value")
 
-                # Select all options for given services
-                options = select(session, show_options, self.OPTIONS_COLUMNS)\
-                    .add_column(ServiceOption.probe_service_id)\
-                    .add_column(ServiceOption.id)\
-                    .filter(ServiceOption.probe_service_id.in_(service_ids))
+            # Select all options for given services
+            options = select(session, show_options, self.OPTIONS_COLUMNS)\
+                .add_column(ServiceOption.probe_service_id)\
+                .add_column(ServiceOption.id)\
+                .filter(ServiceOption.probe_service_id.in_(service_ids))
 
-                options_for_service = {}
+            options_for_service = {}
 
-                for row in options.all():
-                    option = row._asdict()
-                    options_for_service.setdefault(option["probe_service_id"], []).append(option)
+            for row in options.all():
+                option = row._asdict()
+                options_for_service.setdefault(option["probe_service_id"], []).append(option)
 
-                values_by_mapping = {}
+            values_by_mapping = {}
 
-                if load_value:
-                    for row in session.query(MappedServiceOption.value, MappedServiceOption.mapped_service_id, MappedServiceOption.option_id)\
-                            .filter(MappedServiceOption.mapped_service_id.in_(mapped_ids)).all():
-                        value = row._asdict()
+            if load_value:
+                for row in session.query(MappedServiceOption.value, MappedServiceOption.mapped_service_id, MappedServiceOption.option_id)\
+                        .filter(MappedServiceOption.mapped_service_id.in_(mapped_ids)).all():
+                    value = row._asdict()
 
-                        values_by_mapping.setdefault(value["mapped_service_id"], {})[value["option_id"]] = value["value"]
+                    values_by_mapping.setdefault(value["mapped_service_id"], {})[value["option_id"]] = value["value"]
 
-                for service in services:
-                    options = [option.copy() for option in options_for_service.get(service["probe_service_id"], [])]
-
-                    if load_value:
-                        for option in options:
-                            option["value"] = values_by_mapping.get(service["id"], {}).get(option["id"])
+            for service in services:
+                options = [option.copy() for option in options_for_service.get(service["probe_service_id"], [])]
 
+                if load_value:
                     for option in options:
-                        del option["probe_service_id"], option["id"]
+                        option["value"] = values_by_mapping.get(service["id"], {}).get(option["id"])
 
-                    service["options"] = options
+                for option in options:
+                    del option["probe_service_id"], option["id"]
 
-            # Clean up the result struct from internal items.
-            for service in services:
-                del service["probe_service_id"]
-                if "id" not in show:
-                    del service["id"]
+                service["options"] = options
 
-            return services
-        finally:
-            session.commit()
+        # Clean up the result struct from internal items.
+        for service in services:
+            del service["probe_service_id"]
+            if "id" not in show:
+                del service["id"]
+
+        return services
 
     @validate_input(ExplicitArray(ExplicitObject({
         "name": String(),
@@ -186,7 +187,7 @@ class Services(SafeResource):
         # List service IDs to load.
         services_to_load = [mapping["service"] for mapping in data]
 
-        session = config.session()
+        session = config.db
 
         try:
             probe = session.query(Probe).filter_by(name=probe_name).one()
@@ -264,8 +265,6 @@ class Services(SafeResource):
         except:
             session.rollback()
             raise
-        finally:
-            session.close()
 
         return {"status": "OK"}
 
@@ -281,7 +280,7 @@ class Services(SafeResource):
         """
         Update mapping options.
         """
-        session = config.session()
+        session = config.db
 
         try:
             probe = session.query(Probe).filter(Probe.name == probe_name).one()
@@ -384,33 +383,35 @@ class Services(SafeResource):
         except:
             session.rollback()
             raise
-        finally:
-            session.close()
 
     @validate_response(ExplicitObject({"status": String(enum=["OK"])}, required=["status"]))
     def delete(self, probe_name):
         """
         Delete mapped services from probe.
         """
-        session = config.session()
+        session = config.db
 
         try:
             probe = session.query(Probe).filter(Probe.name == probe_name).one()
 
+            status_changes = StatusCounterChanges()
+
             logging.info("Deleting service mapping where id in %s" % ",".join(request.args.getlist("id")))
             for service in session.query(MappedService)\
                     .join(Service, Service.id == MappedService.probe_service_id)\
                     .filter(MappedService.id.in_(request.args.getlist("id")))\
                     .filter(Service.probe_id == probe.id).all():
 
+                status_changes.transition(probe.id, service.current_status, None)
                 session.delete(service)
 
+            status_changed = status_changes.apply(session)
             session.commit()
 
+            if status_changed:
+                probes_cache.invalidate()
+
             return {"status": "OK"}
         except:
             session.rollback()
             raise
-
-        finally:
-            session.close()
@@ -0,0 +1,20 @@
+"""
+API for runtime statistics of the server.
+"""
+
+from lib.schema import Object
+from lib.stats import stats
+from lib.util import SafeResource, validate_response
+
+
+class Stats(SafeResource):
+    """
+    Runtime statistics of server components (caches, ...).
+    """
+
+    @validate_response(Object(additional_properties=Object()))
+    def get(self):
+        """
+        Return statistics of all registered components.
+        """
+        return stats.collect()
@@ -0,0 +1,4 @@
+"""
+Benchmarks of the server components. Run them from the server directory as modules, for example
+`python3 -m bench.downsample`.
+"""
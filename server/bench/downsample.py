@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark of downsampling methods used by the readings query API. Compares LTTB and min-max decimation against plain
+averaging to the same number of points, both in CPU time and in visual accuracy. Visual accuracy is measured by
+rasterizing the original and the downsampled series to pixel columns and comparing vertical extent of the line in each
+column, relative to the value range of the series (0 % means the charts are identical).
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from lib.timeseries import aggregate, lttb, minmax
+
+
+def generate(length: int, rng: np.random.RandomState) -> (np.ndarray, np.ndarray):
+    """
+    Generate synthetic series with one-second resolution: random walk with noise and occasional spikes.
+    :param length: Number of points.
+    :param rng: Random generator.
+    :return: Tuple (timestamps, values).
+    """
+    timestamps = np.arange(length, dtype=np.int64) + 1500000000
+    values = np.cumsum(rng.normal(0, 1, length)) + rng.normal(0, 5, length)
+
+    spikes = rng.randint(0, length, max(1, length // 10000))
+    values[spikes] += rng.choice([-1, 1], len(spikes)) * 20 * values.std()
+
+    return timestamps, np.round(values * 100).astype(np.int64)
+
+
+def average(timestamps: np.ndarray, values: np.ndarray, points: int) -> (np.ndarray, np.ndarray):
+    """
+    Plain averaging to time buckets, the way the API aggregates.
+    :return: Tuple (timestamps, values) of bucket centers and averages.
+    """
+    start = int(timestamps[0])
+    step = -(-(int(timestamps[-1]) + 1 - start) // points)
+
+    result, present = aggregate(timestamps, values, start, step, points, "avg")
+    centers = start + np.arange(points) * step + step / 2
+
+    return centers[present], result[present]
+
+
+def envelope(x: np.ndarray, y: np.ndarray, edges: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Compute vertical extent of polyline in each pixel column.
+    :param x: X coordinates of polyline points.
+    :param y: Y coordinates of polyline points.
+    :param edges: X coordinates of column edges.
+    :return: Tuple (low, high) of arrays with one item per column.
+    """
+    at_edges = np.interp(edges, x, y)
+    low = np.minimum(at_edges[:-1], at_edges[1:])
+    high = np.maximum(at_edges[:-1], at_edges[1:])
+
+    columns = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, len(edges) - 2)
+    np.minimum.at(low, columns, y)
+    np.maximum.at(high, columns, y)
+
+    return low, high
+
+
+def visual_error(x: np.ndarray, y: np.ndarray, sampled_x: np.ndarray, sampled_y: np.ndarray, width: int) -> float:
+    """
+    Mean difference of rendered column extents of original and downsampled series, relative to value range.
+    """
+    edges = np.linspace(x[0], x[-1], width + 1)
+
+    low, high = envelope(x.astype(np.float64), y.astype(np.float64), edges)
+    sampled_low, sampled_high = envelope(sampled_x.astype(np.float64), sampled_y.astype(np.float64), edges)
+
+    value_range = float(y.max() - y.min()) or 1.0
+    return float(np.mean(np.abs(low - sampled_low) + np.abs(high - sampled_high)) / 2 / value_range)
+
+
+def peak_error(y: np.ndarray, sampled_y: np.ndarray) -> float:
+    """
+    How much of the global extremes was lost by downsampling, relative to value range.
+    """
+    value_range = float(y.max() - y.min()) or 1.0
+    return float((y.max() - sampled_y.max()) + (sampled_y.min() - y.min())) / 2 / value_range
+
+
+def measure(function, repeat: int) -> (float, any):
+    """
+    Run function repeatedly and return best time together with its result.
+    """
+    best = None
+    result = None
+
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function()
+        elapsed = perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000, 5000000],
+                        help="Numbers of input points.")
+    parser.add_argument("--points", type=int, default=1000, help="Number of output points.")
+    parser.add_argument("--width", type=int, default=800, help="Chart width in pixels for visual accuracy.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions, best time is reported.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+
+    methods = {
+        "average": lambda x, y: average(x, y, args.points),
+        "lttb": lambda x, y: (lambda selected: (x[selected], y[selected]))(lttb(x, y, args.points)),
+        "minmax": lambda x, y: (lambda selected: (x[selected], y[selected]))(minmax(y, args.points)),
+    }
+
+    print("%10s  %-8s  %10s  %12s  %12s  %11s" % ("points", "method", "time [ms]", "ns / point", "visual err",
+                                                  "peak err"))
+
+    for size in args.sizes:
+        x, y = generate(size, rng)
+
+        for name, method in methods.items():
+            elapsed, (sampled_x, sampled_y) = measure(lambda: method(x, y), args.repeat)
+
+            print("%10d  %-8s  %10.2f  %12.1f  %11.3f%%  %10.3f%%" % (
+                size, name, elapsed * 1000, elapsed * 1e9 / size,
+                visual_error(x, y, sampled_x, sampled_y, args.width) * 100,
+                peak_error(y, sampled_y) * 100
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+HTTP load benchmark of reading ingest. Several client threads repeatedly submit batches of readings of one probe to a
+running server (either `server.py` or `serve.py`) for given time, and the throughput and latency percentiles are
+reported. The probe and its mapped service must already exist on the server.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from itertools import count
+from threading import Thread, Lock
+from time import perf_counter
+
+import requests
+
+
+class Load:
+    """
+    Shared state of the client threads.
+    """
+    def __init__(self, url: str, service: int, batch: int, duration: float):
+        self.url = url
+        self.service = service
+        self.batch = batch
+        self.deadline = perf_counter() + duration
+
+        self.latencies = []
+        self.errors = 0
+        self.lock = Lock()
+        self.sequence = count()
+
+    def payload(self) -> list:
+        """
+        Build next batch of readings, with timestamps increasing across all threads.
+        """
+        start = datetime(2000, 1, 1) + timedelta(seconds=next(self.sequence) * self.batch)
+        return [
+            {
+                "service": self.service,
+                "reading": "bench",
+                "timestamp": (start + timedelta(seconds=i)).isoformat(),
+                "value": i
+            }
+            for i in range(self.batch)
+        ]
+
+    def run(self) -> None:
+        """
+        Client thread.
+        """
+        session = requests.Session()
+
+        while perf_counter() < self.deadline:
+            payload = self.payload()
+
+            start = perf_counter()
+            try:
+                response = session.put(self.url, json=payload)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = perf_counter() - start
+
+            with self.lock:
+                if ok:
+                    self.latencies.append(elapsed)
+                else:
+                    self.errors += 1
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    Percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:5000/api/v1/", help="API root URL.")
+    parser.add_argument("--probe", default="bench", help="Name of probe.")
+    parser.add_argument("--service", type=int, default=1, help="ID of mapped service the readings belong to.")
+    parser.add_argument("--batch", type=int, default=10, help="Number of readings in one request.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of client threads.")
+    parser.add_argument("--duration", type=float, default=10, help="Duration of the test in seconds.")
+
+    args = parser.parse_args()
+
+    load = Load("%sreadings/%s/" % (args.url, args.probe), args.service, args.batch, args.duration)
+
+    threads = [Thread(target=load.run) for _ in range(args.concurrency)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    latencies = sorted(load.latencies)
+
+    print("requests: %d ok, %d failed in %.1f s" % (len(latencies), load.errors, elapsed))
+    print("throughput: %.1f requests/s, %.1f readings/s" % (len(latencies) / elapsed,
+                                                            len(latencies) * args.batch / elapsed))
+    print("latency [ms]: p50 %.1f, p95 %.1f, p99 %.1f, max %.1f" % (
+        percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000, percentile(latencies, 0.99) * 1000,
+        (latencies[-1] if latencies else 0.0) * 1000
+    ))
+
+
+if __name__ == "__main__":
+    main()
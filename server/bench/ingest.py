@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the API on the ingest path: Readings.put, Services.get, Probes.put and Probes.get. The application runs
+in this process against local database (fresh SQLite file by default, or a MySQL database created by db/create.sql),
+seeded with N probes, each with M mapped services reporting K readings with warning and error thresholds. Requests
+are sent one by one through Flask test client, so the numbers do not include network and HTTP server overhead (use
+bench.http_load for that).
+
+Throughput and latency percentiles of each endpoint are saved as JSON, and can be compared with a previous run:
+
+    python3 -m bench.ingest --output before.json
+    python3 -m bench.ingest --output after.json --compare before.json
+"""
+
+import json
+import os
+import platform
+import re
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from random import Random
+from time import perf_counter
+
+from sqlalchemy import text
+
+from config import config
+from bench.http_load import percentile
+
+
+PROBE_PREFIX = "bench-"
+
+
+def sqlite_schema(dump: str) -> str:
+    """
+    Translate MySQL dump of the schema (db/create.sql) to SQLite. Indexes and foreign keys are left out.
+    :param dump: MySQL dump.
+    :return: SQLite script.
+    """
+    statements = []
+
+    for statement in dump.split(";\n"):
+        statement = "\n".join(line for line in statement.splitlines() if not line.startswith("--")).strip()
+        statement = statement.replace("`", "")
+
+        if statement.startswith("INSERT"):
+            statements.append(statement)
+        elif statement.startswith("CREATE TABLE"):
+            columns = []
+            auto_increment = None
+
+            for line in statement.splitlines()[1:-1]:
+                line = line.strip().rstrip(",")
+                if line.startswith(("KEY", "CONSTRAINT")):
+                    continue
+                elif line.startswith("UNIQUE KEY"):
+                    line = re.sub(r"^UNIQUE KEY \w+", "UNIQUE", line)
+                elif line.startswith("PRIMARY KEY") and auto_increment is not None:
+                    continue
+                elif "AUTO_INCREMENT" in line:
+                    auto_increment = line.split()[0]
+                    line = "%s INTEGER PRIMARY KEY" % (auto_increment, )
+                else:
+                    line = re.sub(r"\benum\([^)]*\)", "text", line).replace(" unsigned", "")
+
+                columns.append("  " + line)
+
+            statements.append("%s\n%s\n)" % (statement.splitlines()[0], ",\n".join(columns)))
+
+    return ";\n".join(statements) + ";\n"
+
+
+def prepare_database(url: str) -> None:
+    """
+    Point the application to benchmark database. SQLite database is recreated, in other databases the probes of
+    previous benchmark are removed. Must be called before the application is imported.
+    """
+    if not config.cfg.has_section("mysql"):
+        config.cfg.add_section("mysql")
+    config.cfg.set("mysql", "Url", url)
+
+    engine = config.mysql
+
+    if engine.dialect.name == "sqlite":
+        engine.dispose()
+        if engine.url.database and os.path.exists(engine.url.database):
+            os.unlink(engine.url.database)
+
+        with open(os.path.join(os.path.dirname(__file__), "..", "db", "create.sql")) as f:
+            script = sqlite_schema(f.read())
+
+        connection = engine.raw_connection()
+        try:
+            connection.executescript(script)
+            connection.commit()
+        finally:
+            connection.close()
+    else:
+        with engine.begin() as connection:
+            connection.execute(text(
+                "DELETE FROM reading_values WHERE reading IN ("
+                "SELECT r.id FROM readings r "
+                "JOIN mapped_services m ON (m.id = r.mapped_service_id) "
+                "JOIN probe_services s ON (s.id = m.probe_service_id) "
+                "JOIN probes p ON (p.id = s.probe_id) "
+                "WHERE p.name LIKE :prefix)"
+            ), prefix=PROBE_PREFIX + "%")
+            connection.execute(text("DELETE FROM probes WHERE name LIKE :prefix"), prefix=PROBE_PREFIX + "%")
+
+
+def probe_definition(probe: int, services: int, readings: int) -> dict:
+    """
+    Probe as reported by Probes.put. All readings warn above 800, and each reading has its own
+    error threshold at 950.
+    """
+    return {
+        "name": "%s%d" % (PROBE_PREFIX, probe),
+        "services": [
+            {
+                "name": "service-%d" % (service, ),
+                "description": "Benchmark service %d" % (service, ),
+                "thresholds": dict(
+                    [("*", {"status": "warning", "min": 0, "max": 800})] +
+                    [("reading-%d" % (reading, ), {"status": "error", "min": 0, "max": 950})
+                     for reading in range(readings)]
+                ),
+                "options": [{"identifier": "hostname", "name": "Host name", "type": "string", "required": False}]
+            }
+            for service in range(services)
+        ]
+    }
+
+
+def seed(probes: int, services: int, readings: int) -> dict:
+    """
+    Create probes, their services with thresholds and one mapping of each service.
+    :return: Mapped service IDs of each probe, by probe name.
+    """
+    from api.db import Probe, Service, ServiceOption, ServiceThreshold, MappedService, MappedServiceOption, const
+
+    session = config.session()
+    try:
+        db_probes = []
+        for probe in range(probes):
+            definition = probe_definition(probe, services, readings)
+            db_probe = Probe(name=definition["name"])
+
+            for service in definition["services"]:
+                db_service = Service(name=service["name"], description=service["description"], deleted=False)
+                db_service.options = [
+                    ServiceOption(identifier=option["identifier"], name=option["name"], data_type=option["type"],
+                                  required=option["required"], description="")
+                    for option in service["options"]
+                ]
+                db_service.thresholds = [
+                    ServiceThreshold(service_status_id=const.service_status[limits["status"]], reading=reading,
+                                     min=limits["min"], max=limits["max"], source="service")
+                    for reading, limits in service["thresholds"].items()
+                ]
+                db_probe.services.append(db_service)
+
+            session.add(db_probe)
+            db_probes.append(db_probe)
+
+        session.flush()
+
+        mappings = {}
+        for db_probe in db_probes:
+            for db_service in db_probe.services:
+                db_mapping = MappedService(probe_service_id=db_service.id, name="mapped-%s" % (db_service.name, ),
+                                           description="", status_id=const.status["active"])
+                session.add(db_mapping)
+                session.flush()
+
+                session.add(MappedServiceOption(mapped_service_id=db_mapping.id, option_id=db_service.options[0].id,
+                                                value="host-%d.example.com" % (db_mapping.id, )))
+                mappings.setdefault(db_probe.name, []).append(db_mapping.id)
+
+        session.commit()
+        return mappings
+    finally:
+        session.close()
+
+
+class Workload:
+    """
+    Requests of the benchmarked endpoints.
+    """
+    def __init__(self, client, mappings: dict, services: int, readings: int, seed: int):
+        self.client = client
+        self.mappings = mappings
+        self.probe_names = sorted(mappings.keys())
+        self.services = services
+        self.readings = readings
+        self.rng = Random(seed)
+        self.start = datetime(2000, 1, 1)
+        self.sequence = {name: 0 for name in self.probe_names}
+
+    def probe(self, iteration: int) -> str:
+        """
+        Probes take turns in the iterations.
+        """
+        return self.probe_names[iteration % len(self.probe_names)]
+
+    def readings_put(self, iteration: int):
+        """
+        One probe cycle: value of every reading of every mapped service of the probe.
+        """
+        name = self.probe(iteration)
+        timestamp = (self.start + timedelta(seconds=self.sequence[name])).isoformat()
+        self.sequence[name] += 1
+
+        return self.client.put("/api/v1/readings/%s/" % (name, ), json=[
+            {
+                "service": mapping,
+                "reading": "reading-%d" % (reading, ),
+                "timestamp": timestamp,
+                "value": self.rng.randint(0, 1000)
+            }
+            for mapping in self.mappings[name]
+            for reading in range(self.readings)
+        ])
+
+    def services_get(self, iteration: int):
+        return self.client.get("/api/v1/services/%s/" % (self.probe(iteration), ), query_string=[
+            ("show", column) for column in ("id", "name", "service", "status", "options.identifier", "options.value")
+        ])
+
+    def probes_put(self, iteration: int):
+        probe = self.probe_names.index(self.probe(iteration))
+        return self.client.put("/api/v1/probe/", json=probe_definition(probe, self.services, self.readings))
+
+    def probes_get(self, iteration: int):
+        return self.client.get("/api/v1/probe/", query_string=[
+            ("show", column) for column in ("name", "warnings", "errors", "num_services", "num_mapped")
+        ])
+
+
+def measure(request, requests: int, warmup: int) -> dict:
+    """
+    Call the request repeatedly and measure it.
+    :param request: Function of iteration number returning response.
+    :param requests: Number of measured requests.
+    :param warmup: Number of requests before the measurement.
+    """
+    for iteration in range(warmup):
+        request(iteration)
+
+    latencies = []
+    errors = 0
+
+    start = perf_counter()
+    for iteration in range(warmup, warmup + requests):
+        request_start = perf_counter()
+        response = request(iteration)
+        latencies.append(perf_counter() - request_start)
+
+        if response.status_code != 200:
+            errors += 1
+    elapsed = perf_counter() - start
+
+    latencies.sort()
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.5) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        }
+    }
+
+
+def compare(results: dict, previous: dict) -> None:
+    """
+    Print relative change of throughput and latency against previous results.
+    """
+    print()
+    print("%-14s %12s %12s %12s" % ("vs. previous", "throughput", "p50", "p95"))
+
+    for endpoint, result in results["results"].items():
+        before = previous["results"].get(endpoint)
+        if before is None:
+            continue
+
+        print("%-14s %+11.1f%% %+11.1f%% %+11.1f%%" % (
+            endpoint,
+            (result["throughput"] / before["throughput"] - 1) * 100,
+            (result["latency_ms"]["p50"] / before["latency_ms"]["p50"] - 1) * 100,
+            (result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1) * 100,
+        ))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--database", default="sqlite:///bench_ingest.db",
+                        help="Database URL. SQLite database is recreated, MySQL database must have the schema.")
+    parser.add_argument("--probes", type=int, default=4, help="Number of probes (N).")
+    parser.add_argument("--services", type=int, default=25, help="Number of mapped services of each probe (M).")
+    parser.add_argument("--readings", type=int, default=4, help="Number of readings of each service (K).")
+    parser.add_argument("--requests", type=int, default=200, help="Number of measured requests of each endpoint.")
+    parser.add_argument("--warmup", type=int, default=20, help="Number of requests before measurement.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of generated reading values.")
+    parser.add_argument("--output", default="bench_ingest_%s.json" % (datetime.now().strftime("%Y%m%d_%H%M%S"), ),
+                        help="File to store results to.")
+    parser.add_argument("--compare", help="Results of previous run to compare with.")
+
+    args = parser.parse_args()
+
+    prepare_database(args.database)
+
+    from server import app
+
+    mappings = seed(args.probes, args.services, args.readings)
+    workload = Workload(app.test_client(), mappings, args.services, args.readings, args.seed)
+
+    results = {
+        "time": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "database": config.mysql.dialect.name,
+        "parameters": {
+            "probes": args.probes,
+            "services": args.services,
+            "readings": args.readings,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "results": {}
+    }
+
+    print("%-14s %12s %10s %10s %10s %10s %7s" % ("endpoint", "requests/s", "mean ms", "p50 ms", "p95 ms", "p99 ms",
+                                                 "errors"))
+
+    for endpoint, request in (("Readings.put", workload.readings_put), ("Services.get", workload.services_get),
+                              ("Probes.put", workload.probes_put), ("Probes.get", workload.probes_get)):
+        result = measure(request, args.requests, args.warmup)
+        results["results"][endpoint] = result
+
+        latency = result["latency_ms"]
+        print("%-14s %12.1f %10.2f %10.2f %10.2f %10.2f %7d" % (endpoint, result["throughput"], latency["mean"],
+                                                                latency["p50"], latency["p95"], latency["p99"],
+                                                                result["errors"]))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Results saved to %s." % (args.output, ))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark of quantile sketches used by the percentiles API. Builds one sketch per hour of synthetic readings, the way
+the rollup job does, and then answers percentile queries over the whole range by merging the hourly sketches. The
+estimates are compared with exact percentiles of the raw values computed by NumPy: relative error of each percentile
+(must stay within the relative accuracy of the sketch), time to build and to query, and size of serialized sketches
+against size of the raw values. Time of exact percentiles does not include loading of the raw values from database,
+which the API would have to do first.
+"""
+
+from argparse import ArgumentParser
+from time import perf_counter
+
+import numpy as np
+
+from lib.sketch import DDSketch
+
+
+def generate(distribution: str, size: int, rng: np.random.RandomState) -> np.ndarray:
+    """
+    Generate synthetic integer reading values.
+    :param distribution: Name of distribution, one of DISTRIBUTIONS.
+    :param size: Number of values.
+    :param rng: Random generator.
+    """
+    if distribution == "latency":
+        # Response times in microseconds: log-normal body with rare slow requests.
+        values = rng.lognormal(9, 0.5, size)
+        slow = rng.rand(size) < 0.01
+        values[slow] *= rng.uniform(10, 100, int(slow.sum()))
+    elif distribution == "uniform":
+        values = rng.uniform(0, 1000000, size)
+    elif distribution == "bimodal":
+        values = np.where(rng.rand(size) < 0.7, rng.normal(2000, 100, size), rng.normal(50000, 5000, size))
+    elif distribution == "pareto":
+        values = (rng.pareto(1.5, size) + 1) * 100
+    elif distribution == "signed":
+        # Temperature-like values around zero.
+        values = rng.normal(0, 1500, size)
+    else:
+        raise ValueError("Unknown distribution %s." % (distribution, ))
+
+    return np.round(values).astype(np.int64)
+
+
+DISTRIBUTIONS = ("latency", "uniform", "bimodal", "pareto", "signed")
+
+
+def exact(values: np.ndarray, fractions: list) -> list:
+    """
+    Exact percentiles with the rank definition of the sketch (lower of the two neighbouring values).
+    """
+    ordered = np.sort(values)
+    return [float(ordered[int(fraction * (len(ordered) - 1))]) for fraction in fractions]
+
+
+def relative_error(estimate: float, value: float) -> float:
+    if value == 0:
+        return abs(estimate)
+    return abs(estimate - value) / abs(value)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--hours", type=int, default=168, help="Number of hourly sketches (default one week).")
+    parser.add_argument("--per-hour", type=int, default=3600, help="Number of values in each hour.")
+    parser.add_argument("--accuracy", type=float, default=0.01, help="Relative accuracy of the sketches.")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=[1, 25, 50, 75, 90, 95, 99, 99.9],
+                        help="Percentiles to compare.")
+    parser.add_argument("--distributions", nargs="+", default=list(DISTRIBUTIONS), choices=DISTRIBUTIONS,
+                        help="Distributions of values.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(args.seed)
+    fractions = [percentile / 100 for percentile in args.percentiles]
+    size = args.hours * args.per_hour
+
+    print("%d values in %d hourly sketches, relative accuracy %.2f %%." % (size, args.hours, args.accuracy * 100))
+    print("%-9s  %9s  %9s  %10s  %10s  %10s  %10s  %8s" % (
+        "dist", "max err", "mean err", "build ns/v", "merge [ms]", "exact [ms]", "bytes/hour", "raw/sk"))
+
+    failed = False
+
+    for distribution in args.distributions:
+        values = generate(distribution, size, rng)
+        hours = np.split(values, args.hours)
+
+        start = perf_counter()
+        serialized = []
+        for hour in hours:
+            sketch = DDSketch(args.accuracy)
+            sketch.add(hour)
+            serialized.append(sketch.to_bytes())
+        build = perf_counter() - start
+
+        # Query: deserialize and merge all hourly sketches, then estimate the percentiles.
+        start = perf_counter()
+        merged = DDSketch(args.accuracy)
+        for data in serialized:
+            merged.merge(DDSketch.from_bytes(data))
+        estimates = merged.quantiles(fractions)
+        merge = perf_counter() - start
+
+        start = perf_counter()
+        expected = exact(values, fractions)
+        exact_time = perf_counter() - start
+
+        errors = [relative_error(estimate, value) for estimate, value in zip(estimates, expected)]
+        if max(errors) > args.accuracy * 1.0001:
+            failed = True
+
+        sketch_bytes = sum(len(data) for data in serialized)
+
+        print("%-9s  %8.3f%%  %8.3f%%  %10.1f  %10.2f  %10.2f  %10.0f  %7.0fx" % (
+            distribution, max(errors) * 100, np.mean(errors) * 100, build * 1e9 / size, merge * 1000,
+            exact_time * 1000, sketch_bytes / args.hours, values.nbytes / sketch_bytes
+        ))
+
+    if failed:
+        print("Some percentile exceeded the relative accuracy.")
+        raise SystemExit(1)
+
+    print("All percentiles within relative accuracy.")
+
+
+if __name__ == "__main__":
+    main()
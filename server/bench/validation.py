@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark of compiled schema validators against jsonschema's Draft4Validator, on the payloads the API validates most:
+readings submitted by probes and the listing of mapped services. Besides the time, the benchmark checks that both
+validators report the same errors (the same "path": message dictionary as built by validate_input), for valid payloads
+and for payloads with part of the items broken.
+"""
+
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+from jsonschema import Draft4Validator
+
+from lib.schema import ExplicitArray, ExplicitObject, Integer, String, Boolean, Null, OneOf
+
+
+READINGS = ExplicitArray(ExplicitObject({
+    "service": Integer(title="Mapped service ID"),
+    "reading": String(title="Value name"),
+    "timestamp": String(format="date-time", title="Timestamp when the reading was taken."),
+    "value": Integer(title="Value")
+}))
+
+SERVICES = ExplicitArray(ExplicitObject({
+    "id": Integer(),
+    "name": String(),
+    "description": String(),
+    "service": String(),
+    "status": String(),
+    "error_cause": OneOf(String(), Null()),
+    "options": ExplicitArray(ExplicitObject({
+        "identifier": String(),
+        "value": OneOf(String(), Null()),
+        "name": String(),
+        "description": String(),
+        "type": String(),
+        "required": Boolean(),
+    }))
+}))
+
+
+def readings(count: int, rng: Random) -> list:
+    """
+    Generate readings payload.
+    """
+    return [
+        {
+            "service": rng.randint(1, 100),
+            "reading": rng.choice(["rtt", "loss", "ping"]),
+            "timestamp": "2020-01-01T00:%02d:%02d" % (i // 60 % 60, i % 60),
+            "value": rng.randint(0, 100000)
+        }
+        for i in range(count)
+    ]
+
+
+def services(count: int, rng: Random) -> list:
+    """
+    Generate mapped services listing.
+    """
+    return [
+        {
+            "id": i,
+            "name": "service-%d" % (i, ),
+            "description": "Service number %d" % (i, ),
+            "service": rng.choice(["ping", "http", "dns"]),
+            "status": rng.choice(["ok", "warning", "error"]),
+            "error_cause": rng.choice([None, "Timeout"]),
+            "options": [
+                {
+                    "identifier": "hostname",
+                    "value": "host-%d.example.com" % (i, ),
+                    "name": "Host name",
+                    "description": "Host to check.",
+                    "type": "string",
+                    "required": True
+                },
+                {
+                    "identifier": "timeout",
+                    "value": rng.choice([None, "10"]),
+                    "name": "Timeout",
+                    "description": "Timeout in seconds.",
+                    "type": "int",
+                    "required": False
+                }
+            ]
+        }
+        for i in range(count)
+    ]
+
+
+def corrupt(payload: list, fraction: float, rng: Random) -> list:
+    """
+    Break given fraction of items: wrong types, unknown keys, invalid nested values.
+    """
+    for item in rng.sample(payload, int(len(payload) * fraction)):
+        key = rng.choice(sorted(item.keys()))
+        breakage = rng.randint(0, 3)
+
+        if breakage == 0:
+            item[key] = True
+        elif breakage == 1:
+            item["unexpected_%d" % (rng.randint(0, 1), )] = 1
+        elif breakage == 2:
+            item[key] = {"nested": [1, "2"]}
+        elif isinstance(item.get("options"), list) and item["options"]:
+            item["options"][0]["value"] = 10
+        else:
+            item[key] = None
+
+    return payload
+
+
+def draft4_errors(validator: Draft4Validator, instance: any) -> dict:
+    return {".".join(map(str, error.absolute_path)): error.message for error in validator.iter_errors(instance)}
+
+
+def compiled_errors(validator, instance: any) -> dict:
+    return {".".join(map(str, path)): message for path, message in validator.iter_errors(instance)}
+
+
+def measure(function, repeat: int) -> (float, any):
+    """
+    Run function repeatedly and return best time together with its result.
+    """
+    best = None
+    result = None
+
+    for _ in range(repeat):
+        start = perf_counter()
+        result = function()
+        elapsed = perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 20000],
+                        help="Numbers of items in payload.")
+    parser.add_argument("--invalid", type=float, default=0.01, help="Fraction of broken items in invalid payloads.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions, best time is reported.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+
+    args = parser.parse_args()
+
+    rng = Random(args.seed)
+
+    payloads = {
+        "readings": (READINGS, readings),
+        "services": (SERVICES, services),
+    }
+
+    print("%-9s  %7s  %8s  %13s  %13s  %8s  %7s  %s" % ("payload", "items", "variant", "draft4 [ms]", "compiled [ms]",
+                                                         "speedup", "errors", "same"))
+
+    for name, (schema, generate) in payloads.items():
+        draft4 = Draft4Validator(schema())
+        compiled = schema.compile()
+
+        for size in args.sizes:
+            for variant in ("valid", "invalid"):
+                payload = generate(size, rng)
+                if variant == "invalid":
+                    payload = corrupt(payload, args.invalid, rng)
+
+                draft4_time, expected = measure(lambda: draft4_errors(draft4, payload), args.repeat)
+                compiled_time, found = measure(lambda: compiled_errors(compiled, payload), args.repeat)
+
+                print("%-9s  %7d  %8s  %13.2f  %13.2f  %7.1fx  %7d  %s" % (
+                    name, size, variant, draft4_time * 1000, compiled_time * 1000, draft4_time / compiled_time,
+                    len(found), "yes" if found == expected and list(found) == list(expected) else "NO"
+                ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Local stand-in of a webhook notification target. Receives batches of notifications (POST with JSON {"events": [...]}),
+prints them and keeps them in memory. A fraction of requests can be failed or delayed to exercise retries and
+timeouts of the dispatcher. Point a target to it in server.conf:
+
+    [notifications]
+    Targets=local
+
+    [notification:local]
+    Type=webhook
+    Url=http://localhost:8025/
+
+It can also be started from Python for tests:
+
+    receiver = WebhookReceiver(port=0).start()
+    ...
+    receiver.events, receiver.batches
+"""
+
+import json
+import random
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Lock, Thread
+from time import sleep
+
+
+class WebhookReceiver(HTTPServer):
+    """
+    HTTP server recording received notifications.
+    """
+    def __init__(self, host: str="localhost", port: int=8025, fail_rate: float=0.0, delay: float=0.0,
+                 verbose: bool=False):
+        """
+        :param host: Address to listen on.
+        :param port: Port to listen on, 0 for any free port.
+        :param fail_rate: Probability (0-1) of answering with status 500.
+        :param delay: Seconds to wait before answering.
+        :param verbose: Print received events.
+        """
+        super(WebhookReceiver, self).__init__((host, port), WebhookHandler)
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.verbose = verbose
+
+        self.lock = Lock()
+        self.batches = []
+        self.failed = 0
+
+    @property
+    def url(self) -> str:
+        return "http://%s:%d/" % self.server_address[:2]
+
+    @property
+    def events(self) -> list:
+        with self.lock:
+            return [event for batch in self.batches for event in batch]
+
+    def start(self) -> "WebhookReceiver":
+        """
+        Serve in background thread.
+        """
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    server = None  # type: WebhookReceiver
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if self.server.delay:
+            sleep(self.server.delay)
+
+        if random.random() < self.server.fail_rate:
+            with self.server.lock:
+                self.server.failed += 1
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        events = json.loads(body.decode("utf-8"))["events"]
+        with self.server.lock:
+            self.server.batches.append(events)
+
+        if self.server.verbose:
+            print("Batch of %d events:" % (len(events), ))
+            for event in events:
+                print("    %s %s/%s: %s -> %s" % (event["timestamp"], event["probe"], event["service"], event["from"],
+                                                 event["to"]))
+
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="localhost", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8025, help="Port to listen on.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability (0-1) of failing the request.")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering.")
+
+    args = parser.parse_args()
+
+    receiver = WebhookReceiver(args.host, args.port, args.fail_rate, args.delay, verbose=True)
+    print("Listening on %s" % (receiver.url, ))
+    try:
+        receiver.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print("Received %d batches with %d events, failed %d requests." % (len(receiver.batches), len(receiver.events),
+                                                                       receiver.failed))
+
+
+if __name__ == "__main__":
+    main()
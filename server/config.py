@@ -1,10 +1,17 @@
+import os
 from configparser import ConfigParser
-from flask import request
+from itertools import cycle
+from typing import List
+from flask import request, current_app, g, has_app_context, has_request_context
 from urllib.parse import urljoin
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
 from lib.client import Client
+from lib.local_client import LocalClient
+from lib.pool import TimedQueuePool
+from lib.stats import stats
 
 
 class Config:
@@ -12,38 +19,208 @@ class Config:
         self.cfg = ConfigParser()
         self.cfg.read("server.conf")
 
+        # Metrics of all worker processes are aggregated through files in this directory. prometheus_client reads the
+        # variable when it is imported, so it is set here, before anything imports lib.metrics.
+        metrics_dir = self.cfg.get("metrics", "MultiprocessDir", fallback="")
+        if metrics_dir:
+            os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", metrics_dir)
+            os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
         self._mysql = None
         self._session_maker = None
+        self._db = None
+        self._read_db = None
+        self._replicas = None
+        self._replica_cycle = None
         self._api = None
 
     @property
     def mysql(self) -> Engine:
         """
-        Get connection to MySQL database.
+        Get connection to MySQL database (the primary server, which takes all writes).
         :return: MySQLWrapper encapsulating MySQLConnection.
         """
         if self._mysql is None:
             sql_config = self.cfg["mysql"]
-            self._mysql = create_engine("mysql+mysqlconnector://%s:%s@%s/%s?charset=%s" % (
+            url = sql_config.get("Url", "mysql+mysqlconnector://%s:%s@%s/%s?charset=%s" % (
                 sql_config.get("User", "root"),
                 sql_config.get("Password", ""),
                 sql_config.get("Host", "localhost"),
                 sql_config.get("Database", "mon"),
                 sql_config.get("Charset", "utf8")
-            ), pool_recycle=3600)
+            ))
+
+            self._mysql = self._create_engine(url, "db.pool")
 
         return self._mysql
 
+    @property
+    def replicas(self) -> List[Engine]:
+        """
+        Get connections to read replicas listed in [mysql] Replicas. Empty when no replicas are configured.
+        """
+        if self._replicas is None:
+            urls = self.cfg.get("mysql", "Replicas", fallback="").replace(",", " ").split()
+
+            self._replicas = [
+                self._create_engine(url, "db.replica%d.pool" % (index, ))
+                for index, url in enumerate(urls)
+            ]
+            self._replica_cycle = cycle(self._replicas)
+
+        return self._replicas
+
+    def dispose(self) -> None:
+        """
+        Close all pooled connections of primary and replicas.
+        """
+        for engine in [self._mysql] + (self._replicas or []):
+            if engine is not None:
+                engine.dispose()
+
+    def _create_engine(self, url: str, stats_name: str) -> Engine:
+        """
+        Create engine with connection pool configured in [mysql] section.
+        :param url: Database URL.
+        :param stats_name: Name of pool statistics.
+        """
+        sql_config = self.cfg["mysql"]
+        engine = create_engine(
+            url,
+            poolclass=TimedQueuePool,
+            pool_size=sql_config.getint("PoolSize", 5),
+            max_overflow=sql_config.getint("MaxOverflow", 10),
+            pool_timeout=sql_config.getfloat("PoolTimeout", 30),
+            pool_pre_ping=sql_config.getboolean("PoolPrePing", True),
+            pool_recycle=sql_config.getint("PoolRecycle", 3600)
+        )
+
+        # Engine.dispose() replaces the pool, so always ask the current one.
+        stats.register(stats_name, lambda: engine.pool.stats())
+
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+
+        return engine
+
+    @staticmethod
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        """
+        Remember which process opened the connection.
+        """
+        connection_record.info["pid"] = os.getpid()
+
+    @staticmethod
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        """
+        Do not use connections inherited from parent process (the app is imported before the server forks workers),
+        as the socket is shared with the parent. The connection is dropped without closing, and the pool opens new one.
+        """
+        if connection_record.info["pid"] != os.getpid():
+            connection_record.connection = connection_proxy.connection = None
+            raise DisconnectionError("Connection record belongs to pid %s, attempting to check out in pid %s." %
+                                     (connection_record.info["pid"], os.getpid()))
+
     def session(self) -> Session:
+        """
+        Create new session. The caller is responsible for closing it. Use for work outside of request (background
+        jobs), or when the session must outlive the request.
+        """
+        return self.session_maker()
+
+    @property
+    def session_maker(self) -> sessionmaker:
+        """
+        Factory of sessions bound to the database engine.
+        """
         if self._session_maker is None:
             self._session_maker = sessionmaker(bind=self.mysql)
+            event.listen(self._session_maker, "after_commit", self._on_commit)
 
-        return self._session_maker()
+        return self._session_maker
+
+    def read_session(self) -> Session:
+        """
+        Create new session for read-only work. It is bound to one of the replicas (in turns), or to the primary when
+        there are no replicas or when the request asked for read-your-writes. The caller is responsible for closing it.
+        """
+        if not self.replicas or self.read_your_writes():
+            return self.session()
+
+        return self.session_maker(bind=next(self._replica_cycle))
+
+    @property
+    def db(self) -> Session:
+        """
+        Session of current request. It is created on first use and removed (which rolls back uncommitted changes and
+        returns the connection to the pool) when the request ends, see remove_session().
+        """
+        if self._db is None:
+            self._db = scoped_session(self.session_maker)
+
+        return self._db
+
+    @property
+    def read_db(self) -> Session:
+        """
+        Read-only session of current request, see read_session(). Removed when the request ends, same as db.
+        """
+        if self._read_db is None:
+            self._read_db = scoped_session(self.read_session)
+
+        return self._read_db
+
+    def remove_session(self, exception: BaseException=None) -> None:
+        """
+        Remove sessions of current request. Registered as request teardown handler.
+        """
+        if self._db is not None:
+            self._db.remove()
+
+        if self._read_db is not None:
+            self._read_db.remove()
+
+    @staticmethod
+    def read_your_writes() -> bool:
+        """
+        Whether reads of current request must see data already written to the primary. That is when the client asked
+        for it by X-Read-Your-Writes header or read_your_writes query parameter, or when something was committed
+        earlier in the same application context (website calling write and then read API locally).
+        """
+        if has_app_context() and g.get("db_committed", False):
+            return True
+
+        if not has_request_context():
+            return False
+
+        value = request.headers.get("X-Read-Your-Writes", request.args.get("read_your_writes", ""))
+        return value.lower() in ("1", "yes", "true")
+
+    @staticmethod
+    def _on_commit(session: Session) -> None:
+        """
+        Remember commit to primary, so following reads of the same application context use primary.
+        """
+        if has_app_context():
+            g.db_committed = True
 
     @property
     def api(self) -> Client:
+        """
+        Get client of the API used by the website. In local mode (default), the API resources of this application are
+        called directly. In http mode, the API is called over HTTP at [api] Address, which can be absolute URL of
+        remote server, or path relative to this server.
+        """
         if self._api is None:
-            self._api = Client(urljoin(request.url_root, self.cfg.get("api", "Address", fallback="/")))
+            address = self.cfg.get("api", "Address", fallback="/")
+            mode = self.cfg.get("api", "Mode", fallback="local")
+
+            if mode == "local":
+                self._api = LocalClient(current_app._get_current_object(), address)
+            elif mode == "http":
+                self._api = Client(urljoin(request.url_root, address))
+            else:
+                raise ValueError("Invalid [api] Mode '%s'. Must be one of local, http." % (mode, ))
 
         return self._api
 
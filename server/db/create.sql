@@ -17,6 +17,17 @@ INSERT INTO `error_cause` (`id`, `name`, `description`) VALUES
 (1,	'ERROR_MISSING_REQUIRED_OPTION',	'The service introduced new required option, which is not set for this mapping.'),
 (2,	'ERROR_SERVICE_UNAVAILABLE',	'The service cannot be activated, because the remote probe does not provide it anymore.');
 
+DROP TABLE IF EXISTS `job_watermarks`;
+CREATE TABLE `job_watermarks` (
+  `name` varchar(64) NOT NULL,
+  `value` bigint(20) unsigned NOT NULL,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+INSERT INTO `job_watermarks` (`name`, `value`) VALUES
+('sketch_rollup',	0);
+
+
 DROP TABLE IF EXISTS `mapped_services`;
 CREATE TABLE `mapped_services` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
@@ -27,15 +38,21 @@ CREATE TABLE `mapped_services` (
   `error_cause_id` int(11) DEFAULT NULL,
   `current_status` int(11) DEFAULT NULL,
   `current_status_from` datetime DEFAULT NULL,
+  `pending_status` int(11) DEFAULT NULL,
+  `pending_count` int(11) NOT NULL DEFAULT '0',
+  `last_seen` datetime DEFAULT NULL,
+  `stale` tinyint(1) NOT NULL DEFAULT '0',
   PRIMARY KEY (`id`),
   UNIQUE KEY `probe_service_id_name` (`probe_service_id`,`name`),
   KEY `status` (`status_id`),
   KEY `error_cause_id` (`error_cause_id`),
   KEY `current_status` (`current_status`),
+  KEY `last_seen` (`last_seen`),
   CONSTRAINT `mapped_services_ibfk_1` FOREIGN KEY (`probe_service_id`) REFERENCES `probe_services` (`id`) ON DELETE CASCADE,
   CONSTRAINT `mapped_services_ibfk_2` FOREIGN KEY (`status_id`) REFERENCES `status` (`id`),
   CONSTRAINT `mapped_services_ibfk_3` FOREIGN KEY (`error_cause_id`) REFERENCES `error_cause` (`id`),
-  CONSTRAINT `mapped_services_ibfk_4` FOREIGN KEY (`current_status`) REFERENCES `service_status` (`id`)
+  CONSTRAINT `mapped_services_ibfk_4` FOREIGN KEY (`current_status`) REFERENCES `service_status` (`id`),
+  CONSTRAINT `mapped_services_ibfk_5` FOREIGN KEY (`pending_status`) REFERENCES `service_status` (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 
 
@@ -57,10 +74,23 @@ DROP TABLE IF EXISTS `probes`;
 CREATE TABLE `probes` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
   `name` varchar(255) NOT NULL,
+  `last_seen` datetime DEFAULT NULL,
   PRIMARY KEY (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 
 
+DROP TABLE IF EXISTS `probe_status_counters`;
+CREATE TABLE `probe_status_counters` (
+  `probe_id` int(11) NOT NULL,
+  `service_status_id` int(11) NOT NULL,
+  `count` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`probe_id`,`service_status_id`),
+  KEY `service_status_id` (`service_status_id`),
+  CONSTRAINT `probe_status_counters_ibfk_1` FOREIGN KEY (`probe_id`) REFERENCES `probes` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `probe_status_counters_ibfk_2` FOREIGN KEY (`service_status_id`) REFERENCES `service_status` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+
 DROP TABLE IF EXISTS `probe_services`;
 CREATE TABLE `probe_services` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
@@ -94,12 +124,40 @@ CREATE TABLE `readings` (
   `id` int(10) unsigned NOT NULL AUTO_INCREMENT,
   `mapped_service_id` int(11) NOT NULL,
   `name` varchar(255) NOT NULL,
+  `last_timestamp` datetime DEFAULT NULL,
+  `last_value` bigint(20) DEFAULT NULL,
   PRIMARY KEY (`id`),
   KEY `mapped_service_id` (`mapped_service_id`),
   CONSTRAINT `readings_ibfk_1` FOREIGN KEY (`mapped_service_id`) REFERENCES `mapped_services` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8;
 
 
+DROP TABLE IF EXISTS `reading_baselines`;
+CREATE TABLE `reading_baselines` (
+  `reading` int(10) unsigned NOT NULL,
+  `season` int(11) NOT NULL DEFAULT '0',
+  `slot` int(11) NOT NULL DEFAULT '0',
+  `mean` double NOT NULL,
+  `variance` double NOT NULL,
+  `count` bigint(20) NOT NULL,
+  PRIMARY KEY (`reading`,`season`,`slot`),
+  CONSTRAINT `reading_baselines_ibfk_1` FOREIGN KEY (`reading`) REFERENCES `readings` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+
+DROP TABLE IF EXISTS `reading_sketches`;
+CREATE TABLE `reading_sketches` (
+  `reading` int(10) unsigned NOT NULL,
+  `hour` datetime NOT NULL,
+  `count` bigint(20) NOT NULL,
+  `sketch` blob NOT NULL,
+  `last_value_id` bigint(20) unsigned NOT NULL,
+  PRIMARY KEY (`reading`,`hour`),
+  KEY `last_value_id` (`last_value_id`),
+  CONSTRAINT `reading_sketches_ibfk_1` FOREIGN KEY (`reading`) REFERENCES `readings` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+
 DROP TABLE IF EXISTS `reading_values`;
 CREATE TABLE `reading_values` (
   `id` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
@@ -111,6 +169,20 @@ CREATE TABLE `reading_values` (
 ) ENGINE=TokuDB DEFAULT CHARSET=utf8;
 
 
+DROP TABLE IF EXISTS `service_readings`;
+CREATE TABLE `service_readings` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `probe_service_id` int(11) NOT NULL,
+  `reading` varchar(255) NOT NULL,
+  `type` enum('gauge','counter','derive') NOT NULL DEFAULT 'gauge',
+  `counter_max` bigint(20) DEFAULT NULL,
+  `scale` int(11) NOT NULL DEFAULT '1',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `probe_service_id_reading` (`probe_service_id`,`reading`),
+  CONSTRAINT `service_readings_ibfk_1` FOREIGN KEY (`probe_service_id`) REFERENCES `probe_services` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+
 DROP TABLE IF EXISTS `service_status`;
 CREATE TABLE `service_status` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
@@ -144,8 +216,12 @@ CREATE TABLE `service_thresholds` (
   `probe_service_id` int(11) NOT NULL,
   `service_status_id` int(11) NOT NULL,
   `reading` varchar(255) DEFAULT NULL,
-  `min` bigint(20) NOT NULL,
-  `max` bigint(20) NOT NULL,
+  `min` bigint(20) DEFAULT NULL,
+  `max` bigint(20) DEFAULT NULL,
+  `recovery_min` bigint(20) DEFAULT NULL,
+  `recovery_max` bigint(20) DEFAULT NULL,
+  `sigma` double DEFAULT NULL,
+  `season` int(11) DEFAULT NULL,
   `source` enum('service','configuration') NOT NULL DEFAULT 'service',
   PRIMARY KEY (`id`),
   KEY `probe_service_id` (`probe_service_id`),
@@ -0,0 +1,105 @@
+-- Schema changes to apply on databases created by older version of create.sql.
+
+-- Last value index of readings.
+ALTER TABLE `readings`
+  ADD `last_timestamp` datetime DEFAULT NULL,
+  ADD `last_value` bigint(20) DEFAULT NULL;
+
+UPDATE `readings` r
+  JOIN (
+    SELECT v.`reading`, v.`datetime`, v.`value`
+    FROM `reading_values` v
+    JOIN (SELECT `reading`, MAX(`datetime`) AS `datetime` FROM `reading_values` GROUP BY `reading`) m
+      ON (m.`reading` = v.`reading` AND m.`datetime` = v.`datetime`)
+  ) l ON (l.`reading` = r.`id`)
+  SET r.`last_timestamp` = l.`datetime`, r.`last_value` = l.`value`;
+
+-- Service status counters.
+CREATE TABLE `probe_status_counters` (
+  `probe_id` int(11) NOT NULL,
+  `service_status_id` int(11) NOT NULL,
+  `count` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`probe_id`,`service_status_id`),
+  KEY `service_status_id` (`service_status_id`),
+  CONSTRAINT `probe_status_counters_ibfk_1` FOREIGN KEY (`probe_id`) REFERENCES `probes` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `probe_status_counters_ibfk_2` FOREIGN KEY (`service_status_id`) REFERENCES `service_status` (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+INSERT INTO `probe_status_counters` (`probe_id`, `service_status_id`, `count`)
+  SELECT s.`probe_id`, m.`current_status`, COUNT(*)
+  FROM `mapped_services` m
+  JOIN `probe_services` s ON (s.`id` = m.`probe_service_id`)
+  WHERE m.`current_status` IS NOT NULL
+  GROUP BY s.`probe_id`, m.`current_status`;
+
+-- Status hysteresis.
+ALTER TABLE `mapped_services`
+  ADD `pending_status` int(11) DEFAULT NULL,
+  ADD `pending_count` int(11) NOT NULL DEFAULT '0',
+  ADD CONSTRAINT `mapped_services_ibfk_5` FOREIGN KEY (`pending_status`) REFERENCES `service_status` (`id`);
+
+ALTER TABLE `service_thresholds`
+  ADD `recovery_min` bigint(20) DEFAULT NULL,
+  ADD `recovery_max` bigint(20) DEFAULT NULL;
+
+-- Staleness detection.
+ALTER TABLE `probes`
+  ADD `last_seen` datetime DEFAULT NULL;
+
+ALTER TABLE `mapped_services`
+  ADD `last_seen` datetime DEFAULT NULL,
+  ADD `stale` tinyint(1) NOT NULL DEFAULT '0',
+  ADD KEY `last_seen` (`last_seen`);
+
+-- Reading types and derived rates.
+CREATE TABLE `service_readings` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `probe_service_id` int(11) NOT NULL,
+  `reading` varchar(255) NOT NULL,
+  `type` enum('gauge','counter','derive') NOT NULL DEFAULT 'gauge',
+  `counter_max` bigint(20) DEFAULT NULL,
+  `scale` int(11) NOT NULL DEFAULT '1',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `probe_service_id_reading` (`probe_service_id`,`reading`),
+  CONSTRAINT `service_readings_ibfk_1` FOREIGN KEY (`probe_service_id`) REFERENCES `probe_services` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Hourly quantile sketches of readings. The sketch rollup job fills them also for existing values, in chunks.
+CREATE TABLE `reading_sketches` (
+  `reading` int(10) unsigned NOT NULL,
+  `hour` datetime NOT NULL,
+  `count` bigint(20) NOT NULL,
+  `sketch` blob NOT NULL,
+  `last_value_id` bigint(20) unsigned NOT NULL,
+  PRIMARY KEY (`reading`,`hour`),
+  KEY `last_value_id` (`last_value_id`),
+  CONSTRAINT `reading_sketches_ibfk_1` FOREIGN KEY (`reading`) REFERENCES `readings` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+-- Progress of the sketch rollup job, shared by all server processes.
+CREATE TABLE `job_watermarks` (
+  `name` varchar(64) NOT NULL,
+  `value` bigint(20) unsigned NOT NULL,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
+
+INSERT INTO `job_watermarks` (`name`, `value`)
+  SELECT 'sketch_rollup', COALESCE(MAX(`last_value_id`), 0) FROM `reading_sketches`;
+
+-- Adaptive thresholds. Min and max can be null, as the API already allowed.
+ALTER TABLE `service_thresholds`
+  MODIFY `min` bigint(20) DEFAULT NULL,
+  MODIFY `max` bigint(20) DEFAULT NULL,
+  ADD `sigma` double DEFAULT NULL,
+  ADD `season` int(11) DEFAULT NULL;
+
+CREATE TABLE `reading_baselines` (
+  `reading` int(10) unsigned NOT NULL,
+  `season` int(11) NOT NULL DEFAULT '0',
+  `slot` int(11) NOT NULL DEFAULT '0',
+  `mean` double NOT NULL,
+  `variance` double NOT NULL,
+  `count` bigint(20) NOT NULL,
+  PRIMARY KEY (`reading`,`season`,`slot`),
+  CONSTRAINT `reading_baselines_ibfk_1` FOREIGN KEY (`reading`) REFERENCES `readings` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8;
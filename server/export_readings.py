@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Export reading history from the API (/export/) to a file. The export is streamed to the file as it arrives. Interrupted
+export can be continued by --resume, which removes incomplete value at the end of the file and asks the API to
+continue after the last complete one:
+
+    ./export_readings.py --api http://mon:5000/api/v1/ --probe web1 --from 2020-01-01 --to 2020-04-01 web1.csv
+    ./export_readings.py --api http://mon:5000/api/v1/ --probe web1 --from 2020-01-01 --to 2020-04-01 web1.csv --resume
+
+Use the same selection of values when resuming.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from time import monotonic
+from urllib.parse import urljoin
+
+import requests
+
+from lib.export import EXPORT_FORMATS, resume_point
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("output", help="Output file.")
+    parser.add_argument("--api", default="http://localhost:5000/api/v1/", help="Address of the API.")
+    parser.add_argument("--probe", action="append", default=[], help="Probe name, can be repeated. Default all.")
+    parser.add_argument("--service", action="append", type=int, default=[],
+                        help="Mapped service ID, can be repeated. Default all services of the probes.")
+    parser.add_argument("--reading", action="append", default=[],
+                        help="Reading name pattern (fnmatch-like), can be repeated. Default all.")
+    parser.add_argument("--from", dest="time_from", help="Start of time range. Default is the oldest value.")
+    parser.add_argument("--to", dest="time_to", help="End of time range (exclusive). Default is now.")
+    parser.add_argument("--format", default=None, choices=EXPORT_FORMATS,
+                        help="Export format. Default by extension of the output file (.ndjson, .monx), or csv.")
+    parser.add_argument("--resume", action="store_true", help="Continue interrupted export to the output file.")
+
+    args = parser.parse_args()
+
+    export_format = args.format
+    if export_format is None:
+        extension = os.path.splitext(args.output)[1].lower()
+        export_format = {".ndjson": "ndjson", ".jsonl": "ndjson", ".monx": "columnar"}.get(extension, "csv")
+
+    params = {
+        "probe": args.probe,
+        "service": args.service,
+        "reading": args.reading,
+        "format": export_format,
+    }
+    if args.time_from:
+        params["from"] = args.time_from
+    if args.time_to:
+        params["to"] = args.time_to
+
+    resumed = False
+    if args.resume and os.path.exists(args.output):
+        with open(args.output, "r+b") as f:
+            size, cursor = resume_point(f, export_format)
+            f.truncate(size)
+
+        if size > 0:
+            resumed = True
+            if cursor is not None:
+                params["cursor"] = cursor
+                print("Resuming after value %s." % (cursor, ), file=sys.stderr)
+
+    response = requests.get(urljoin(args.api if args.api.endswith("/") else args.api + "/", "export/"), params=params,
+                            stream=True)
+    if response.status_code != 200:
+        print("Export failed: %d %s" % (response.status_code, response.text), file=sys.stderr)
+        raise SystemExit(1)
+
+    start = monotonic()
+    reported = start
+    written = 0
+    lines = 0
+
+    # Resumed CSV export must not repeat the header line, columnar file gets another segment with its own header.
+    skip_header = resumed and export_format == "csv"
+
+    with open(args.output, "ab" if resumed else "wb") as f:
+        for data in response.iter_content(chunk_size=65536):
+            if skip_header:
+                newline = data.find(b"\n")
+                if newline < 0:
+                    continue
+                data = data[newline + 1:]
+                skip_header = False
+
+            f.write(data)
+            written += len(data)
+            if export_format != "columnar":
+                lines += data.count(b"\n")
+
+            now = monotonic()
+            if now - reported >= 1:
+                reported = now
+                print("%.1f MB%s, %.1f MB/s" % (
+                    written / 1e6, ", %d lines" % (lines, ) if export_format != "columnar" else "",
+                    written / 1e6 / (now - start)
+                ), file=sys.stderr)
+
+    elapsed = monotonic() - start
+    print("Done: %.1f MB%s in %.1f s." % (
+        written / 1e6, ", %d lines" % (lines, ) if export_format != "columnar" else "", elapsed
+    ), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
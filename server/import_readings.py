@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Import historical reading values from a file through the API (/import/). Values are not evaluated against thresholds.
+Accepts CSV with header line and NDJSON, each value with columns service (mapped service ID), reading, timestamp and
+value, and also files exported by export_readings.py (including the columnar format):
+
+    ./import_readings.py --api http://mon:5000/api/v1/ history.csv
+
+The file is sent by requests of --batch values, each is imported by the server in one transaction. When the import
+fails, it prints number of values of the requests that were imported; use it as --skip to continue.
+"""
+
+import csv
+import io
+import os
+import sys
+from argparse import ArgumentParser
+from contextlib import closing
+from itertools import islice
+from time import monotonic
+from typing import Iterator
+from urllib.parse import urljoin
+
+import requests
+
+from lib.export import IMPORT_COLUMNS, read_columnar
+
+
+def columnar_lines(path: str) -> Iterator[str]:
+    """
+    Convert columnar export file to CSV lines with header.
+    """
+    yield ",".join(IMPORT_COLUMNS) + "\r\n"
+
+    with open(path, "rb") as f:
+        for readings, block in read_columnar(f):
+            output = io.StringIO()
+            writer = csv.writer(output)
+            for reading_id, timestamp, value in zip(block["reading_id"].tolist(),
+                                                    block["timestamp"].astype("datetime64[s]").astype(str).tolist(),
+                                                    block["value"].tolist()):
+                _, service, reading = readings[reading_id]
+                writer.writerow((service, reading, timestamp, value))
+
+            output.seek(0)
+            yield from output
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("input", help="Input file.")
+    parser.add_argument("--api", default="http://localhost:5000/api/v1/", help="Address of the API.")
+    parser.add_argument("--format", default=None, choices=("csv", "ndjson", "columnar"),
+                        help="Input format. Default by extension of the input file (.ndjson, .monx), or csv.")
+    parser.add_argument("--batch", type=int, default=100000, help="Number of values sent by one request.")
+    parser.add_argument("--skip", type=int, default=0, help="Number of values to skip (already imported).")
+
+    args = parser.parse_args()
+
+    input_format = args.format
+    if input_format is None:
+        extension = os.path.splitext(args.input)[1].lower()
+        input_format = {".ndjson": "ndjson", ".jsonl": "ndjson", ".monx": "columnar"}.get(extension, "csv")
+
+    if input_format == "columnar":
+        send_format = "csv"
+        with closing(columnar_lines(args.input)) as lines:
+            import_lines(lines, args, send_format)
+    else:
+        send_format = input_format
+        with open(args.input, "r", encoding="utf-8", newline="") as lines:
+            import_lines(lines, args, send_format)
+
+
+def import_lines(lines: Iterator[str], args, send_format: str) -> None:
+    """
+    Send lines of the input to the API in batches.
+    :param lines: Lines of the input, in send_format.
+    :param args: Parsed command line arguments.
+    :param send_format: Format sent to the API, csv or ndjson.
+    """
+    # CSV header is sent with every request. Values are assumed to be one per line, which is what the export writes.
+    header = [next(lines, "")] if send_format == "csv" else []
+    lines = (line for line in lines if line.strip())
+
+    url = urljoin(args.api if args.api.endswith("/") else args.api + "/", "import/")
+    content_type = "text/csv" if send_format == "csv" else "application/x-ndjson"
+
+    for _ in islice(lines, args.skip):
+        pass
+
+    start = monotonic()
+    done = args.skip
+    imported = 0
+    rejected = 0
+    created = 0
+
+    while True:
+        batch = list(islice(lines, args.batch))
+        if not batch:
+            break
+
+        response = requests.post(url, params={"format": send_format},
+                                 data=(line.encode("utf-8") for line in header + batch),
+                                 headers={"Content-Type": content_type})
+        if response.status_code != 200:
+            print("Import failed, values of the failed request were not imported: %d %s" % (
+                response.status_code, response.text), file=sys.stderr)
+            print("Continue by --skip %d." % (done, ), file=sys.stderr)
+            raise SystemExit(1)
+
+        result = response.json()
+        done += len(batch)
+        imported += result["imported"]
+        rejected += result["rejected"]
+        created += result["created"]
+
+        elapsed = monotonic() - start
+        print("%d values done, %d imported, %d rejected, %d readings created, %.0f values/s (server %.0f values/s)" % (
+            done, imported, rejected, created, (done - args.skip) / elapsed if elapsed else 0, result["rows_per_second"]
+        ), file=sys.stderr)
+
+    print("Done: %d values imported, %d rejected in %.1f s." % (imported, rejected, monotonic() - start),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
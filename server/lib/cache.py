@@ -0,0 +1,92 @@
+"""
+In-memory caches.
+"""
+
+import multiprocessing
+from threading import Lock
+from time import monotonic
+from typing import Callable, Hashable
+
+from lib.stats import stats
+
+
+class TTLCache:
+    """
+    Cache of values with limited time to live. Cached values are kept in memory of each process, but invalidation and
+    hit/miss counters live in shared memory, so invalidation done by one worker process is seen by all workers forked
+    after the cache was created, and the statistics cover all of them.
+    """
+    def __init__(self, name: str, ttl: float):
+        """
+        :param name: Name of the cache, used for statistics.
+        :param ttl: Number of seconds the value stays in cache.
+        """
+        self.name = name
+        self.ttl = ttl
+
+        # key -> (generation, expires, value)
+        self._entries = {}
+        self._lock = Lock()
+
+        self._generation = multiprocessing.Value("Q", 0)
+        self._hits = multiprocessing.Value("Q", 0)
+        self._misses = multiprocessing.Value("Q", 0)
+
+        stats.register("cache.%s" % (name, ), self.stats)
+
+    def get(self, key: Hashable, loader: Callable[[], any]) -> any:
+        """
+        Return cached value, or load it when it is not cached, has expired or the cache was invalidated.
+        :param key: Key of the value.
+        :param loader: Function returning current value.
+        :return: Value.
+        """
+        # Remember generation before loading, so invalidation during load causes next get to load again.
+        generation = self._generation.value
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == generation and entry[1] > monotonic():
+            self._increment(self._hits)
+            return entry[2]
+
+        self._increment(self._misses)
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (generation, monotonic() + self.ttl, value)
+
+        return value
+
+    def invalidate(self) -> None:
+        """
+        Invalidate all values in all processes.
+        """
+        self._increment(self._generation)
+
+        with self._lock:
+            self._entries = {}
+
+    def stats(self) -> dict:
+        """
+        Return cache statistics.
+        """
+        hits = self._hits.value
+        misses = self._misses.value
+
+        return {
+            "ttl": self.ttl,
+            "entries": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "miss_rate": misses / (hits + misses) if hits + misses else 0.0,
+            "invalidations": self._generation.value
+        }
+
+    @staticmethod
+    def _increment(counter: multiprocessing.Value) -> None:
+        """
+        Atomically increment shared counter.
+        """
+        with counter.get_lock():
+            counter.value += 1
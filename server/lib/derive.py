@@ -0,0 +1,50 @@
+"""
+Rates derived from counter readings.
+"""
+
+from datetime import datetime
+
+
+# Types of readings declared by services. Gauge is stored as is, counter and derive also produce per-second rate.
+READING_TYPES = ("gauge", "counter", "derive")
+
+# Counters without declared maximum are assumed to wrap at 32 bits, values above that are 64 bit and never wrap
+# before the value overflows the database column.
+DEFAULT_COUNTER_MAX = 2 ** 32 - 1
+
+
+def rate(reading_type: str, previous_timestamp: datetime, previous_value: int, timestamp: datetime, value: int,
+         counter_max: int=None) -> float:
+    """
+    Per-second rate between two samples of a reading.
+
+    Derive is plain difference, which can be negative. Counter only grows: when it decreases, it either wrapped around
+    its maximum, or was reset (device restart). Wrap is assumed when the previous value was in the upper half of the
+    counter range, otherwise the counter was reset and the rate is unknown, as the value before the reset is lost.
+    :param reading_type: Type of reading, one of READING_TYPES.
+    :param previous_timestamp: Time of previous sample.
+    :param previous_value: Value of previous sample.
+    :param timestamp: Time of current sample.
+    :param value: Value of current sample.
+    :param counter_max: Maximum value of counter, after which it wraps to 0.
+    :return: Rate per second, or None when it cannot be computed.
+    """
+    if reading_type not in ("counter", "derive") or previous_timestamp is None or previous_value is None:
+        return None
+
+    seconds = (timestamp - previous_timestamp).total_seconds()
+    if seconds <= 0:
+        return None
+
+    delta = value - previous_value
+
+    if delta < 0 and reading_type == "counter":
+        if counter_max is None:
+            counter_max = DEFAULT_COUNTER_MAX
+
+        if value < 0 or previous_value > counter_max or previous_value <= counter_max // 2:
+            return None
+
+        delta += counter_max + 1
+
+    return delta / seconds
@@ -0,0 +1,236 @@
+"""
+Formats of bulk export and import of reading values.
+
+Each exported value has columns probe, service (mapped service ID), reading (name), reading_id, id (ID of the value),
+timestamp and value. Values are ordered by reading_id and id, so the export can be resumed after any value by cursor
+"<reading_id>-<id>" of that value.
+
+Formats:
+    csv      Header line and one line per value.
+    ndjson   One JSON object per line.
+    columnar Binary file: magic "MONX1\\n", one line of JSON with names of readings
+             ({"readings": {reading_id: [probe, service, reading]}}), and blocks of values. Each block is
+             struct BLOCK_HEADER (number of values, length of data) followed by zlib compressed little-endian arrays
+             reading_id (int32), id (int64), timestamp (int64, UNIX seconds) and value (int64), one after another.
+             Resumed export is appended to the file as another segment with its own magic and names of readings.
+
+Import accepts csv and ndjson with columns service, reading, timestamp and value (other columns are ignored, so
+exported files can be imported back).
+"""
+
+import csv
+import io
+import json
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+EXPORT_FORMATS = ("csv", "ndjson", "columnar")
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+IMPORT_COLUMNS = ("service", "reading", "timestamp", "value")
+
+COLUMNS = ("probe", "service", "reading", "reading_id", "id", "timestamp", "value")
+
+MIMETYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "columnar": "application/octet-stream",
+}
+
+COLUMNAR_MAGIC = b"MONX1\n"
+BLOCK_HEADER = struct.Struct("<IQ")
+
+
+def encode_cursor(reading_id: int, value_id: int) -> str:
+    """
+    Cursor to resume export after given value.
+    """
+    return "%d-%d" % (reading_id, value_id)
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    Parse cursor created by encode_cursor().
+    :raise ValueError: When the cursor is not valid.
+    """
+    try:
+        reading_id, value_id = cursor.split("-")
+        return int(reading_id), int(value_id)
+    except ValueError:
+        raise ValueError("Invalid cursor '%s'." % (cursor, ))
+
+
+class ExportWriter:
+    """
+    Converts chunks of values to the export format.
+    """
+    def __init__(self, export_format: str, readings: Dict[int, Tuple[str, int, str]]):
+        """
+        :param export_format: One of EXPORT_FORMATS.
+        :param readings: Names of exported readings: reading_id -> (probe name, mapped service ID, reading name).
+        """
+        self.format = export_format
+        self.readings = readings
+
+    def header(self) -> bytes:
+        if self.format == "csv":
+            return (",".join(COLUMNS) + "\r\n").encode("utf-8")
+
+        if self.format == "columnar":
+            return COLUMNAR_MAGIC + (json.dumps({
+                "readings": {str(reading_id): list(names) for reading_id, names in self.readings.items()}
+            }) + "\n").encode("utf-8")
+
+        return b""
+
+    def chunk(self, rows: List[tuple]) -> bytes:
+        """
+        Convert chunk of values.
+        :param rows: List of (reading_id, id, datetime, value) tuples.
+        """
+        if self.format == "columnar":
+            reading_ids = np.fromiter((row[0] for row in rows), dtype="<i4", count=len(rows))
+            ids = np.fromiter((row[1] for row in rows), dtype="<i8", count=len(rows))
+            timestamps = np.array([row[2] for row in rows], dtype="datetime64[s]").astype("<i8")
+            values = np.fromiter((row[3] for row in rows), dtype="<i8", count=len(rows))
+
+            data = zlib.compress(reading_ids.tobytes() + ids.tobytes() + timestamps.tobytes() + values.tobytes())
+            return BLOCK_HEADER.pack(len(rows), len(data)) + data
+
+        if self.format == "csv":
+            output = io.StringIO()
+            writer = csv.writer(output)
+            for reading_id, value_id, timestamp, value in rows:
+                probe, service, reading = self.readings[reading_id]
+                writer.writerow((probe, service, reading, reading_id, value_id, timestamp.isoformat(), value))
+            return output.getvalue().encode("utf-8")
+
+        lines = []
+        for reading_id, value_id, timestamp, value in rows:
+            probe, service, reading = self.readings[reading_id]
+            lines.append(json.dumps({
+                "probe": probe,
+                "service": service,
+                "reading": reading,
+                "reading_id": reading_id,
+                "id": value_id,
+                "timestamp": timestamp.isoformat(),
+                "value": value
+            }))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def read_columnar(stream: BinaryIO) -> Iterator[Tuple[Dict[int, list], Dict[str, np.ndarray]]]:
+    """
+    Read file in columnar format.
+    :param stream: Binary file object.
+    :return: Iterator of (readings, block) tuples, where readings are names of readings from the header of current
+        segment (reading_id -> [probe, service, reading]), and block is dict with arrays reading_id, id, timestamp
+        and value.
+    """
+    if stream.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar export file.")
+
+    readings = {int(reading_id): names for reading_id, names in json.loads(stream.readline())["readings"].items()}
+
+    while True:
+        header = stream.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            return
+
+        # Next segment of resumed export.
+        if header.startswith(COLUMNAR_MAGIC):
+            stream.seek(len(COLUMNAR_MAGIC) - BLOCK_HEADER.size, io.SEEK_CUR)
+            readings = {
+                int(reading_id): names for reading_id, names in json.loads(stream.readline())["readings"].items()
+            }
+            continue
+
+        count, length = BLOCK_HEADER.unpack(header)
+        yield readings, decode_block(zlib.decompress(stream.read(length)), count)
+
+
+def decode_block(data: bytes, count: int) -> Dict[str, np.ndarray]:
+    """
+    Split decompressed data of block in columnar format to arrays.
+    """
+    block = {}
+    offset = 0
+    for name, dtype in (("reading_id", "<i4"), ("id", "<i8"), ("timestamp", "<i8"), ("value", "<i8")):
+        block[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += count * block[name].itemsize
+
+    return block
+
+
+def resume_point(stream: BinaryIO, export_format: str) -> Tuple[int, Optional[str]]:
+    """
+    Find where interrupted export should continue.
+    :param stream: Binary file object with the exported data, opened for reading.
+    :param export_format: Format of the file.
+    :return: Tuple (size, cursor): size of the file without incomplete value at its end, and cursor of the last
+        complete value (None when the file contains no values).
+    """
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+
+    if export_format == "columnar":
+        stream.seek(0)
+        if stream.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            return 0, None
+        stream.readline()
+
+        end = stream.tell()
+        cursor = None
+        while True:
+            header = stream.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return end, cursor
+
+            if header.startswith(COLUMNAR_MAGIC):
+                stream.seek(len(COLUMNAR_MAGIC) - BLOCK_HEADER.size, io.SEEK_CUR)
+                line = stream.readline()
+                if not line.endswith(b"\n"):
+                    return end, cursor
+                end = stream.tell()
+                continue
+
+            count, length = BLOCK_HEADER.unpack(header)
+            data = stream.read(length)
+            if len(data) < length:
+                return end, cursor
+
+            block = decode_block(zlib.decompress(data), count)
+            end = stream.tell()
+            cursor = encode_cursor(int(block["reading_id"][-1]), int(block["id"][-1]))
+
+    # Text formats: look for the last complete line from the end of file.
+    window = 65536
+    while True:
+        start = max(0, size - window)
+        stream.seek(start)
+        data = stream.read(size - start)
+
+        end = data.rfind(b"\n")
+        previous = data.rfind(b"\n", 0, end) if end >= 0 else -1
+        if previous >= 0 or start == 0:
+            break
+        window *= 2
+
+    if end < 0:
+        return 0, None
+
+    line = data[previous + 1:end].decode("utf-8")
+    if export_format == "csv":
+        row = next(csv.reader([line]))
+        if row == list(COLUMNS):
+            return start + end + 1, None
+        return start + end + 1, encode_cursor(int(row[3]), int(row[4]))
+
+    row = json.loads(line)
+    return start + end + 1, encode_cursor(row["reading_id"], row["id"])
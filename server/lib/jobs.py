@@ -0,0 +1,130 @@
+"""
+Periodic background jobs.
+"""
+
+import logging
+import os
+import signal
+from threading import Event, Thread
+from typing import Callable, List, Optional
+
+
+class PeriodicJob(Thread):
+    """
+    Daemon thread that calls function every `interval` seconds. Exceptions thrown by the function are logged and the
+    job continues with next period.
+    """
+    def __init__(self, name: str, interval: float, function: Callable[[], None]):
+        """
+        :param name: Name of job for logging.
+        :param interval: Number of seconds between two runs.
+        :param function: Function to call.
+        """
+        super(PeriodicJob, self).__init__(name=name, daemon=True)
+        self.interval = interval
+        self.function = function
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                logging.debug("Running job %s." % (self.name, ))
+                self.function()
+            except Exception as e:
+                logging.exception("Job %s failed with exception %r" % (self.name, e))
+
+    def stop(self) -> None:
+        """
+        Stop the job after current run finishes.
+        """
+        self.stopped.set()
+
+
+class Jobs:
+    """
+    Registry of periodic jobs.
+    """
+    def __init__(self):
+        self.jobs = []  # type: List[PeriodicJob]
+
+        # PID of the process running the jobs, when started by start_process().
+        self.pid = None  # type: Optional[int]
+
+    def add(self, name: str, interval: float, function: Callable[[], None]) -> None:
+        """
+        Register new job. Jobs with interval <= 0 are disabled.
+        :param name: Name of job.
+        :param interval: Number of seconds between two runs.
+        :param function: Function to call.
+        """
+        if interval > 0:
+            self.jobs.append(PeriodicJob(name, interval, function))
+        else:
+            logging.info("Job %s is disabled." % (name, ))
+
+    def start(self) -> None:
+        """
+        Start all registered jobs.
+        """
+        for job in self.jobs:
+            logging.info("Starting job %s with interval %.0f s." % (job.name, job.interval))
+            job.start()
+
+    def stop(self) -> None:
+        """
+        Stop all registered jobs.
+        """
+        for job in self.jobs:
+            job.stop()
+
+    def start_process(self) -> None:
+        """
+        Run all registered jobs in a child process, which runs until it gets SIGTERM or SIGINT. The calling process
+        stays without job threads, so it can safely fork other processes (a thread holding a lock at the time of fork
+        would leave the lock locked forever in the forked process).
+        """
+        pid = os.fork()
+        if pid:
+            self.pid = pid
+            logging.info("Started job process %d." % (pid, ))
+            return
+
+        # Child process: replace signal handlers inherited from the parent (Gunicorn master, ...).
+        stopped = Event()
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT):
+            signal.signal(sig, lambda *_: stopped.set())
+        for sig in (signal.SIGHUP, signal.SIGUSR1, signal.SIGUSR2, signal.SIGTTIN, signal.SIGTTOU, signal.SIGWINCH):
+            signal.signal(sig, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        code = 0
+        try:
+            self.start()
+
+            # Wait with timeout, so the signal handlers get to run.
+            while not stopped.wait(1):
+                pass
+
+            self.stop()
+        except BaseException as e:
+            logging.exception("Job process failed with exception %r" % (e, ))
+            code = 1
+        finally:
+            os._exit(code)
+
+    def stop_process(self) -> None:
+        """
+        Stop the process started by start_process().
+        """
+        if self.pid is None:
+            return
+
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+        self.pid = None
+
+
+jobs = Jobs()
@@ -0,0 +1,118 @@
+import json as jsonlib
+from flask import Flask, request
+from flask_restful.utils import unpack
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import BaseResponse
+
+from lib.client import Client, ApiError
+
+
+class LocalClient(Client):
+    """
+    Mon API Client calling the API resources of the same Flask application directly, without HTTP round trip. Each call
+    runs in its own request context, so the resources see the same request as if they were called over HTTP, but the
+    Python values returned by the resources are passed back without JSON serialization.
+    """
+
+    def __init__(self, app: Flask, api_root: str):
+        """
+        :param app: Flask application with registered API.
+        :param api_root: Path where the API is mounted in the application.
+        """
+        super(LocalClient, self).__init__(api_root)
+        self.app = app
+
+    def get(self, method: str, params: dict=None) -> any:
+        """
+        Performs GET request to the API.
+        :param method: Method to call
+        :param params: Optional params to pass as query string.
+        :return: Passes data returned by API.
+        """
+        return self._dispatch("GET", method, params=params)
+
+    def post(self, method: str, json: any=None) -> any:
+        """
+        Performs POST request to the API.
+        :param method: Method to call
+        :param json: Optional data to pass as JSON payload.
+        :return: Passes data returned by API.
+        """
+        return self._dispatch("POST", method, json=json)
+
+    def put(self, method: str, json: any=None) -> any:
+        """
+        Performs PUT request to the API.
+        :param method: Method to call
+        :param json: Optional data to pass as JSON payload.
+        :return: Passes data returned by API.
+        """
+        return self._dispatch("PUT", method, json=json)
+
+    def patch(self, method: str, json: any=None) -> any:
+        """
+        Performs PATCH request to the API.
+        :param method: Method to call
+        :param json: Optional data to pass as JSON payload.
+        :return: Passes data returned by API.
+        """
+        return self._dispatch("PATCH", method, json=json)
+
+    def delete(self, method: str, params: dict=None) -> any:
+        """
+        Performs DELETE request to the API.
+        :param method: Method to call
+        :param params: Optional params to pass as query string.
+        :return: Passes data returned by API.
+        """
+        return self._dispatch("DELETE", method, params=params)
+
+    def _dispatch(self, http_method: str, method: str, params: dict=None, json: any=None) -> any:
+        """
+        Find resource handling the method and call it in new request context.
+        :param http_method: HTTP method name.
+        :param method: API method relative to api root.
+        :param params: Optional params to pass as query string.
+        :param json: Optional data to pass as JSON payload.
+        :return: Data returned by API or throws ApiError.
+        """
+        kwargs = {}
+        if json is not None:
+            kwargs["data"] = jsonlib.dumps(json)
+            kwargs["content_type"] = "application/json"
+
+        with self.app.test_request_context(self._api_url(method), method=http_method, query_string=params, **kwargs):
+            if request.routing_exception is not None:
+                raise ApiError(http_method, method, getattr(request.routing_exception, "code", 500),
+                               str(request.routing_exception))
+
+            view = self.app.view_functions[request.url_rule.endpoint]
+            resource_class = getattr(view, "view_class", None)
+            if resource_class is None:
+                raise ApiError(http_method, method, 404, "Not an API resource.")
+
+            resource = resource_class()
+            handler = getattr(resource, http_method.lower(), None)
+            if handler is None:
+                raise ApiError(http_method, method, 405, "Method not allowed.")
+
+            # Same as flask_restful.Resource.dispatch_request, without the output serialization.
+            for decorator in resource.method_decorators:
+                handler = decorator(handler)
+
+            try:
+                response = handler(**request.view_args)
+            except HTTPException as e:
+                raise ApiError(http_method, method, e.code, e.description)
+
+            if isinstance(response, BaseResponse):
+                # Streamed responses are consumed here, while the request context still exists.
+                data = jsonlib.loads(response.get_data(as_text=True))
+                status = response.status_code
+            else:
+                data, status, _ = unpack(response)
+
+        if status != 200:
+            raise ApiError(http_method, method, status, data)
+
+        return data
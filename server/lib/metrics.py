@@ -0,0 +1,147 @@
+"""
+Prometheus metrics of the server, exported in text format on /metrics.
+
+When [metrics] MultiprocessDir is set, each worker process writes its metrics to files in that directory and /metrics
+aggregates them, so the counters are correct no matter which worker serves the scrape. The directory must be set
+before prometheus_client is imported, which is why config is imported first.
+"""
+
+import os
+import shutil
+from time import perf_counter
+
+from config import config
+
+from flask import Response
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+REQUEST_LATENCY = Histogram(
+    "mon_api_request_duration_seconds", "Duration of API requests.", ["resource", "method", "status"]
+)
+
+SQL_STATEMENTS = Counter(
+    "mon_sql_statements_total", "Number of executed SQL statements.", ["operation"]
+)
+
+SQL_DURATION = Histogram(
+    "mon_sql_statement_duration_seconds", "Duration of SQL statements.", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+READINGS_ACCEPTED = Counter(
+    "mon_readings_accepted_total", "Number of reading values stored."
+)
+
+READINGS_DERIVED = Counter(
+    "mon_readings_derived_total", "Number of rate values derived from counter readings."
+)
+
+READINGS_IMPORTED = Counter(
+    "mon_readings_imported_total", "Number of historical reading values loaded by bulk import."
+)
+
+READINGS_REJECTED = Counter(
+    "mon_readings_rejected_total", "Number of reading values rejected.", ["reason"]
+)
+
+STATUS_TRANSITIONS = Counter(
+    "mon_status_transitions_total", "Number of service status changes caused by readings.", ["from_status", "to_status"]
+)
+
+THRESHOLD_EVALUATION = Histogram(
+    "mon_threshold_evaluation_seconds", "Time spent evaluating thresholds of one ingest request.",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+NOTIFICATIONS = Counter(
+    "mon_notifications_total", "Number of status change notifications by target and result.", ["target", "result"]
+)
+
+
+def reset() -> None:
+    """
+    Remove metrics of previous server run from multiprocess directory. Call once when the server starts, before
+    workers are started.
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def process_exited(pid: int) -> None:
+    """
+    Remove live gauges of worker process that exited.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
+
+
+def export() -> Response:
+    """
+    Flask view returning metrics in Prometheus text format.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def measure_request(method):
+    """
+    Resource method decorator measuring duration of API requests.
+    :param method: Method to wrap.
+    :return: Wrapper that measures the method.
+    """
+    resource, _, http_method = method.__qualname__.rpartition(".")
+
+    def wrapper(*args, **kwargs):
+        """
+        Wrapper that records duration and status of the request.
+        """
+        start = perf_counter()
+        response = method(*args, **kwargs)
+
+        if isinstance(response, tuple):
+            status = response[1]
+        else:
+            status = getattr(response, "status_code", 200)
+
+        REQUEST_LATENCY.labels(resource, http_method, status).observe(perf_counter() - start)
+        return response
+    return wrapper
+
+
+# Statement types counted separately, others are counted as OTHER.
+SQL_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "BEGIN", "COMMIT", "ROLLBACK")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["query_start"].pop()
+
+    operation = statement.lstrip()[:8].split(None, 1)[0].upper() if statement.strip() else ""
+    if operation not in SQL_OPERATIONS:
+        operation = "OTHER"
+
+    SQL_STATEMENTS.labels(operation).inc()
+    SQL_DURATION.labels(operation).observe(elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # Failed statement does not reach after_cursor_execute.
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
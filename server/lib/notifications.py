@@ -0,0 +1,313 @@
+"""
+Notifications of service status changes.
+
+Readings.put puts status transitions to an in-process queue, which never blocks the request (when the queue is full,
+the event is dropped and counted). Dispatcher thread takes the events from the queue, drops duplicates and collects
+them to batches of each target configured in [notifications] Targets. Batch is sent when it is full or old enough and
+the target's rate limit allows, by a pool of worker threads that retry failed deliveries. Rate limited target does not
+lose events, they are just sent in larger batches.
+
+Each server process has its own queue and dispatcher, started on first event, so deduplication and rate limits are per
+process.
+
+Target is configured in [notification:<name>] section:
+
+    Type       webhook (POST JSON {"events": [...]} to Url), script (run Command with the JSON on stdin) or email
+               (send the events as text from From to To through SmtpHost).
+    Statuses   Comma separated new statuses that are notified (ok, warning, error, critical, none), default all.
+    BatchSize  Maximum number of events in one message.
+    BatchDelay Seconds to wait for more events before the batch is sent.
+    RateLimit  Maximum number of messages per minute, 0 for no limit.
+    Retries    Number of retries of failed delivery, RetryDelay seconds before the first retry, doubling with each next.
+    Timeout    Seconds to wait for the target.
+"""
+
+import atexit
+import json
+import logging
+import os
+import smtplib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from queue import Queue, Empty, Full
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Dict, List
+
+import requests
+
+from config import config
+from lib.metrics import NOTIFICATIONS
+
+
+class Target:
+    """
+    Destination of notifications, with its batch of events waiting to be sent.
+    """
+    def __init__(self, name: str, section):
+        """
+        :param name: Name of target.
+        :param section: Configuration of the target.
+        """
+        self.name = name
+        self.statuses = set(status.strip() for status in section.get("Statuses", "").split(",") if status.strip())
+        self.batch_size = section.getint("BatchSize", 50)
+        self.batch_delay = section.getfloat("BatchDelay", 5.0)
+        self.rate_limit = section.getfloat("RateLimit", 0)
+        self.retries = section.getint("Retries", 3)
+        self.retry_delay = section.getfloat("RetryDelay", 1.0)
+        self.timeout = section.getfloat("Timeout", 10.0)
+
+        self.batch = []
+        self.deadline = None
+
+        # Token bucket of the rate limit, allowing bursts of up to one minute worth of messages.
+        self.tokens = self.rate_limit
+        self.refilled = monotonic()
+
+    def accepts(self, event: dict) -> bool:
+        """
+        Whether the event should be sent to this target.
+        """
+        return not self.statuses or (event["to"] or "none") in self.statuses
+
+    def add(self, event: dict) -> None:
+        if not self.batch:
+            self.deadline = monotonic() + self.batch_delay
+        self.batch.append(event)
+
+    def ready(self) -> bool:
+        """
+        Whether the batch should be sent now. Takes token of the rate limit when it should.
+        """
+        if not self.batch or (len(self.batch) < self.batch_size and monotonic() < self.deadline):
+            return False
+
+        if self.rate_limit > 0:
+            self.refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+
+        return True
+
+    def refill(self) -> None:
+        """
+        Add tokens of the rate limit for the time since last refill.
+        """
+        now = monotonic()
+        self.tokens = min(self.rate_limit, self.tokens + (now - self.refilled) * self.rate_limit / 60)
+        self.refilled = now
+
+    def take(self) -> List[dict]:
+        """
+        Remove one message worth of events from the batch.
+        """
+        batch, self.batch = self.batch[:self.batch_size], self.batch[self.batch_size:]
+        if self.batch:
+            self.deadline = monotonic()
+        return batch
+
+    def wait_time(self) -> float:
+        """
+        Seconds until the batch can be sent, None when it is empty.
+        """
+        if not self.batch:
+            return None
+
+        wait = 0.0 if len(self.batch) >= self.batch_size else self.deadline - monotonic()
+        if self.rate_limit > 0:
+            self.refill()
+            if self.tokens < 1:
+                wait = max(wait, (1 - self.tokens) * 60 / self.rate_limit)
+
+        return max(0.0, wait)
+
+    def send(self, events: List[dict]) -> None:
+        """
+        Deliver the events. Raises exception when the delivery failed.
+        """
+        raise NotImplementedError()
+
+
+class WebhookTarget(Target):
+    def __init__(self, name: str, section):
+        super(WebhookTarget, self).__init__(name, section)
+        self.url = section["Url"]
+
+    def send(self, events: List[dict]) -> None:
+        requests.post(self.url, json={"events": events}, timeout=self.timeout).raise_for_status()
+
+
+class ScriptTarget(Target):
+    def __init__(self, name: str, section):
+        super(ScriptTarget, self).__init__(name, section)
+        self.command = section["Command"]
+
+    def send(self, events: List[dict]) -> None:
+        subprocess.run(self.command, shell=True, input=json.dumps({"events": events}).encode("utf-8"),
+                       timeout=self.timeout, check=True)
+
+
+class EmailTarget(Target):
+    def __init__(self, name: str, section):
+        super(EmailTarget, self).__init__(name, section)
+        self.smtp_host = section.get("SmtpHost", "localhost")
+        self.sender = section["From"]
+        self.recipients = section["To"]
+
+    def send(self, events: List[dict]) -> None:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = self.recipients
+        message["Subject"] = "[mon] %d service status change%s" % (len(events), "s" if len(events) > 1 else "")
+        message.set_content("\n".join(
+            "%s %s/%s: %s -> %s" % (event["timestamp"], event["probe"], event["service"], event["from"], event["to"])
+            for event in events
+        ))
+
+        with smtplib.SMTP(self.smtp_host, timeout=self.timeout) as smtp:
+            smtp.send_message(message)
+
+
+TARGET_TYPES = {
+    "webhook": WebhookTarget,
+    "script": ScriptTarget,
+    "email": EmailTarget,
+}
+
+
+class Notifier:
+    """
+    Queue of status change events and their dispatcher.
+    """
+    def __init__(self):
+        self.targets = []  # type: List[Target]
+
+        for name in config.cfg.get("notifications", "Targets", fallback="").replace(",", " ").split():
+            section = config.cfg["notification:%s" % (name, )]
+            target_type = section.get("Type", "webhook")
+            if target_type not in TARGET_TYPES:
+                raise ValueError("Invalid notification target Type '%s'. Must be one of %s."
+                                 % (target_type, ", ".join(sorted(TARGET_TYPES.keys()))))
+            self.targets.append(TARGET_TYPES[target_type](name, section))
+
+        self.queue_size = config.cfg.getint("notifications", "QueueSize", fallback=10000)
+        self.workers = config.cfg.getint("notifications", "Workers", fallback=4)
+        self.dedup_window = config.cfg.getfloat("notifications", "DedupWindow", fallback=300.0)
+
+        self.lock = Lock()
+        self.pid = None
+        self.queue = None
+        self.dispatcher = None
+        self.executor = None
+
+        # (target name, mapped service id, new status) -> time until the same event is considered duplicate.
+        self.recent = {}  # type: Dict[tuple, float]
+
+    def notify(self, event: dict) -> None:
+        """
+        Queue status change event. Never blocks.
+        :param event: Dict with probe, service_id, service, from, to and timestamp keys.
+        """
+        if not self.targets:
+            return
+
+        self.start()
+
+        try:
+            self.queue.put_nowait(event)
+        except Full:
+            NOTIFICATIONS.labels("", "dropped").inc()
+            logging.warning("Notification queue is full, dropping event %r." % (event, ))
+
+    def start(self) -> None:
+        """
+        Start dispatcher in current process, unless it is already running.
+        """
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+
+            self.pid = os.getpid()
+            self.queue = Queue(self.queue_size)
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            self.dispatcher = Thread(target=self.dispatch, name="notifications", daemon=True)
+            self.dispatcher.start()
+
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Send the waiting batches and stop the dispatcher.
+        """
+        if self.pid == os.getpid() and self.dispatcher.is_alive():
+            self.queue.put(None)
+            self.dispatcher.join()
+            self.executor.shutdown(wait=True)
+
+    def dispatch(self) -> None:
+        """
+        Dispatcher thread.
+        """
+        running = True
+        while running:
+            waits = [wait for wait in (target.wait_time() for target in self.targets) if wait is not None]
+
+            try:
+                event = self.queue.get(timeout=min(waits) if waits else None)
+                if event is None:
+                    running = False
+                else:
+                    self.add(event)
+            except Empty:
+                pass
+
+            for target in self.targets:
+                while target.ready() or (not running and target.batch):
+                    self.executor.submit(self.deliver, target, target.take())
+
+    def add(self, event: dict) -> None:
+        """
+        Add event to batches of the targets that accept it, unless it is a duplicate.
+        """
+        now = monotonic()
+
+        if len(self.recent) > self.queue_size:
+            self.recent = {key: until for key, until in self.recent.items() if until > now}
+
+        for target in self.targets:
+            if not target.accepts(event):
+                continue
+
+            key = (target.name, event["service_id"], event["to"])
+            if self.recent.get(key, 0) > now:
+                NOTIFICATIONS.labels(target.name, "deduplicated").inc()
+                continue
+
+            self.recent[key] = now + self.dedup_window
+            target.add(event)
+
+    @staticmethod
+    def deliver(target: Target, events: List[dict]) -> None:
+        """
+        Send the events to the target, with retries. Runs in worker thread.
+        """
+        for attempt in range(target.retries + 1):
+            try:
+                target.send(events)
+                NOTIFICATIONS.labels(target.name, "sent").inc(len(events))
+                return
+            except Exception as e:
+                logging.warning("Notification to %s failed (attempt %d of %d): %r"
+                                % (target.name, attempt + 1, target.retries + 1, e))
+
+                if attempt < target.retries:
+                    sleep(target.retry_delay * 2 ** attempt)
+
+        NOTIFICATIONS.labels(target.name, "failed").inc(len(events))
+        logging.error("Notification of %d events to %s failed." % (len(events), target.name))
+
+
+notifier = Notifier()
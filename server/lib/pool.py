@@ -0,0 +1,48 @@
+"""
+Database connection pool with statistics.
+"""
+
+import os
+from time import perf_counter
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+from lib.stats import Timer
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long the checkouts take (waiting for free connection, or opening new one) and counts
+    checkouts that timed out because the pool was exhausted.
+    """
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.wait_timer = Timer()
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.wait_timer.record(perf_counter() - start)
+
+    def stats(self) -> dict:
+        """
+        Return statistics of the pool. Each worker process has its own pool, so the statistics are of the process that
+        handled the request.
+        """
+        return {
+            "pid": os.getpid(),
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "timeouts": self.timeouts,
+            "checkout": self.wait_timer.stats()
+        }
@@ -0,0 +1,190 @@
+"""
+Opt-in profiler of HTTP requests and log of slow requests.
+
+Request is profiled when it carries the [profiler] Header (with value 1), or randomly with [profiler] SampleRate
+probability. Profiled request records every SQL statement with its duration and row count, and cProfile statistics of
+the Python code, and the response gets Server-Timing header with the totals. Profiled requests, and all requests that
+took longer than [profiler] SlowThreshold seconds, are written as one JSON object per line to [profiler] Log.
+
+Streamed responses (readings history, export) are measured until the whole body is sent, including the SQL statements
+run while streaming. Their headers are sent before the body, so they get only the log entry, without Server-Timing.
+"""
+
+import cProfile
+import json
+import logging
+import pstats
+import random
+from datetime import datetime
+from time import perf_counter
+from typing import Optional, Tuple
+
+from flask import Flask, Response, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import config
+
+
+class RequestProfiler:
+    """
+    Profiler of Flask requests.
+    """
+    def __init__(self):
+        self.header = config.cfg.get("profiler", "Header", fallback="X-Profile")
+        self.sample_rate = config.cfg.getfloat("profiler", "SampleRate", fallback=0.0)
+        self.slow_threshold = config.cfg.getfloat("profiler", "SlowThreshold", fallback=1.0)
+        self.top = config.cfg.getint("profiler", "Top", fallback=20)
+        self.max_statement_length = config.cfg.getint("profiler", "MaxStatementLength", fallback=1000)
+
+        self.log = logging.getLogger("mon.requests")
+        log_file = config.cfg.get("profiler", "Log", fallback="")
+        if log_file:
+            handler = logging.FileHandler(log_file)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.log.addHandler(handler)
+            self.log.propagate = False
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Register the profiler to the application.
+        """
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+        event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+        event.listen(Engine, "handle_error", self.handle_error)
+
+    def should_profile(self) -> bool:
+        """
+        Decide whether current request is profiled.
+        """
+        if self.header and request.headers.get(self.header) == "1":
+            return True
+
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def before_request(self) -> None:
+        g.request_start = perf_counter()
+
+        if self.should_profile():
+            g.profile_statements = []
+            g.profile = cProfile.Profile()
+            g.profile.enable()
+
+    def after_request(self, response: Response) -> Response:
+        start = g.pop("request_start", None)
+        if start is None:
+            return response
+
+        profile = g.get("profile")
+        statements = g.get("profile_statements")
+
+        entry = {
+            "time": datetime.now().isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "query": request.query_string.decode("utf-8", "replace"),
+            "status": response.status_code,
+        }
+
+        if response.is_streamed:
+            # Streamed body is generated after this, so the request is finished when the response is closed.
+            # Statements of the stream are recorded while it runs, as profile_statements are kept in g until then.
+            entry["streamed"] = True
+            response.call_on_close(lambda: self.finish(entry, start, profile, statements))
+            return response
+
+        g.pop("profile", None)
+        g.pop("profile_statements", None)
+
+        timing = self.finish(entry, start, profile, statements)
+        if timing is not None:
+            duration, sql_time, count = timing
+            response.headers.add("Server-Timing", "total;dur=%.3f" % (duration * 1000, ))
+            response.headers.add("Server-Timing", "sql;dur=%.3f;desc=\"%d queries\"" % (sql_time, count))
+            response.headers.add("Server-Timing", "app;dur=%.3f" % (duration * 1000 - sql_time, ))
+
+        return response
+
+    def finish(self, entry: dict, start: float, profile: Optional[cProfile.Profile],
+               statements: Optional[list]) -> Optional[Tuple[float, float, int]]:
+        """
+        Finish measurement of the request and write the log entry, when the request is profiled or slow.
+        :param entry: Log entry with the request details.
+        :param start: perf_counter() at start of the request.
+        :param profile: Profile of profiled request, None otherwise.
+        :param statements: SQL statements recorded by profiled request, None otherwise.
+        :return: Tuple (duration in seconds, SQL time in ms, number of statements) of profiled request, None otherwise.
+        """
+        if profile is not None:
+            profile.disable()
+
+        duration = perf_counter() - start
+        if profile is None and duration < self.slow_threshold:
+            return None
+
+        entry["duration_ms"] = round(duration * 1000, 3)
+        entry["slow"] = duration >= self.slow_threshold
+        entry["profiled"] = profile is not None
+
+        sql_time = 0.0
+        if profile is not None:
+            sql_time = sum(statement["duration_ms"] for statement in statements)
+
+            entry["sql"] = {
+                "count": len(statements),
+                "duration_ms": round(sql_time, 3),
+                "statements": statements,
+            }
+            entry["functions"] = self.summary(profile)
+
+        self.log.warning(json.dumps(entry))
+
+        if profile is None:
+            return None
+
+        return duration, sql_time, len(statements)
+
+    def summary(self, profile: cProfile.Profile) -> list:
+        """
+        Return functions with highest cumulative time.
+        :param profile: Finished profile.
+        :return: List of dicts with function, calls, total_ms (time spent in the function itself) and cumulative_ms.
+        """
+        stats = pstats.Stats(profile)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+
+        return [
+            {
+                "function": "%s:%d(%s)" % function,
+                "calls": calls,
+                "total_ms": round(total_time * 1000, 3),
+                "cumulative_ms": round(cumulative_time * 1000, 3),
+            }
+            for function, (primitive_calls, calls, total_time, cumulative_time, callers) in functions
+        ]
+
+    @staticmethod
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and "profile_statements" in g:
+            conn.info.setdefault("profile_start", []).append(perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and "profile_statements" in g and conn.info.get("profile_start"):
+            g.profile_statements.append({
+                "statement": statement[:self.max_statement_length],
+                "duration_ms": round((perf_counter() - conn.info["profile_start"].pop()) * 1000, 3),
+                # Affected rows for DML, selected rows for buffered SELECT cursors, -1 when the driver does not know.
+                "rows": cursor.rowcount,
+            })
+
+    @staticmethod
+    def handle_error(context):
+        # Failed statement does not reach after_cursor_execute.
+        if context.connection is not None and context.connection.info.get("profile_start"):
+            context.connection.info["profile_start"].pop()
+
+
+profiler = RequestProfiler()
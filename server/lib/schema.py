@@ -5,6 +5,9 @@ JSONSchema Python bindings
 from typing import Dict, List, Union
 from enum import Enum
 
+from jsonschema import Draft4Validator
+from lib.validator import CompiledValidator
+
 
 class Type(Enum):
     """
@@ -26,6 +29,16 @@ class JsonSchema:
     def __call__(self, update: dict=None) -> dict:
         raise NotImplementedError("You must explicitly implement %s.__call__." % (self.__class__.__name__, ))
 
+    def compile(self) -> "CompiledValidator":
+        """
+        Build the schema, check that it is valid JSON schema and compile it to validator.
+        :return: Compiled validator of the schema.
+        """
+        built_schema = self()
+        Draft4Validator.check_schema(built_schema)
+
+        return CompiledValidator(built_schema)
+
 
 class BaseType(JsonSchema):
     """
@@ -532,7 +545,7 @@ class Array(BaseType):
             out.update(update)
 
         if self.items is not None:
-            if isinstance(self.items, BaseType):
+            if isinstance(self.items, JsonSchema):
                 out["items"] = self.items()
             elif isinstance(self.items, list):
                 out["items"] = [item() for item in self.items]
@@ -0,0 +1,226 @@
+"""
+Mergeable quantile sketch (DDSketch) of reading values.
+
+Values are counted in logarithmic buckets: bucket i holds values in (gamma^(i-1), gamma^i], where
+gamma = (1 + a) / (1 - a), so any quantile is estimated with relative error at most a (relative accuracy). Negative
+values are counted in mirrored buckets and zeros separately. Two sketches with the same accuracy are merged by adding
+bucket counts, which gives exactly the sketch of all values of both.
+"""
+
+import struct
+import zlib
+from typing import Iterable, List
+
+import numpy as np
+
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+
+class BucketStore:
+    """
+    Dense array of bucket counts, from bucket `offset` on.
+    """
+    def __init__(self, offset: int=0, counts: np.ndarray=None):
+        self.offset = offset
+        self.counts = counts if counts is not None else np.zeros(0, dtype=np.int64)
+
+    def add(self, indexes: np.ndarray) -> None:
+        """
+        Count values of given bucket indexes.
+        """
+        if len(indexes) == 0:
+            return
+
+        low = int(indexes.min())
+        self.add_counts(low, np.bincount(indexes - low))
+
+    def add_counts(self, offset: int, counts: np.ndarray) -> None:
+        """
+        Add counts of buckets from `offset` on.
+        """
+        if len(counts) == 0:
+            return
+
+        if len(self.counts) == 0:
+            self.offset = offset
+            self.counts = counts.astype(np.int64)
+            return
+
+        low = min(self.offset, offset)
+        high = max(self.offset + len(self.counts), offset + len(counts))
+
+        if low != self.offset or high != self.offset + len(self.counts):
+            extended = np.zeros(high - low, dtype=np.int64)
+            extended[self.offset - low:self.offset - low + len(self.counts)] = self.counts
+            self.offset = low
+            self.counts = extended
+
+        self.counts[offset - low:offset - low + len(counts)] += counts
+
+    def trim(self) -> None:
+        """
+        Remove empty buckets at both ends.
+        """
+        nonzero = np.flatnonzero(self.counts)
+        if len(nonzero) == 0:
+            self.offset = 0
+            self.counts = np.zeros(0, dtype=np.int64)
+        else:
+            self.offset += int(nonzero[0])
+            self.counts = self.counts[nonzero[0]:nonzero[-1] + 1]
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative accuracy guarantee.
+    """
+
+    # Format version of serialized sketch.
+    VERSION = 1
+
+    HEADER = struct.Struct("<BdqqddiIiI")
+
+    def __init__(self, relative_accuracy: float=DEFAULT_RELATIVE_ACCURACY):
+        """
+        :param relative_accuracy: Maximum relative error of estimated quantiles (0-1).
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("Relative accuracy must be between 0 and 1.")
+
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+
+        self.positive = BucketStore()
+        self.negative = BucketStore()
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def index(self, magnitudes: np.ndarray) -> np.ndarray:
+        """
+        Bucket indexes of positive values.
+        """
+        return np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+
+    def value(self, index: np.ndarray) -> np.ndarray:
+        """
+        Representative values of buckets, each within relative accuracy of every value in its bucket.
+        """
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, values: Iterable) -> None:
+        """
+        Add values to the sketch.
+        :param values: Array or iterable of numbers.
+        """
+        values = np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=np.float64)
+        if len(values) == 0:
+            return
+
+        self.positive.add(self.index(values[values > 0]))
+        self.negative.add(self.index(-values[values < 0]))
+        self.zero_count += int(np.count_nonzero(values == 0))
+
+        self.count += len(values)
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other: "DDSketch") -> None:
+        """
+        Add all values of other sketch to this sketch. Merge of sketches with different relative accuracy moves the
+        buckets of the other sketch to buckets of this one, so the errors of both add up.
+        """
+        if other.count == 0:
+            return
+
+        for store, target in ((other.positive, self.positive), (other.negative, self.negative)):
+            if other.gamma == self.gamma:
+                target.add_counts(store.offset, store.counts)
+            elif len(store.counts) > 0:
+                indexes = self.index(other.value(np.arange(store.offset, store.offset + len(store.counts))))
+                low = int(indexes.min())
+                target.add_counts(low, np.bincount(indexes - low, weights=store.counts).astype(np.int64))
+        self.zero_count += other.zero_count
+
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantiles(self, fractions: List[float]) -> List[float]:
+        """
+        Estimate quantiles of the added values.
+        :param fractions: Quantiles to estimate (0-1).
+        :return: Estimated value of each quantile, None when the sketch is empty.
+        """
+        if self.count == 0:
+            return [None for _ in fractions]
+
+        # Buckets in order of their values: negative from the largest magnitude, zero, positive.
+        negative_indexes = np.arange(self.negative.offset, self.negative.offset + len(self.negative.counts))[::-1]
+        positive_indexes = np.arange(self.positive.offset, self.positive.offset + len(self.positive.counts))
+
+        values = np.concatenate((-self.value(negative_indexes), [0.0], self.value(positive_indexes)))
+        cumulative = np.cumsum(np.concatenate((self.negative.counts[::-1], [self.zero_count], self.positive.counts)))
+
+        result = []
+        for fraction in fractions:
+            # Extremes are known exactly.
+            if fraction <= 0:
+                result.append(float(self.min))
+                continue
+            if fraction >= 1:
+                result.append(float(self.max))
+                continue
+
+            rank = fraction * (self.count - 1)
+            bucket = int(np.searchsorted(cumulative, rank, side="right"))
+            result.append(float(min(max(values[min(bucket, len(values) - 1)], self.min), self.max)))
+
+        return result
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the sketch to compressed binary form.
+        """
+        self.positive.trim()
+        self.negative.trim()
+
+        header = self.HEADER.pack(
+            self.VERSION, self.relative_accuracy, self.count, self.zero_count,
+            self.min if self.min is not None else 0.0, self.max if self.max is not None else 0.0,
+            self.positive.offset, len(self.positive.counts), self.negative.offset, len(self.negative.counts)
+        )
+
+        counts = np.concatenate((self.positive.counts, self.negative.counts))
+        dtype = "<u4" if len(counts) == 0 or counts.max() < 2 ** 32 else "<u8"
+
+        return zlib.compress(header + dtype[-1].encode("ascii") + counts.astype(dtype).tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DDSketch":
+        """
+        Deserialize sketch produced by to_bytes().
+        """
+        data = zlib.decompress(data)
+        version, relative_accuracy, count, zero_count, minimum, maximum, positive_offset, positive_length, \
+            negative_offset, negative_length = cls.HEADER.unpack_from(data)
+
+        if version != cls.VERSION:
+            raise ValueError("Unsupported sketch version %d." % (version, ))
+
+        dtype = "<u" + data[cls.HEADER.size:cls.HEADER.size + 1].decode("ascii")
+        counts = np.frombuffer(data, dtype=dtype, offset=cls.HEADER.size + 1).astype(np.int64)
+
+        sketch = cls(relative_accuracy)
+        sketch.count = count
+        sketch.zero_count = zero_count
+        sketch.min = minimum if count else None
+        sketch.max = maximum if count else None
+        sketch.positive = BucketStore(positive_offset, counts[:positive_length].copy())
+        sketch.negative = BucketStore(negative_offset, counts[positive_length:positive_length + negative_length].copy())
+
+        return sketch
@@ -0,0 +1,70 @@
+"""
+Registry of runtime statistics of server components.
+"""
+
+import multiprocessing
+from typing import Callable, Dict
+
+
+class Stats:
+    """
+    Components register providers of their statistics here, and the statistics are exposed by the API.
+    """
+    def __init__(self):
+        self._providers = {}  # type: Dict[str, Callable[[], dict]]
+
+    def register(self, name: str, provider: Callable[[], dict]) -> None:
+        """
+        Register statistics provider.
+        :param name: Name of the statistics.
+        :param provider: Callable returning current statistics as JSON serializable dict.
+        """
+        self._providers[name] = provider
+
+    def collect(self) -> Dict[str, dict]:
+        """
+        Collect statistics from all providers.
+        :return: name -> statistics mapping.
+        """
+        return {
+            name: provider()
+            for name, provider in self._providers.items()
+        }
+
+
+class Timer:
+    """
+    Count, total and maximum of measured durations. Values live in shared memory, so they cover all worker processes
+    forked after the timer was created.
+    """
+    def __init__(self):
+        # count, total seconds, maximum seconds
+        self._values = multiprocessing.Array("d", 3)
+
+    def record(self, seconds: float) -> None:
+        """
+        Record one measured duration.
+        :param seconds: Duration in seconds.
+        """
+        with self._values.get_lock():
+            self._values[0] += 1
+            self._values[1] += seconds
+            if seconds > self._values[2]:
+                self._values[2] = seconds
+
+    def stats(self) -> dict:
+        """
+        Return timer statistics, durations are in milliseconds.
+        """
+        with self._values.get_lock():
+            count, total, maximum = self._values[:]
+
+        return {
+            "count": int(count),
+            "total_ms": total * 1000,
+            "avg_ms": total * 1000 / count if count else 0.0,
+            "max_ms": maximum * 1000
+        }
+
+
+stats = Stats()
@@ -0,0 +1,214 @@
+"""
+Vectorized helpers for processing reading time series.
+"""
+
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+
+# Aggregation functions supported by aggregate().
+AGGREGATE_FUNCTIONS = ("avg", "min", "max", "last", "sum", "count")
+
+# Downsampling methods supported by downsample().
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def split_series(rows: Iterable[tuple], chunk_size: int=10000) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Convert stream of (series_id, datetime, value) rows ordered by series and datetime to per-series arrays. Rows are
+    consumed in chunks, so only one series is held in memory at a time.
+    :param rows: Iterable of rows, ordered by series ID and datetime.
+    :param chunk_size: How many rows to convert to arrays at once.
+    :return: Iterator of (series_id, timestamps, values) tuples, where timestamps are UNIX timestamps in seconds.
+    """
+    it = iter(rows)
+
+    current = None
+    timestamps_parts = []
+    values_parts = []
+
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+
+        ids = np.fromiter((row[0] for row in chunk), dtype=np.int64, count=len(chunk))
+        timestamps = np.array([row[1] for row in chunk], dtype="datetime64[s]").astype(np.int64)
+        values = np.fromiter((row[2] for row in chunk), dtype=np.int64, count=len(chunk))
+
+        bounds = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+
+        for part_ids, part_timestamps, part_values in zip(np.split(ids, bounds), np.split(timestamps, bounds),
+                                                          np.split(values, bounds)):
+            series_id = int(part_ids[0])
+            if current is not None and series_id != current:
+                yield current, np.concatenate(timestamps_parts), np.concatenate(values_parts)
+                timestamps_parts = []
+                values_parts = []
+
+            current = series_id
+            timestamps_parts.append(part_timestamps)
+            values_parts.append(part_values)
+
+    if current is not None:
+        yield current, np.concatenate(timestamps_parts), np.concatenate(values_parts)
+
+
+def aggregate(timestamps: np.ndarray, values: np.ndarray, start: int, step: int, count: int,
+              function: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregate values into aligned buckets [start + i * step, start + (i + 1) * step) for i in 0..count-1.
+    :param timestamps: Sorted UNIX timestamps of values.
+    :param values: Values.
+    :param start: Timestamp where the first bucket starts.
+    :param step: Bucket width in seconds.
+    :param count: Number of buckets.
+    :param function: One of AGGREGATE_FUNCTIONS.
+    :return: Tuple (result, present), where result contains aggregated value for each bucket and present is boolean
+     mask telling which buckets contain any value.
+    """
+    if function not in AGGREGATE_FUNCTIONS:
+        raise ValueError("Unknown aggregation function '%s'." % (function, ))
+
+    buckets = (timestamps - start) // step
+    mask = (buckets >= 0) & (buckets < count)
+    buckets = buckets[mask]
+    values = values[mask]
+
+    present = np.zeros(count, dtype=bool)
+
+    if function == "avg":
+        result = np.zeros(count, dtype=np.float64)
+    else:
+        result = np.zeros(count, dtype=np.int64)
+
+    if len(values) == 0:
+        return result, present
+
+    # Values are sorted by time, so each bucket is a contiguous run of values.
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    indexes = buckets[starts]
+
+    if function == "avg":
+        result[indexes] = np.add.reduceat(values, starts) / (ends - starts)
+    elif function == "min":
+        result[indexes] = np.minimum.reduceat(values, starts)
+    elif function == "max":
+        result[indexes] = np.maximum.reduceat(values, starts)
+    elif function == "sum":
+        result[indexes] = np.add.reduceat(values, starts)
+    elif function == "count":
+        result[indexes] = ends - starts
+    elif function == "last":
+        result[indexes] = values[ends - 1]
+
+    present[indexes] = True
+
+    return result, present
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling. Splits the points to threshold - 2 buckets (first and last point are
+    always kept) and from each bucket selects the point forming the largest triangle with point selected from previous
+    bucket and average of the next bucket. Work inside each bucket is vectorized, so the Python loop runs only once per
+    selected point regardless of the number of input points.
+    :param timestamps: Sorted timestamps of points.
+    :param values: Values of points.
+    :param threshold: Maximum number of points to select, must be at least 3.
+    :return: Sorted indexes of selected points.
+    """
+    length = len(values)
+    if length <= threshold:
+        return np.arange(length)
+
+    if threshold < 3:
+        raise ValueError("LTTB requires threshold of at least 3 points.")
+
+    x = timestamps.astype(np.float64)
+    y = values.astype(np.float64)
+
+    # Bucket boundaries of the points between first and last one.
+    bounds = (np.arange(threshold - 1) * ((length - 2) / (threshold - 2))).astype(np.int64) + 1
+    bounds[-1] = length - 1
+
+    # Averages of each bucket, with the last point appended as average of the virtual bucket after the last one.
+    sizes = np.diff(bounds)
+    avg_x = np.r_[np.add.reduceat(x[1:-1], bounds[:-1] - 1) / sizes, x[-1]]
+    avg_y = np.r_[np.add.reduceat(y[1:-1], bounds[:-1] - 1) / sizes, y[-1]]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        begin, end = bounds[i], bounds[i + 1]
+
+        # Twice the triangle area, which is enough for comparison.
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[begin:end] - y[a]) - (x[a] - x[begin:end]) * (avg_y[i + 1] - y[a]))
+        a = begin + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax(values: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Min-max decimation. Splits the points to threshold / 2 buckets of the same size and selects minimum and maximum of
+    each bucket, so peaks are always preserved.
+    :param values: Values of points.
+    :param threshold: Maximum number of points to select, must be at least 2.
+    :return: Sorted indexes of selected points.
+    """
+    length = len(values)
+    if length <= threshold:
+        return np.arange(length)
+
+    if threshold < 2:
+        raise ValueError("Min-max decimation requires threshold of at least 2 points.")
+
+    size = -(-length // (threshold // 2))
+    rows = -(-length // size)
+
+    # Pad values to the full matrix, the padding is never selected because nan is ignored.
+    matrix = np.full(rows * size, np.nan)
+    matrix[:length] = values
+    matrix = matrix.reshape(rows, size)
+
+    offsets = np.arange(rows) * size
+
+    return np.unique(np.r_[offsets + np.nanargmin(matrix, axis=1), offsets + np.nanargmax(matrix, axis=1)])
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, threshold: int, method: str) -> np.ndarray:
+    """
+    Select at most threshold points of series for visualisation.
+    :param timestamps: Sorted timestamps of points.
+    :param values: Values of points.
+    :param threshold: Maximum number of points to return.
+    :param method: One of DOWNSAMPLE_METHODS.
+    :return: Sorted indexes of selected points.
+    """
+    if method == "lttb":
+        return lttb(timestamps, values, threshold)
+    elif method == "minmax":
+        return minmax(values, threshold)
+    else:
+        raise ValueError("Unknown downsample method '%s'." % (method, ))
+
+
+def to_list(result: np.ndarray, present: np.ndarray=None) -> List[any]:
+    """
+    Convert array to list of Python values, replacing values that are not present with None.
+    :param result: Array to convert.
+    :param present: Boolean mask of present values. If not specified, all values are present.
+    :return: List of values.
+    """
+    if present is None:
+        return result.tolist()
+
+    return [value if is_present else None for value, is_present in zip(result.tolist(), present.tolist())]
@@ -1,9 +1,15 @@
 import logging
+from datetime import datetime
+from functools import wraps
+from itertools import count
+from time import perf_counter
 from flask_restful import Resource
 from flask import request
 from werkzeug.exceptions import HTTPException
-from jsonschema import Draft4Validator
+from config import config
+from lib.metrics import measure_request
 from lib.schema import JsonSchema
+from lib.stats import stats, Timer
 
 
 def exception_guard(method):
@@ -13,6 +19,7 @@ def exception_guard(method):
     :param method: Method to wrap.
     :return: Wrapper for the method that catches the exceptions.
     """
+    @wraps(method)
     def wrapper(*args, **kwargs):
         """
         Wrapper that catches exceptions.
@@ -35,11 +42,11 @@ def exception_guard(method):
 class SafeResource(Resource):
     """
     Resource that is wrapped in exception_guard automatically. That means, that any exception thrown when executing
-    the API call will be formatted to JSON.
+    the API call will be formatted to JSON. Duration of the calls is measured for metrics.
     """
-    def __init__(self):
-        super(SafeResource, self).__init__()
-        self.method_decorators.append(exception_guard)
+    # Class attribute, so the decorators are not appended again for each request (resources are instantiated per
+    # request, and Resource.method_decorators is shared list).
+    method_decorators = [exception_guard, measure_request]
 
 
 def validate_input(schema: JsonSchema):
@@ -48,22 +55,20 @@ def validate_input(schema: JsonSchema):
     should contain JSON payload, that validates against specified schema.
     :param schema: Schema to validate against.
     """
-    built_schema = schema()
-    Draft4Validator.check_schema(built_schema)
-
-    v = Draft4Validator(built_schema)
+    v = schema.compile()
 
     def input_decorator(method):
         """
         Decorator that uses parametrized validator to validate input json params.
         """
+        @wraps(method)
         def wrapper(*args, **kwargs):
             """
             Wrapper that validates input JSON params and only proceeds with the method execution if they are valid.
             """
             errors = {
-                "input.%s" % (".".join(map(str, error.absolute_path)), ): error.message
-                for error in v.iter_errors(request.json)
+                "input.%s" % (".".join(map(str, path)), ): message
+                for path, message in v.iter_errors(request.json)
             }
             if not errors:
                 return method(*args, **kwargs)
@@ -73,42 +78,112 @@ def validate_input(schema: JsonSchema):
     return input_decorator
 
 
+class ValidationPolicy:
+    """
+    How often the response of an endpoint is validated, configured in [validation] section of server.conf by endpoint
+    name (for example Services.get), with [validation] Default used for endpoints that are not listed. Possible values
+    are always, off, or sampled:N to validate one of every N responses.
+    """
+    def __init__(self, endpoint: str):
+        """
+        :param endpoint: Endpoint name, qualified name of the resource method.
+        """
+        self.endpoint = endpoint
+        self.policy = config.cfg.get("validation", endpoint,
+                                     fallback=config.cfg.get("validation", "Default", fallback="always"))
+
+        if self.policy == "always":
+            self.rate = 1
+        elif self.policy == "off":
+            self.rate = 0
+        elif self.policy.startswith("sampled:") and self.policy[8:].isdigit() and int(self.policy[8:]) > 0:
+            self.rate = int(self.policy[8:])
+        else:
+            raise ValueError("Invalid validation policy '%s' of %s. Must be one of always, off, sampled:N."
+                             % (self.policy, endpoint))
+
+        self.calls = count()
+        self.timer = Timer()
+
+        stats.register("validation.%s" % (endpoint, ), self.stats)
+
+    def should_validate(self) -> bool:
+        """
+        Decide whether current response should be validated.
+        """
+        if self.rate == 0:
+            return False
+
+        return next(self.calls) % self.rate == 0
+
+    def stats(self) -> dict:
+        """
+        Return policy and timing of validations.
+        """
+        out = self.timer.stats()
+        out["policy"] = self.policy
+        return out
+
+
 def validate_response(schema: JsonSchema):
     """
-    Decorator. Output response validation.
+    Decorator. Output response validation. Whether the response is validated is controlled by ValidationPolicy of the
+    endpoint.
     :param schema: Schema to validate against.
     """
-    built_schema = schema()
-    Draft4Validator.check_schema(built_schema)
-
-    v = Draft4Validator(built_schema)
+    v = schema.compile()
 
     def output_decorator(method):
         """
         Decorator uses parametrized validator to validate output JSON params. Only validates if status=2**.
         """
+        policy = ValidationPolicy(method.__qualname__)
+
+        @wraps(method)
         def wrapper(*args, **kwargs):
             """
             Wrapper that validates output of method agains specified JSON schema. Only validates if method returns
-            HTTP status=200, otherwise, it passes the response directly.
+            HTTP status=2**, otherwise, it passes the response directly.
             """
             status = 200
             response = method(*args, **kwargs)
 
             if isinstance(response, tuple):
-                response = response[0]
                 status = response[1]
+                response = response[0]
 
-            if status / 100 != 2:
+            if status // 100 != 2 or not policy.should_validate():
                 return response, status
             else:
+                start = perf_counter()
                 errors = {
-                    "response.%s" % (".".join(map(str, error.absolute_path)), ): error.message
-                    for error in v.iter_errors(response)
+                    "response.%s" % (".".join(map(str, path)), ): message
+                    for path, message in v.iter_errors(response)
                 }
+                policy.timer.record(perf_counter() - start)
+
                 if not errors:
                     return response, status
                 else:
                     return errors, 400
         return wrapper
     return output_decorator
+
+
+def parse_datetime(value: str) -> datetime:
+    """
+    Parse datetime in ISO 8601 format, as sent by the probes (YYYY-MM-DDTHH:MM:SS with optional fraction of seconds).
+    Space can be used instead of T as date and time separator.
+    :param value: String to parse.
+    :return: Parsed datetime.
+    :raise ValueError: When the value is not valid datetime.
+    """
+    value = value.replace(" ", "T", 1)
+
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+
+    raise ValueError("Invalid datetime '%s'." % (value, ))
@@ -0,0 +1,518 @@
+"""
+Compiled JSON schema validators.
+
+Schema built by `lib.schema` types is compiled once to tree of Python closures specialized for the keywords and values
+it contains, so validating a payload does not need to walk the schema dictionaries again for every value. Errors have
+the same paths and messages as errors reported by jsonschema's Draft4Validator without format checker (which is how
+the API has always validated), and are reported in the same order. Keywords that are not compiled are validated by
+jsonschema's own implementation of the keyword.
+"""
+
+import re
+from numbers import Number
+from typing import Callable, List, Optional, Tuple, Union
+
+from jsonschema import Draft4Validator
+
+
+# (path, message) where path is tuple of property names and array indexes relative to validated instance.
+Error = Tuple[Tuple[Union[str, int], ...], str]
+
+# Function that validates instance and returns list of errors, or None (or empty list) when the instance is valid.
+Check = Callable[[any], Optional[List[Error]]]
+
+
+TYPE_CHECKS = {
+    "array": lambda instance: isinstance(instance, list),
+    "boolean": lambda instance: isinstance(instance, bool),
+    "integer": lambda instance: isinstance(instance, int) and not isinstance(instance, bool),
+    "null": lambda instance: instance is None,
+    "number": lambda instance: isinstance(instance, Number) and not isinstance(instance, bool),
+    "object": lambda instance: isinstance(instance, dict),
+    "string": lambda instance: isinstance(instance, str),
+}
+
+# Python types used for fast checks of single type keyword. Types that need to exclude bool are handled separately.
+PYTHON_TYPES = {
+    "array": list,
+    "boolean": bool,
+    "object": dict,
+    "string": str,
+}
+
+# Keywords that do not validate anything.
+ANNOTATIONS = ("$schema", "id", "title", "description", "default", "definitions")
+
+
+def _prefix(key: Union[str, int], errors: List[Error]) -> List[Error]:
+    """
+    Prepend path item to paths of errors of nested instance.
+    """
+    return [((key, ) + path, message) for path, message in errors]
+
+
+def _unbool(element: any, true=object(), false=object()) -> any:
+    """
+    Make True and 1, False and 0 distinct for enum comparison, same as jsonschema does.
+    """
+    if element is True:
+        return true
+    elif element is False:
+        return false
+    return element
+
+
+class CompiledValidator:
+    """
+    Validator of one JSON schema, compiled to Python functions.
+    """
+    def __init__(self, schema: dict):
+        """
+        :param schema: JSON schema (Draft 4) to compile.
+        """
+        self.schema = schema
+
+        # Used for keywords that are not compiled, so the keyword can resolve references against the root schema.
+        self.fallback = Draft4Validator(schema)
+
+        self.validate = self.compile(schema)
+
+    def iter_errors(self, instance: any) -> List[Error]:
+        """
+        Validate instance.
+        :param instance: Instance to validate.
+        :return: List of (path, message) tuples, empty if the instance is valid.
+        """
+        return self.validate(instance) or []
+
+    def is_valid(self, instance: any) -> bool:
+        """
+        Test whether the instance is valid.
+        """
+        return not self.validate(instance)
+
+    def compile(self, schema: Union[dict, bool]) -> Check:
+        """
+        Compile (sub)schema to validation function.
+        :param schema: Schema to compile.
+        :return: Function validating the instance.
+        """
+        if schema is True:
+            return lambda instance: None
+
+        if schema is False:
+            return lambda instance: [((), "False schema does not allow %r" % (instance, ))]
+
+        if "$ref" in schema:
+            # Other keywords are ignored next to $ref.
+            keywords = [("$ref", schema["$ref"])]
+        else:
+            keywords = schema.items()
+
+        checks = []
+        for keyword, value in keywords:
+            if keyword in ANNOTATIONS or keyword == "format":
+                # Formats are not validated, as the API validators do not use format checker.
+                continue
+
+            compiler = getattr(self, "_compile_%s" % (keyword, ), None)
+            if compiler is not None:
+                # Compiler returns None when the keyword cannot fail for given schema.
+                check = compiler(value, schema)
+            elif keyword in Draft4Validator.VALIDATORS:
+                check = self._compile_fallback(keyword, value, schema)
+            else:
+                check = None
+
+            if check is not None:
+                checks.append(check)
+
+        if not checks:
+            return lambda instance: None
+
+        if len(checks) == 1:
+            return checks[0]
+
+        def validate(instance):
+            errors = None
+            for check in checks:
+                found = check(instance)
+                if found:
+                    if errors is None:
+                        errors = list(found)
+                    else:
+                        errors.extend(found)
+            return errors
+
+        return validate
+
+    def _compile_fallback(self, keyword: str, value: any, schema: dict) -> Check:
+        """
+        Validate keyword using jsonschema.
+        """
+        function = Draft4Validator.VALIDATORS[keyword]
+        validator = self.fallback
+
+        def check(instance):
+            return [
+                (tuple(error.path), error.message)
+                for error in function(validator, value, instance, schema)
+            ]
+
+        return check
+
+    def _compile_type(self, types: Union[str, List[str]], schema: dict) -> Check:
+        if isinstance(types, str):
+            types = [types]
+
+        if not all(isinstance(type_, str) and type_ in TYPE_CHECKS for type_ in types):
+            return self._compile_fallback("type", types, schema)
+
+        message = "%%r is not of type %s" % (", ".join(repr(type_) for type_ in types), )
+
+        if len(types) == 1 and types[0] in PYTHON_TYPES:
+            python_type = PYTHON_TYPES[types[0]]
+
+            def check(instance):
+                if not isinstance(instance, python_type):
+                    return [((), message % (instance, ))]
+
+        elif len(types) == 1 and types[0] == "integer":
+            def check(instance):
+                if not isinstance(instance, int) or isinstance(instance, bool):
+                    return [((), message % (instance, ))]
+
+        else:
+            type_checks = [TYPE_CHECKS[type_] for type_ in types]
+
+            def check(instance):
+                for type_check in type_checks:
+                    if type_check(instance):
+                        return None
+                return [((), message % (instance, ))]
+
+        return check
+
+    @staticmethod
+    def _compile_enum(enums: list, schema: dict) -> Check:
+        def check(instance):
+            if instance == 0 or instance == 1:
+                unbooled = _unbool(instance)
+                if all(unbooled != _unbool(each) for each in enums):
+                    return [((), "%r is not one of %r" % (instance, enums))]
+            elif instance not in enums:
+                return [((), "%r is not one of %r" % (instance, enums))]
+
+        return check
+
+    def _compile_properties(self, properties: dict, schema: dict) -> Check:
+        compiled = [(name, self.compile(subschema)) for name, subschema in properties.items()]
+
+        def check(instance):
+            if not isinstance(instance, dict):
+                return None
+
+            errors = None
+            for name, validate in compiled:
+                if name in instance:
+                    found = validate(instance[name])
+                    if found:
+                        if errors is None:
+                            errors = _prefix(name, found)
+                        else:
+                            errors.extend(_prefix(name, found))
+            return errors
+
+        return check
+
+    def _compile_additionalProperties(self, additional: Union[bool, dict], schema: dict) -> Optional[Check]:
+        if additional is True:
+            return None
+
+        properties = schema.get("properties", {})
+        patterns = "|".join(schema.get("patternProperties", {}))
+        search = re.compile(patterns).search if patterns else None
+
+        def find_extras(instance):
+            # Set built in the same order as jsonschema builds it, so the errors are listed in the same order.
+            return set(
+                name for name in instance
+                if name not in properties and (search is None or not search(name))
+            )
+
+        if isinstance(additional, dict):
+            validate = self.compile(additional)
+
+            def check(instance):
+                if not isinstance(instance, dict):
+                    return None
+
+                errors = None
+                for extra in find_extras(instance):
+                    found = validate(instance[extra])
+                    if found:
+                        if errors is None:
+                            errors = _prefix(extra, found)
+                        else:
+                            errors.extend(_prefix(extra, found))
+                return errors
+
+            return check
+
+        if "patternProperties" in schema:
+            sorted_patterns = ", ".join(map(repr, sorted(schema["patternProperties"])))
+
+            def message(extras):
+                return "%s %s not match any of the regexes: %s" % (
+                    ", ".join(map(repr, sorted(extras))), "does" if len(extras) == 1 else "do", sorted_patterns
+                )
+        else:
+            def message(extras):
+                return "Additional properties are not allowed (%s %s unexpected)" % (
+                    ", ".join(repr(extra) for extra in extras), "was" if len(extras) == 1 else "were"
+                )
+
+        def check(instance):
+            if not isinstance(instance, dict):
+                return None
+
+            for name in instance:
+                if name not in properties and (search is None or not search(name)):
+                    return [((), message(find_extras(instance)))]
+
+        return check
+
+    @staticmethod
+    def _compile_required(required: List[str], schema: dict) -> Check:
+        def check(instance):
+            if not isinstance(instance, dict):
+                return None
+
+            errors = None
+            for name in required:
+                if name not in instance:
+                    if errors is None:
+                        errors = []
+                    errors.append(((), "%r is a required property" % name))
+            return errors
+
+        return check
+
+    @staticmethod
+    def _compile_minProperties(minimum: int, schema: dict) -> Check:
+        def check(instance):
+            if isinstance(instance, dict) and len(instance) < minimum:
+                return [((), "%r does not have enough properties" % (instance, ))]
+
+        return check
+
+    @staticmethod
+    def _compile_maxProperties(maximum: int, schema: dict) -> Check:
+        def check(instance):
+            if isinstance(instance, dict) and len(instance) > maximum:
+                return [((), "%r has too many properties" % (instance, ))]
+
+        return check
+
+    def _compile_items(self, items: Union[dict, list], schema: dict) -> Check:
+        if isinstance(items, dict):
+            validate = self.compile(items)
+
+            def check(instance):
+                if not isinstance(instance, list):
+                    return None
+
+                errors = None
+                for index, item in enumerate(instance):
+                    found = validate(item)
+                    if found:
+                        if errors is None:
+                            errors = _prefix(index, found)
+                        else:
+                            errors.extend(_prefix(index, found))
+                return errors
+
+        else:
+            compiled = [self.compile(subschema) for subschema in items]
+
+            def check(instance):
+                if not isinstance(instance, list):
+                    return None
+
+                errors = None
+                for index, (item, validate) in enumerate(zip(instance, compiled)):
+                    found = validate(item)
+                    if found:
+                        if errors is None:
+                            errors = _prefix(index, found)
+                        else:
+                            errors.extend(_prefix(index, found))
+                return errors
+
+        return check
+
+    def _compile_additionalItems(self, additional: Union[bool, dict], schema: dict) -> Optional[Check]:
+        items = schema.get("items", {})
+        if isinstance(items, dict) or additional is True:
+            return None
+
+        count = len(items)
+
+        if isinstance(additional, dict):
+            validate = self.compile(additional)
+
+            def check(instance):
+                if not isinstance(instance, list):
+                    return None
+
+                errors = None
+                for index, item in enumerate(instance[count:], start=count):
+                    found = validate(item)
+                    if found:
+                        if errors is None:
+                            errors = _prefix(index, found)
+                        else:
+                            errors.extend(_prefix(index, found))
+                return errors
+
+            return check
+
+        def check(instance):
+            if isinstance(instance, list) and len(instance) > count:
+                extras = instance[count:]
+                return [((), "Additional items are not allowed (%s %s unexpected)" % (
+                    ", ".join(repr(extra) for extra in extras), "was" if len(extras) == 1 else "were"
+                ))]
+
+        return check
+
+    @staticmethod
+    def _compile_minItems(minimum: int, schema: dict) -> Check:
+        def check(instance):
+            if isinstance(instance, list) and len(instance) < minimum:
+                return [((), "%r is too short" % (instance, ))]
+
+        return check
+
+    @staticmethod
+    def _compile_maxItems(maximum: int, schema: dict) -> Check:
+        def check(instance):
+            if isinstance(instance, list) and len(instance) > maximum:
+                return [((), "%r is too long" % (instance, ))]
+
+        return check
+
+    @staticmethod
+    def _compile_minLength(minimum: int, schema: dict) -> Check:
+        def check(instance):
+            if isinstance(instance, str) and len(instance) < minimum:
+                return [((), "%r is too short" % (instance, ))]
+
+        return check
+
+    @staticmethod
+    def _compile_maxLength(maximum: int, schema: dict) -> Check:
+        def check(instance):
+            if isinstance(instance, str) and len(instance) > maximum:
+                return [((), "%r is too long" % (instance, ))]
+
+        return check
+
+    @staticmethod
+    def _compile_pattern(pattern: str, schema: dict) -> Check:
+        search = re.compile(pattern).search
+
+        def check(instance):
+            if isinstance(instance, str) and not search(instance):
+                return [((), "%r does not match %r" % (instance, pattern))]
+
+        return check
+
+    @staticmethod
+    def _compile_minimum(minimum: Number, schema: dict) -> Check:
+        exclusive = schema.get("exclusiveMinimum", False)
+        comparison = "less than or equal to" if exclusive else "less than"
+
+        def check(instance):
+            if isinstance(instance, Number) and not isinstance(instance, bool) \
+                    and (instance <= minimum if exclusive else instance < minimum):
+                return [((), "%r is %s the minimum of %r" % (instance, comparison, minimum))]
+
+        return check
+
+    @staticmethod
+    def _compile_maximum(maximum: Number, schema: dict) -> Check:
+        exclusive = schema.get("exclusiveMaximum", False)
+        comparison = "greater than or equal to" if exclusive else "greater than"
+
+        def check(instance):
+            if isinstance(instance, Number) and not isinstance(instance, bool) \
+                    and (instance >= maximum if exclusive else instance > maximum):
+                return [((), "%r is %s the maximum of %r" % (instance, comparison, maximum))]
+
+        return check
+
+    def _compile_allOf(self, schemas: list, schema: dict) -> Check:
+        return self._combine([self.compile(subschema) for subschema in schemas])
+
+    @staticmethod
+    def _combine(compiled: List[Check]) -> Check:
+        """
+        Return function that reports errors of all given functions.
+        """
+        def check(instance):
+            errors = None
+            for validate in compiled:
+                found = validate(instance)
+                if found:
+                    if errors is None:
+                        errors = list(found)
+                    else:
+                        errors.extend(found)
+            return errors
+
+        return check
+
+    def _compile_anyOf(self, schemas: list, schema: dict) -> Check:
+        compiled = [self.compile(subschema) for subschema in schemas]
+
+        def check(instance):
+            for validate in compiled:
+                if not validate(instance):
+                    return None
+            return [((), "%r is not valid under any of the given schemas" % (instance, ))]
+
+        return check
+
+    def _compile_oneOf(self, schemas: list, schema: dict) -> Check:
+        compiled = [self.compile(subschema) for subschema in schemas]
+
+        def check(instance):
+            for index, validate in enumerate(compiled):
+                if not validate(instance):
+                    break
+            else:
+                return [((), "%r is not valid under any of the given schemas" % (instance, ))]
+
+            more_valid = [
+                schemas[other]
+                for other in range(index + 1, len(compiled))
+                if not compiled[other](instance)
+            ]
+
+            if more_valid:
+                more_valid.append(schemas[index])
+                return [((), "%r is valid under each of %s" % (
+                    instance, ", ".join(repr(subschema) for subschema in more_valid)
+                ))]
+
+        return check
+
+    def _compile_not(self, not_schema: dict, schema: dict) -> Check:
+        validate = self.compile(not_schema)
+
+        def check(instance):
+            if not validate(instance):
+                return [((), "%r is not allowed for %r" % (not_schema, instance))]
+
+        return check
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Production server. Runs the application in Gunicorn, configured by [server] section of server.conf. The application
+(including the API schemas and validators) is imported in the master process before the workers are forked, so its
+memory is shared copy-on-write. Periodic jobs run once, in a job process forked by the master, instead of in every
+worker. They do not run in the master itself, as it forks the workers, and a fork while a job thread holds a lock
+(connection pool, metrics file, ...) could leave the worker deadlocked.
+
+Send SIGHUP to the master to gracefully restart the workers (new workers are started, old ones finish their requests).
+As the application is preloaded, code changes need full restart (or SIGUSR2 binary upgrade).
+"""
+
+import logging
+
+from gunicorn.app.base import BaseApplication
+
+from config import config
+from lib import metrics
+from lib.jobs import jobs
+
+
+class Server(BaseApplication):
+    """
+    Gunicorn application serving the Flask app.
+    """
+    def __init__(self, options: dict):
+        """
+        :param options: Gunicorn settings.
+        """
+        self.options = options
+        super(Server, self).__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from server import app
+        return app
+
+
+def when_ready(arbiter):
+    """
+    Master is initialized, start the job process. Connections opened while importing the application are closed
+    first, so the workers and the job process do not inherit them.
+    """
+    config.dispose()
+    jobs.start_process()
+
+
+def child_exit(arbiter, worker):
+    """
+    Worker exited, clean up its metrics.
+    """
+    metrics.process_exited(worker.pid)
+
+
+def on_exit(arbiter):
+    """
+    Master is shutting down, stop the job process and clean up its metrics.
+    """
+    pid = jobs.pid
+    jobs.stop_process()
+    if pid is not None:
+        metrics.process_exited(pid)
+
+
+def options() -> dict:
+    """
+    Build Gunicorn settings from [server] section of server.conf.
+    """
+    server_config = config.cfg["server"] if config.cfg.has_section("server") else {}
+
+    return {
+        "bind": server_config.get("Bind", "0.0.0.0:5000"),
+        "workers": int(server_config.get("Workers", 4)),
+        "threads": int(server_config.get("Threads", 1)),
+        "max_requests": int(server_config.get("MaxRequests", 10000)),
+        "max_requests_jitter": int(server_config.get("MaxRequestsJitter", 1000)),
+        "timeout": int(server_config.get("Timeout", 30)),
+        "graceful_timeout": int(server_config.get("GracefulTimeout", 30)),
+        "loglevel": server_config.get("LogLevel", "info"),
+        "accesslog": server_config.get("AccessLog", "-") or None,
+        "preload_app": True,
+        "when_ready": when_ready,
+        "child_exit": child_exit,
+        "on_exit": on_exit,
+    }
+
+
+if __name__ == '__main__':
+    opts = options()
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s {%(filename)s:%(funcName)s:%(lineno)s}",
+        level=opts["loglevel"].upper()
+    )
+
+    metrics.reset()
+
+    Server(opts).run()
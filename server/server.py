@@ -2,17 +2,32 @@
 
 from flask import Flask, render_template
 import logging
+import os
 
 from api import register_api
+from config import config
+from lib import metrics
+from lib.jobs import jobs
+from lib.profiler import profiler
 from website import register_site
 
 app = Flask(__name__)
 register_api(app)
 register_site(app)
+profiler.init_app(app)
 
 @app.route('/')
 def index():
-    return render_template("dashboard/index.html")
+    probes = []
+    for probe in config.api.get("probe", {"show": ["name"]}):
+        latest = config.api.get("readings/%s/latest" % (probe["name"], ))
+        probes.append({
+            "name": probe["name"],
+            "readings": len(latest),
+            "updated": max([value["timestamp"] for value in latest], default=None)
+        })
+
+    return render_template("dashboard/index.html", probes=probes)
 
 if __name__ == '__main__':
     logging.basicConfig(
@@ -22,4 +37,12 @@ if __name__ == '__main__':
 
     logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
 
-    app.run(debug=True, host='0.0.0.0', processes=10)
+    metrics.reset()
+
+    # The development server forks for every request, so the jobs run in their own process. The reloader runs this
+    # script also in the process watching for changes, the jobs are started only by the one serving requests.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        jobs.start_process()
+
+    # Development server. Use serve.py in production.
+    app.run(debug=True, host='0.0.0.0', processes=10, threaded=False)
@@ -1,5 +1,6 @@
 from flask import Flask
 from config import config
+from api.probe import probes_cache
 
 from website.settings import settings
 from website.probe import probe
@@ -13,7 +14,9 @@ def register_site(app: Flask):
     @app.context_processor
     def inject_probes():
         return {
-            "probes_list": config.api.get("/probe", {"show": ["name", "errors", "warnings"]})
+            "probes_list": probes_cache.get("sidebar", lambda: config.api.get("/probe", {
+                "show": ["name", "errors", "warnings", "stale"]
+            }))
         }
 
     @jinja2.contextfunction
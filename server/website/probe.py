@@ -1,8 +1,21 @@
 from flask import Blueprint, render_template
+from config import config
 
 probe = Blueprint("probe", __name__)
 
 
 @probe.route("/<name>")
 def index(name):
-    return render_template("probe/index.html")
+    """
+    Probe overview with current values of all readings.
+    """
+    return render_template("probe/index.html",
+                           probe=config.api.get("probe/%s" % (name, )),
+                           services={
+                               service["id"]: service["name"]
+                               for service in config.api.get("services/%s" % (name, ), params={
+                                   "show": ["id", "name"],
+                                   "status": "all"
+                               })
+                           },
+                           latest=config.api.get("readings/%s/latest" % (name, )))